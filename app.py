@@ -1,9 +1,16 @@
 import re
-import fitz
 import streamlit as st
 from utils import *
-from docx import Document
-from pylatexenc.latex2text import LatexNodes2Text
+from extract import extract_resume_sections, extract_resume_text
+from tokens import TokenUsage, set_usage_tracker
+from llm import (
+    FUNCTION_CALLING,
+    JSON_MODE,
+    NO_STRUCTURED_OUTPUT,
+    STRUCTURED_OUTPUT_MODES,
+)
+from variants import MAX_VARIANTS
+from metrics import Trace, set_trace, to_jsonl, to_otlp
 
 st.set_page_config(layout="wide")
 
@@ -21,6 +28,50 @@ with st.sidebar:
     model_options = ["gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"]
     selected_model = st.sidebar.selectbox("Select a model", model_options, index=0)
     st.session_state["selected_model"] = selected_model
+    structured_output_labels = {
+        FUNCTION_CALLING: "Function calling",
+        JSON_MODE: "JSON mode",
+        NO_STRUCTURED_OUTPUT: "Prompt only",
+    }
+    st.session_state.structured_output = st.selectbox(
+        "Structured output",
+        STRUCTURED_OUTPUT_MODES,
+        format_func=structured_output_labels.get,
+        help="How replies are held to the JSON schema. Use JSON mode or Prompt only for OpenAI-compatible servers without tool support.",
+    )
+    st.session_state.llm_format_fallback = st.checkbox(
+        "Format with the model as a fallback",
+        value=True,
+        help="Updated sections are laid out like the original locally. When the original layout can't be recognised, ask the model to format the section instead of showing plain text.",
+    )
+    st.session_state.variants = st.number_input(
+        "Variants per update",
+        min_value=1,
+        max_value=MAX_VARIANTS,
+        value=1,
+        help="Ask for several candidates for a section in one request, ranked by job description keyword coverage and the prompt's bullet rules.",
+    )
+    st.session_state.focus_skills = st.checkbox(
+        "Send only skill lines for Skills",
+        value=True,
+        help="The Skills update gets the skills found in the job description and the lines naming them instead of the whole description.",
+    )
+    st.session_state.bypass_response_cache = st.checkbox(
+        "Bypass response cache",
+        help="Always call the model when analyzing a resume, even if an identical analysis is cached.",
+    )
+    st.caption(
+        f"Response cache: {response_cache.hits} hits, {response_cache.misses} misses"
+    )
+    st.session_state.token_budget = st.number_input(
+        "Token budget per request (0 = unlimited)",
+        min_value=0,
+        value=0,
+        step=500,
+        help="Job descriptions and resumes are trimmed to their most relevant paragraphs when a prompt would exceed this many tokens.",
+    )
+    token_usage_caption = st.empty()
+    diagnostics = st.empty()
 
 st.header("AI Coach: Resume customization", divider="violet")
 st.caption("created by Education Victory")
@@ -30,13 +81,32 @@ for key, default_value in {
     "resume_analyzed": False,
     "resume_response": None,
     "company_name": "",
-    "resume_text": "",
+    "resume_text": None,
     "job_description": "",
     "file_type": "",
+    "resume_source": None,
+    "resume_sections": None,
     "active_tab": 0,
+    "token_usage": None,
+    "trace": None,
+    "jobs": {},
+    "job_errors": {},
 }.items():
     if key not in st.session_state:
         st.session_state[key] = default_value
+if st.session_state.token_usage is None:
+    st.session_state.token_usage = TokenUsage()
+set_usage_tracker(st.session_state.token_usage)
+if st.session_state.trace is None:
+    st.session_state.trace = Trace()
+set_trace(st.session_state.trace)
+commit_finished_jobs()
+if st.session_state.resume_analyzed and get_artifact("resume_response") is None:
+    # Evicted from the artifact store, which has no spill directory
+    st.session_state.resume_analyzed = False
+    st.warning(
+        "Your analysis expired from the server cache. Please analyze your resume again."
+    )
 
 st.subheader("1. Upload and Analyze Resume")
 file = st.file_uploader(
@@ -47,28 +117,22 @@ file = st.file_uploader(
 if file:
     with st.spinner("Extracting file text..."):
         try:
-            if file.type == "application/pdf":
-                # Open the uploaded PDF file
-                with fitz.open(stream=file.read(), filetype="pdf") as pdf_document:
-                    for page_num in range(len(pdf_document)):
-                        page = pdf_document.load_page(page_num)
-                        st.session_state.resume_text += page.get_text()
-                    st.session_state.file_type = "PDF"
-            elif (
-                file.type
-                == "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            ):
-                # Open the uploaded DOCX file
-                doc = Document(file)
-                for para in doc.paragraphs:
-                    st.session_state.resume_text += para.text + "\n"
-                st.session_state.file_type = "DOC"
-            elif file.type == "application/x-tex" or (
-                file.type == "application/octet-stream" and file.name.endswith(".tex")
-            ):
-                # Open the uploaded LaTeX file
-                st.session_state.resume_text = file.read().decode("utf-8")
-                st.session_state.file_type = "Latex"
+            # Extraction is cached by a hash of the file bytes, so reruns reuse
+            # the same text instead of re-reading (and appending) the file
+            file_hash, file_type, resume_text = extract_resume_text(
+                file.getvalue(), file.name, file.type
+            )
+            set_artifact("resume_text", resume_text)
+            st.session_state.file_type = file_type
+            # Kept so updated LaTeX sections can be written back into the source
+            set_artifact(
+                "resume_source",
+                file.getvalue().decode("utf-8") if file_type == "Latex" else None,
+            )
+            set_artifact(
+                "resume_sections",
+                extract_resume_sections(file.getvalue(), file_type, file_hash),
+            )
         except Exception as e:
             st.error(f"Error extracting text from file: {e}")
 
@@ -76,16 +140,10 @@ if st.button(
     "Analyze Resume",
     use_container_width=True,
     type="primary",
-    disabled=st.session_state.resume_analyzed,
+    disabled=st.session_state.resume_analyzed or "analyze" in session_jobs(),
 ):
-    with st.spinner("Analyzing resume..."):
-        resume_response = analyze_resume(st.session_state.resume_text)
-        if resume_response:
-            st.session_state.resume_analyzed = True
-            st.session_state.resume_response = resume_response
-            st.rerun()
-        else:
-            st.error("Failed to analyze your resume. Please try again.")
+    analyze_resume(get_artifact("resume_text"), get_artifact("resume_sections"))
+display_job("analyze", "Analyzing resume", render_resume_preview)
 
 if st.session_state.resume_analyzed:
     st.success("Resume analyzed successfully!")
@@ -98,7 +156,7 @@ if st.session_state.resume_analyzed:
     for i, (section_name, section_key, data_to_string_func) in enumerate(tab_details):
         with tabs[i]:
             original_data = (
-                st.session_state.resume_response.get(section_key, {})
+                get_artifact("resume_response", {}).get(section_key, {})
                 if section_key
                 else {}
             )
@@ -127,16 +185,22 @@ st.write("Job Description (required)")
 st.session_state.job_description = st.text_area(
     "Paste job description text:",
     value=st.session_state.job_description,  # Use the session state value if it exists
-    max_chars=12000,
+    max_chars=MAX_JOB_DESCRIPTION_CHARS,
     height=300,
     placeholder="Paste job description text here...",
     label_visibility="collapsed",
     disabled=not st.session_state.resume_analyzed,
 )
+display_job_match(st.session_state.job_description)
+if st.session_state.resume_analyzed:
+    display_posting_ranking()
 
 if st.session_state.resume_analyzed:
     st.header("3. Resume customization", divider="violet")
     active_tab = st.session_state.active_tab
+    update_all = st.button(
+        "Update all sections", type="primary", use_container_width=True
+    )
     tabs = st.tabs(["Skills", "Experiences", "Projects", "Generate Projects"])
     tab_details = [
         ("Skills", "skills", update_skill_prompt, Skill, skills_dict_to_string),
@@ -156,6 +220,7 @@ if st.session_state.resume_analyzed:
         ),
         ("Genprojects", None, generate_project_prompt, Project, None),
     ]
+    prompts = {}
     for i, (
         section_name,
         section_key,
@@ -166,32 +231,83 @@ if st.session_state.resume_analyzed:
         with tabs[i]:
             if active_tab == i:
                 st.session_state.active_tab = i
-            resume_response = st.session_state.resume_response
-            original_data = resume_response.get(section_key, {}) if section_key else {}
             st.subheader("Default Prompt", divider="rainbow")
             prompt_text = st.text_area(
                 "You can update the prompt based on your requirements",
                 update_prompt,
                 height=300,
             )
-            original_data = resume_response.get(section_key, {}) if section_key else {}
-            if section_name != "Genprojects":
-                original_data_str = data_to_string_func(original_data)
-            else:
-                original_data_str = ""
-            with st.spinner("Generating data..."):
-                update_section(
-                    section_name,
-                    st.session_state.company_name,
-                    st.session_state.job_description,
-                    original_data_str,
-                    prompt_text,
-                    pydantic_object,
-                    data_to_string_func,
-                    i,
-                )
-                display_results(section_name)
-            with st.spinner("Generateing formatted data..."):
-                display_format(section_name)
+            prompts[section_name] = prompt_text
+            update_section(
+                section_name,
+                st.session_state.company_name,
+                st.session_state.job_description,
+                prompt_text,
+                i,
+            )
+            display_job(
+                f"section:{section_name}",
+                f"Updating {section_name.lower()}",
+                render_section_preview(section_name),
+            )
+            display_variants(section_name)
+            display_results(section_name)
+            display_format(section_name)
+    if update_all:
+        update_all_sections(
+            st.session_state.company_name, st.session_state.job_description, prompts
+        )
+    st.header("4. Export", divider="violet")
+    display_export(file)
 else:
     st.warning("Please analyze resume before resume customization.")
+
+usage = st.session_state.token_usage
+token_usage_caption.caption(
+    f"Tokens this session: {usage.input_tokens} in, {usage.output_tokens} out "
+    f"over {usage.calls} calls ({usage.cached_tokens} in from prompt cache, "
+    f"{usage.trimmed_tokens} trimmed)"
+)
+
+# Filled last so the panel includes the stages that ran in this script run
+trace = st.session_state.trace
+spans = trace.snapshot()
+with diagnostics.container():
+    with st.expander("Diagnostics"):
+        if spans:
+            st.dataframe(trace.summary(), hide_index=True, use_container_width=True)
+            st.dataframe(
+                [span.to_dict() for span in spans[-20:]][::-1],
+                hide_index=True,
+                use_container_width=True,
+            )
+            st.download_button(
+                "Download trace (JSONL)",
+                to_jsonl(spans),
+                file_name="ai_coach_trace.jsonl",
+                mime="application/jsonl",
+            )
+            st.download_button(
+                "Download trace (OTLP JSON)",
+                json.dumps(to_otlp(spans)),
+                file_name="ai_coach_trace.otlp.json",
+                mime="application/json",
+            )
+        else:
+            st.caption("No stages recorded yet.")
+        queues = scheduler.stats()
+        if queues:
+            st.caption("Model call queues (all sessions)")
+            st.dataframe(queues, hide_index=True, use_container_width=True)
+        # Tables are only drawn once there is something to show: st.dataframe
+        # imports pandas and pyarrow, which the first page does not need
+        job_stats = jobs.stats()
+        if job_stats["submitted"]:
+            st.caption("Background jobs (all sessions)")
+            st.dataframe([job_stats], hide_index=True, use_container_width=True)
+        artifact_stats = artifacts.stats()
+        if artifact_stats["entries"]:
+            st.caption("Artifact store (all sessions)")
+            st.dataframe([artifact_stats], hide_index=True, use_container_width=True)
+
+poll_jobs()
@@ -0,0 +1,125 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+from cache import content_hash
+
+# Shared, content-addressed store for the large values sessions hold: resume
+# text and source, analyses, section text, diff HTML and formatted text.
+# Identical values from any session are kept once and session state keeps only
+# their handles. Once the serialized size of the values in memory passes
+# max_bytes the least recently used are evicted, written to spill_dir when one
+# is set (and read back on the next get) or dropped otherwise. Values are
+# shared between sessions, so callers must not mutate what get returns.
+
+ARTIFACT_BYTES = int(os.environ.get("AI_COACH_ARTIFACT_BYTES", str(128 * 1024 * 1024)))
+ARTIFACT_DIR = os.environ.get("AI_COACH_ARTIFACT_DIR") or None
+
+# Handle prefixes by how the value is serialized
+TEXT = "t"
+BINARY = "b"
+JSON = "j"
+
+
+def _encode(value):
+    if isinstance(value, str):
+        return TEXT, value.encode("utf-8")
+    if isinstance(value, bytes):
+        return BINARY, value
+    # Key order is kept, and hashed, so a dict comes back as it was put
+    return JSON, json.dumps(value).encode("utf-8")
+
+
+def _decode(kind, data):
+    if kind == TEXT:
+        return data.decode("utf-8")
+    if kind == BINARY:
+        return data
+    return json.loads(data)
+
+
+class ArtifactStore:
+    def __init__(self, max_bytes=ARTIFACT_BYTES, spill_dir=ARTIFACT_DIR):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spill_reads = 0
+        # handle -> (value, serialized size)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _spill_path(self, handle):
+        return os.path.join(self.spill_dir, handle.replace(":", "-"))
+
+    # Handle for value, storing it unless an identical value is already held;
+    # None for None
+    def put(self, value):
+        if value is None:
+            return None
+        kind, data = _encode(value)
+        handle = f"{kind}:{content_hash(data)}"
+        with self._lock:
+            if handle in self._data:
+                self._data.move_to_end(handle)
+            else:
+                # A copy, so later changes to value do not reach the store
+                self._insert(
+                    handle, _decode(kind, data) if kind == JSON else value, data
+                )
+        return handle
+
+    def _insert(self, handle, value, data):
+        self._data[handle] = (value, len(data))
+        self.bytes += len(data)
+        # The newest value stays even when it alone is over the budget
+        while self.bytes > self.max_bytes and len(self._data) > 1:
+            old_handle, (old_value, size) = self._data.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+            if self.spill_dir:
+                path = self._spill_path(old_handle)
+                if not os.path.exists(path):
+                    with open(path + ".tmp", "wb") as f:
+                        f.write(_encode(old_value)[1])
+                    os.replace(path + ".tmp", path)
+
+    # The value for handle, or None when there is none or it was dropped
+    def get(self, handle):
+        if not handle:
+            return None
+        with self._lock:
+            if handle in self._data:
+                self._data.move_to_end(handle)
+                self.hits += 1
+                return self._data[handle][0]
+            path = self.spill_dir and self._spill_path(handle)
+            if not path or not os.path.exists(path):
+                self.misses += 1
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+            value = _decode(handle.split(":", 1)[0], data)
+            self.spill_reads += 1
+            self._insert(handle, value, data)
+            return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "mb": round(self.bytes / 2**20, 2),
+                "budget_mb": round(self.max_bytes / 2**20, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "spill_reads": self.spill_reads,
+            }
+
+
+artifacts = ArtifactStore()
@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import argparse
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from core import (
+    SECTIONS,
+    LLMSettings,
+    analyze_resume_text,
+    customize_resume,
+)
+from export import EXTENSIONS, export_resume
+from extract import detect_file_type, extract_resume_sections, extract_resume_text
+from llm import FUNCTION_CALLING, STRUCTURED_OUTPUT_MODES, set_rate_limit
+from metrics import Trace, append_spans, track_trace
+from ranking import rank_postings
+from scheduler import scheduler
+from tokens import TokenUsage, track_usage
+
+RESUME_EXTENSIONS = (".pdf", ".docx", ".tex")
+
+
+def load_resumes(resume_dir):
+    resumes = []
+    for name in sorted(os.listdir(resume_dir)):
+        if name.lower().endswith(RESUME_EXTENSIONS):
+            resumes.append(os.path.join(resume_dir, name))
+    return resumes
+
+
+def load_jobs(jobs_path):
+    jobs = []
+    with open(jobs_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            jobs.append(
+                {
+                    "id": job.get("id", line_number),
+                    "company_name": job.get("company_name") or job.get("company", ""),
+                    "job_description": job["job_description"],
+                }
+            )
+    return jobs
+
+
+class JsonlWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def analyze_file(settings, path):
+    with open(path, "rb") as f:
+        data = f.read()
+    file_hash, file_type, resume_text = extract_resume_text(
+        data, os.path.basename(path), ""
+    )
+    sections = extract_resume_sections(data, file_type, file_hash)
+    analysis = analyze_resume_text(settings, resume_text, sections=sections)
+    latex_source = data.decode("utf-8") if file_type == "Latex" else None
+    return analysis, latex_source
+
+
+# (job, ranking entry) for the top jobs for an analyzed resume by local fit,
+# or every job unranked when top is 0. Jobs with a blank description are
+# never among the top.
+def top_jobs(analysis, jobs, top):
+    if not top:
+        return [(job, None) for job in jobs]
+    jobs = [job for job in jobs if job["job_description"].strip()]
+    ranked = rank_postings([job["job_description"] for job in jobs], analysis)
+    return [(jobs[entry["index"]], entry) for entry in ranked[:top]]
+
+
+# Writes the resume with its updated sections patched in to export_dir and
+# returns the written path
+def export_file(path, job_id, result, export_dir):
+    with open(path, "rb") as f:
+        data = f.read()
+    file_type = detect_file_type(os.path.basename(path), "")
+    formatted = {
+        section_key: result["sections"][section_name]["formatted"]
+        for section_name, section_key, _, _, _ in SECTIONS
+        if section_key and section_name in result["sections"]
+    }
+    stem = os.path.splitext(os.path.basename(path))[0]
+    out_path = os.path.join(export_dir, f"{stem}_{job_id}{EXTENSIONS[file_type]}")
+    with open(out_path, "wb") as f:
+        f.write(export_resume(data, file_type, formatted))
+    return out_path
+
+
+def run_batch(
+    settings,
+    resume_paths,
+    jobs,
+    writer,
+    workers=4,
+    sections=SECTIONS,
+    llm_format=True,
+    export_dir=None,
+    top=0,
+):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+
+        # Workers run in the caller's context so token usage is still tracked
+        def submit(func, *args):
+            return pool.submit(contextvars.copy_context().run, func, *args)
+
+        # Analyze each resume once, then fan out over every job description
+        analyses = {}
+        futures = {submit(analyze_file, settings, path): path for path in resume_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                analyses[path] = future.result()
+            except Exception as error:
+                writer.write(
+                    {
+                        "resume": os.path.basename(path),
+                        "stage": "analyze",
+                        "error": f"{type(error).__name__}: {error}",
+                    }
+                )
+
+        futures = {
+            submit(
+                customize_resume,
+                settings,
+                analysis,
+                job["company_name"],
+                job["job_description"],
+                sections,
+                latex_source,
+                llm_format,
+            ): (path, job, entry)
+            for path, (analysis, latex_source) in analyses.items()
+            for job, entry in top_jobs(analysis, jobs, top)
+        }
+        for future in as_completed(futures):
+            path, job, entry = futures[future]
+            record = {
+                "resume": os.path.basename(path),
+                "job_id": job["id"],
+                "company_name": job["company_name"],
+            }
+            if entry is not None:
+                record.update(
+                    fit=entry["fit"], matched=entry["matched"], missing=entry["missing"]
+                )
+            try:
+                record.update(future.result())
+            except Exception as error:
+                record["error"] = f"{type(error).__name__}: {error}"
+            if export_dir and record.get("sections"):
+                try:
+                    record["export"] = export_file(path, job["id"], record, export_dir)
+                except Exception as error:
+                    record["export_error"] = f"{type(error).__name__}: {error}"
+            writer.write(record)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Tailor every resume in a directory to every job description in a JSONL file."
+    )
+    parser.add_argument("resume_dir", help="Directory of PDF, DOCX or LaTeX resumes")
+    parser.add_argument(
+        "jobs",
+        help='JSONL file, one {"id", "company_name", "job_description"} object per line',
+    )
+    parser.add_argument(
+        "-o", "--output", default="-", help="Output JSONL file (default: stdout)"
+    )
+    parser.add_argument("--api-base", default="https://api.openai.com/v1")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", ""))
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=60,
+        help="Requests per minute allowed for the API key (0 disables the limit)",
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        default=0,
+        help="Maximum prompt tokens per request; longer inputs are trimmed (0 = unlimited)",
+    )
+    parser.add_argument(
+        "--structured-output",
+        choices=STRUCTURED_OUTPUT_MODES,
+        default=FUNCTION_CALLING,
+        help="How replies are held to the JSON schema",
+    )
+    parser.add_argument(
+        "--no-llm-format",
+        action="store_true",
+        help="Keep the plain section text when the original layout can't be recognised instead of formatting it with the model",
+    )
+    parser.add_argument(
+        "--export-dir",
+        help="Also write each tailored resume, in its original format, to this directory",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        help="Only customize each resume for its N best-fitting jobs, ranked locally (0 = all jobs)",
+    )
+    parser.add_argument("--trace", help="Write per-stage spans to this JSONL file")
+    parser.add_argument(
+        "--sections",
+        default=",".join(section[0] for section in SECTIONS),
+        help="Comma-separated sections to update",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or OPENAI_API_KEY)")
+    wanted = {name.strip().lower() for name in args.sections.split(",")}
+    sections = [section for section in SECTIONS if section[0].lower() in wanted]
+    set_rate_limit(args.api_key, max(args.rpm, 0))
+    # Every worker's section calls may wait at once; queue them all rather
+    # than turning any away
+    scheduler.max_queued = max(scheduler.max_queued, args.workers * len(SECTIONS))
+    if args.export_dir:
+        os.makedirs(args.export_dir, exist_ok=True)
+
+    settings = LLMSettings(
+        args.api_base,
+        args.api_key,
+        args.model,
+        args.token_budget,
+        args.structured_output,
+    )
+    output = (
+        sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    )
+    try:
+        # Spans are only kept (unbounded) when they will be written out
+        trace = Trace(max_spans=None) if args.trace else None
+        with track_usage(TokenUsage()) as usage, track_trace(trace):
+            run_batch(
+                settings,
+                load_resumes(args.resume_dir),
+                load_jobs(args.jobs),
+                JsonlWriter(output),
+                args.workers,
+                sections,
+                not args.no_llm_format,
+                args.export_dir,
+                args.top,
+            )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    if trace is not None:
+        append_spans(args.trace, trace.snapshot())
+    print(
+        f"{usage.calls} calls, {usage.input_tokens} input tokens, "
+        f"{usage.output_tokens} output tokens, {usage.cached_tokens} cached, "
+        f"{usage.trimmed_tokens} trimmed",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
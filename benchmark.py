@@ -0,0 +1,261 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+# Keep benchmark analyses out of the app's response cache
+os.environ.setdefault(
+    "AI_COACH_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3")
+)
+
+import fitz
+from docx import Document
+
+from core import (
+    SECTIONS,
+    LLMSettings,
+    add_company_product,
+    analyze_resume_text,
+    company_product_cache,
+    company_product_query,
+    fetch_company_product,
+    format_cache,
+    format_section_text,
+    original_section_key,
+    section_to_string,
+    update_section_data,
+)
+from diff import diff_html
+from extract import _extract
+from segment import segment_resume
+from fake_server import serve_in_background
+from utils import highlight_changes
+
+# End-to-end timing of every pipeline stage against the local fake endpoint.
+# Save a run with --json and pass it back with --baseline to fail on
+# regressions beyond --tolerance.
+
+SAMPLE_JOB_DESCRIPTION = """We are hiring a backend engineer to build data-intensive services.
+
+Requirements: Python, Go, Kubernetes, PostgreSQL, Kafka and AWS. Experience
+designing REST and gRPC APIs, CI/CD pipelines and observability tooling.
+
+You will own services end to end, collaborate with product teams and mentor
+other engineers."""
+
+
+def sample_resume_lines(pages, name=""):
+    lines = [name] if name else []
+    lines += ["SKILLS", "Programming Languages: Python, Go, TypeScript, Java"]
+    lines += ["Frameworks and Tools: Django, React, Kubernetes, Docker", ""]
+    for page in range(pages):
+        lines.append("EXPERIENCE" if page == 0 else "")
+        for job in range(3):
+            lines.append(f"Company {page}-{job} | Software Engineer | 2020 - 2023")
+            for bullet in range(4):
+                lines.append(
+                    f"• Built service {bullet} with Python and PostgreSQL, cutting "
+                    f"latency by {10 + bullet * 5}% for {job + 1}00k users."
+                )
+        lines.append("PROJECTS")
+        lines.append(f"Project {page}: Kafka event pipeline on AWS with Go workers")
+    return lines
+
+
+def sample_documents(pages, name=""):
+    lines = sample_resume_lines(pages, name)
+    per_page = -(-len(lines) // pages)
+
+    pdf = fitz.open()
+    for start in range(0, len(lines), per_page):
+        page = pdf.new_page()
+        page.insert_textbox(
+            fitz.Rect(50, 50, 560, 800),
+            "\n".join(lines[start : start + per_page]),
+            fontsize=9,
+        )
+    pdf_bytes = pdf.tobytes()
+    pdf.close()
+
+    doc = Document()
+    for line in lines:
+        doc.add_paragraph(line)
+    docx_buffer = io.BytesIO()
+    doc.save(docx_buffer)
+
+    tex = (
+        "\\documentclass{article}\n\\begin{document}\n"
+        + "\n".join(line.replace("%", "\\%") + "\\\\" for line in lines)
+        + "\n\\end{document}\n"
+    )
+    return {
+        "PDF": pdf_bytes,
+        "DOC": docx_buffer.getvalue(),
+        "Latex": tex.encode("utf-8"),
+    }
+
+
+# Process-wide result caches are cleared before each timed call, so every
+# iteration measures the work itself and not a cache hit
+def timed(samples, stage, func, *args, **kwargs):
+    company_product_cache.clear()
+    format_cache.clear()
+    diff_html.cache_clear()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    samples.setdefault(stage, []).append(time.perf_counter() - start)
+    return result
+
+
+def run_iteration(settings, documents, samples):
+    resume_text = ""
+    for file_type, data in documents.items():
+        text = timed(samples, f"extract_{file_type.lower()}", _extract, data, file_type)
+        segments = timed(
+            samples, f"segment_{file_type.lower()}", segment_resume, data, file_type
+        )
+        if file_type == "PDF":
+            resume_text, sections = text, segments
+
+    resume_response = timed(
+        samples,
+        "analyze",
+        analyze_resume_text,
+        settings,
+        resume_text,
+        use_cache=False,
+        sections=sections,
+    )
+    company_product = timed(
+        samples,
+        "company_product",
+        fetch_company_product,
+        settings,
+        company_product_query("Acme"),
+    )
+    for section_name, section_key, prompt_text, schema, to_string in SECTIONS:
+        original_data_str = (
+            to_string(resume_response.get(section_key, {})) if section_key else ""
+        )
+        if section_name == "Genprojects":
+            prompt_text = add_company_product(prompt_text, company_product)
+        response = timed(
+            samples,
+            f"update_{section_name.lower()}",
+            update_section_data,
+            settings,
+            section_name,
+            original_data_str,
+            SAMPLE_JOB_DESCRIPTION,
+            prompt_text,
+            schema,
+        )
+        new_data_str = section_to_string(
+            section_name, response.get(section_name.lower(), {}), to_string
+        )
+        timed(samples, "diff", highlight_changes, original_data_str, new_data_str)
+        timed(
+            samples,
+            "format",
+            format_section_text,
+            settings,
+            section_name,
+            resume_response.get(original_section_key(section_name), ""),
+            new_data_str,
+        )
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(samples):
+    return {
+        stage: {
+            "n": len(values),
+            "mean_ms": 1000 * sum(values) / len(values),
+            "p50_ms": 1000 * percentile(values, 0.5),
+            "p95_ms": 1000 * percentile(values, 0.95),
+            "min_ms": 1000 * min(values),
+        }
+        for stage, values in samples.items()
+    }
+
+
+def find_regressions(summary, baseline, tolerance):
+    regressions = []
+    for stage, stats in summary.items():
+        previous = baseline.get(stage)
+        if previous and stats["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+            regressions.append((stage, previous["p50_ms"], stats["p50_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark each pipeline stage against a local fake OpenAI endpoint."
+    )
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--pages", type=int, default=2, help="Pages in the sample resume"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Fake time to first byte (s)"
+    )
+    parser.add_argument(
+        "--chunk-rate", type=float, default=0.0, help="Fake streamed chunks per second"
+    )
+    parser.add_argument("--replay", help="Recorded completions for the fake server")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--json", help="Write the summary to this file")
+    parser.add_argument("--baseline", help="Summary JSON from an earlier run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed p50 slowdown against the baseline (0.25 = 25%%)",
+    )
+    args = parser.parse_args(argv)
+
+    server = serve_in_background(
+        latency=args.latency, chunk_rate=args.chunk_rate, replay_path=args.replay
+    )
+    settings = LLMSettings(server.api_base, "sk-benchmark", args.model)
+    documents = sample_documents(args.pages)
+    try:
+        for _ in range(args.warmup):
+            run_iteration(settings, documents, {})
+        samples = {}
+        for _ in range(args.iterations):
+            run_iteration(settings, documents, samples)
+    finally:
+        server.shutdown()
+
+    summary = summarize(samples)
+    print(f"{'stage':<22}{'n':>5}{'mean ms':>11}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, stats in summary.items():
+        print(
+            f"{stage:<22}{stats['n']:>5}{stats['mean_ms']:>11.2f}"
+            f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(summary, baseline, args.tolerance)
+        for stage, before, after in regressions:
+            print(f"REGRESSION {stage}: p50 {before:.2f} ms -> {after:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,975 @@
+import os
+import json
+import time
+import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Any
+from langchain_core.exceptions import OutputParserException
+from langchain_core.pydantic_v1 import BaseModel, Field, ValidationError, create_model
+from cache import LRUCache, ResponseCache, content_hash
+from latex import write_back
+from layout import render_layout
+from llm import FUNCTION_CALLING, get_chain, get_model, run_async
+from metrics import current_span, stage
+from scheduler import scheduler
+from segment import tex_section_spans
+from skills import job_skill_digest, skill_words
+from repair import (
+    clean_json,
+    fix_json_query,
+    fix_schema_query,
+    narrow_broken,
+    repair_json,
+)
+from variants import rank_variants
+from tokens import (
+    SECTION_KEYWORDS,
+    count_tokens,
+    keywords,
+    record_trimmed,
+    record_usage,
+    trim_to_budget,
+)
+from prompt import *
+
+# Streamlit-free resume pipeline: analyze -> update each section -> format.
+# utils.py wraps these for the app and batch.py drives them from the CLI.
+
+
+class Resume(BaseModel):
+    skills: Dict[str, List[str]] = Field(
+        description="Dictionary of tech skills with categories as keys and lists of skills as values"
+    )
+    skills_original: str = Field(description="Original text for skills section")
+    experiences: List[Dict[str, Any]] = Field(
+        description="List of work experience entries"
+    )
+    experiences_original: str = Field(
+        description="Original text for experiences section"
+    )
+    projects: List[Dict[str, Any]] = Field(description="List of project entries")
+    projects_original: str = Field(description="Original text for projects section")
+
+
+class Format(BaseModel):
+    text: str = Field(description="New test with original format")
+
+
+class Skill(BaseModel):
+    skills: Dict[str, List[str]] = Field(
+        description="Dictionary of tech skills with categories as keys and lists of skills as values"
+    )
+
+
+class Experience(BaseModel):
+    company: str = Field(description="Name of the company")
+    role: str = Field(description="Role in the company")
+    details: List[str] = Field(description="List of details about the work experience")
+
+
+class CompanyProduct(BaseModel):
+    products: List[str] = Field(
+        description="List of main products and services offered by the company, each as a single formatted string"
+    )
+
+
+class Project(BaseModel):
+    name: str = Field(description="Name of the project")
+    technologies: List[str] = Field(
+        description="List of technologies used in the project"
+    )
+    details: List[str] = Field(description="List of details about the project")
+
+
+@dataclass(frozen=True)
+class LLMSettings:
+    api_base: str
+    api_key: str
+    model: str = "gpt-4"
+    # Maximum prompt tokens per request; 0 means unlimited
+    token_budget: int = 0
+    # One of llm.STRUCTURED_OUTPUT_MODES
+    structured_output: str = FUNCTION_CALLING
+    # Send the Skills update only the skills and skill lines of the job
+    # description (skills.job_skill_digest) instead of all of it
+    focus_skills: bool = True
+
+
+def skills_dict_to_string(skills_dict):
+    skills_str = ""
+    for category, skills in skills_dict.items():
+        skills_str += f'{category}: {", ".join(skills)}\n'
+    return skills_str.strip()
+
+
+def experiences_list_to_string(experiences_list):
+    experiences_str = ""
+    for experience in experiences_list:
+        company = experience.get("company", "")
+        role = experience.get("role", "")
+        details = experience.get("details", [])
+        details_str = "\n    ".join(details)
+        experiences_str += (
+            f"Company: {company}\nRole: {role}\nDetails:\n    {details_str}\n\n"
+        )
+    return experiences_str.strip()
+
+
+def projects_list_to_string(projects_list):
+    projects_str = ""
+    for project in projects_list:
+        name = project.get("name", "")
+        technologies = project.get("technologies", [])
+        details = project.get("details", [])
+        technologies_str = ", ".join(technologies)
+        details_str = "\n    ".join(details)
+        projects_str += f"Project Name: {name}\nTechnologies: {technologies_str}\nDetails:\n    {details_str}\n\n"
+    return projects_str.strip()
+
+
+# (section name, resume_response key, default prompt, schema, to-string func)
+SECTIONS = [
+    ("Skills", "skills", update_skill_prompt, Skill, skills_dict_to_string),
+    (
+        "Experiences",
+        "experiences",
+        update_experience_prompt,
+        Experience,
+        experiences_list_to_string,
+    ),
+    ("Projects", "projects", update_project_prompt, Project, projects_list_to_string),
+    ("Genprojects", None, generate_project_prompt, Project, None),
+]
+
+
+def section_to_string(section_name, data, data_to_string_func):
+    return (
+        data_to_string_func(data)
+        if data_to_string_func
+        else projects_list_to_string(data)
+    )
+
+
+SECTION_KEYS = ("skills", "experiences", "projects")
+ORIGINAL_KEYS = tuple(f"{key}_original" for key in SECTION_KEYS)
+
+
+def original_section_key(section_name):
+    if section_name == "Genprojects":
+        return "projects_original"
+    return f"{section_name.lower()}_original"
+
+
+# analyze_resume results survive restarts and are shared by every session
+response_cache = ResponseCache(
+    os.environ.get("AI_COACH_CACHE_PATH", ".ai_coach_cache.sqlite3")
+)
+
+# Company products and format passes depend only on their prompt, model and
+# section text, so every session and job in the process shares the results
+company_product_cache = LRUCache(256)
+format_cache = LRUCache(512)
+
+PARTIAL_RENDER_INTERVAL = 0.1
+
+
+# func() memoized in cache under key, noting a hit on the current span
+def cached_call(cache, key, func):
+    result = cache.get(key)
+    current_span().set(cache_hit=result is not None)
+    if result is None:
+        result = func()
+        cache.put(key, result)
+    return result
+
+
+async def acached_call(cache, key, coro_func):
+    result = cache.get(key)
+    current_span().set(cache_hit=result is not None)
+    if result is None:
+        result = await coro_func()
+        cache.put(key, result)
+    return result
+
+
+# Stream the completion and feed partially parsed JSON to render as it grows;
+# the final text goes through parse_locally, so truncated output that local
+# repair cannot complete is sent to fix_json
+def stream_chain(settings, pydantic_object, inputs, render=None):
+    prompt, model, parser = chain_steps(settings, pydantic_object)
+    with scheduler.slot(settings.api_key, settings.model) as ticket:
+        with stage(
+            "llm", schema=pydantic_object.__name__, model=settings.model
+        ) as span:
+            span.set(**ticket.span_attributes())
+            prompt_value = prompt.invoke(inputs)
+            text = ""
+            usage_metadata = None
+            last_render = 0.0
+            for chunk in model.stream(prompt_value):
+                if not text:
+                    span.set(first_token_ms=round((time.time() - span.start) * 1000, 1))
+                text += chunk_text(chunk)
+                usage_metadata = chunk.usage_metadata or usage_metadata
+                if render and time.monotonic() - last_render > PARTIAL_RENDER_INTERVAL:
+                    last_render = time.monotonic()
+                    render_partial(parser, text, render)
+            record_llm_span(
+                span, settings, prompt_value.to_string(), text, usage_metadata
+            )
+    with stage("parse", schema=pydantic_object.__name__, payload_chars=len(text)):
+        response = parse_locally(parser, text)
+    if response is None:
+        response = fix_json(settings, text, pydantic_object)
+    return response
+
+
+async def astream_chain(settings, pydantic_object, inputs, render=None):
+    prompt, model, parser = chain_steps(settings, pydantic_object)
+    async with scheduler.aslot(settings.api_key, settings.model) as ticket:
+        with stage(
+            "llm", schema=pydantic_object.__name__, model=settings.model
+        ) as span:
+            span.set(**ticket.span_attributes())
+            prompt_value = await prompt.ainvoke(inputs)
+            text = ""
+            usage_metadata = None
+            last_render = 0.0
+            async for chunk in model.astream(prompt_value):
+                if not text:
+                    span.set(first_token_ms=round((time.time() - span.start) * 1000, 1))
+                text += chunk_text(chunk)
+                usage_metadata = chunk.usage_metadata or usage_metadata
+                if render and time.monotonic() - last_render > PARTIAL_RENDER_INTERVAL:
+                    last_render = time.monotonic()
+                    render_partial(parser, text, render)
+            record_llm_span(
+                span, settings, prompt_value.to_string(), text, usage_metadata
+            )
+    with stage("parse", schema=pydantic_object.__name__, payload_chars=len(text)):
+        response = parse_locally(parser, text)
+    if response is None:
+        response = await afix_json(settings, text, pydantic_object)
+    return response
+
+
+# Candidates from one non-streaming request with the n parameter. Candidates
+# that do not parse, even after local repair, are dropped rather than sent
+# back to the model; it is an error only when none are left.
+async def agenerate_variants(settings, pydantic_object, inputs, n):
+    prompt, model, parser = chain_steps(settings, pydantic_object, n)
+    async with scheduler.aslot(settings.api_key, settings.model) as ticket:
+        with stage(
+            "llm", schema=pydantic_object.__name__, model=settings.model, n=n
+        ) as span:
+            span.set(**ticket.span_attributes())
+            prompt_value = await prompt.ainvoke(inputs)
+            result = await model.bound.agenerate(
+                [prompt_value.to_messages()], **model.kwargs
+            )
+            messages = [generation.message for generation in result.generations[0]]
+            texts = [message_text(message) for message in messages]
+            record_llm_span(
+                span,
+                settings,
+                prompt_value.to_string(),
+                "".join(texts),
+                messages[0].usage_metadata if messages else None,
+            )
+    with stage(
+        "parse", schema=pydantic_object.__name__, payload_chars=sum(map(len, texts))
+    ) as span:
+        responses = [parse_locally(parser, text) for text in texts]
+        responses = [response for response in responses if response is not None]
+        span.set(dropped=len(texts) - len(responses))
+    if not responses:
+        raise OutputParserException("No candidate returned valid JSON")
+    return responses
+
+
+def chain_steps(settings, pydantic_object, n=1):
+    return get_chain(
+        settings.api_base,
+        settings.api_key,
+        settings.model,
+        pydantic_object,
+        settings.structured_output,
+        n,
+    ).steps
+
+
+# Forced tool calls stream their JSON as argument deltas instead of content
+def chunk_text(chunk):
+    return chunk.content + "".join(
+        tool_call.get("args") or "" for tool_call in chunk.tool_call_chunks
+    )
+
+
+# Same for a complete message, using the raw arguments so invalid JSON can
+# still be repaired
+def message_text(message):
+    return message.content + "".join(
+        tool_call["function"].get("arguments") or ""
+        for tool_call in message.additional_kwargs.get("tool_calls", [])
+    )
+
+
+# Strict parse, then local repair; either result is kept only when it fits the
+# schema, so output cut off mid-value is not taken as complete. None means the
+# model has to fix the JSON
+def parse_locally(parser, text):
+    cleaned = clean_json(text)
+    try:
+        response = json.loads(cleaned)
+    except ValueError:
+        response = repair_json(cleaned)
+        current_span().set(repair="local" if response is not None else "model")
+    if response is not None:
+        try:
+            parser.pydantic_object.parse_obj(response)
+        except ValidationError:
+            current_span().set(repair="model")
+            response = None
+    return response
+
+
+# Only the smallest object or list that fails to parse is sent back when the
+# rest is intact, so a broken bullet costs a short completion instead of
+# regenerating the whole section. JSON that parses but does not fit the schema
+# is sent whole with the validation errors, so missing fields can be filled in.
+def fix_json_request(text, pydantic_object):
+    cleaned = clean_json(text)
+    parsed = repair_json(cleaned)
+    if parsed is not None:
+        try:
+            pydantic_object.parse_obj(parsed)
+        except ValidationError as validation_error:
+            fragment = json.dumps(parsed, ensure_ascii=False)
+            return (
+                (None, None, None),
+                fragment,
+                fix_schema_query(fragment, validation_error),
+            )
+    root, holder, key, fragment = narrow_broken(cleaned) or (None, None, None, cleaned)
+    try:
+        json.loads(fragment)
+        error = "truncated or malformed"
+    except ValueError as decode_error:
+        error = str(decode_error)
+    return (root, holder, key), fragment, fix_json_query(fragment, error)
+
+
+# The repaired response, validated like one parsed locally
+def merge_fixed_json(target, fixed_text, pydantic_object):
+    fixed = repair_json(fixed_text)
+    if fixed is None:
+        raise OutputParserException(f"Invalid json output after repair: {fixed_text}")
+    root, holder, key = target
+    if root is not None:
+        holder[key] = fixed
+        fixed = root
+    try:
+        pydantic_object.parse_obj(fixed)
+    except ValidationError as error:
+        raise OutputParserException(f"Output does not match the schema: {error}")
+    return fixed
+
+
+def fix_json(settings, text, pydantic_object):
+    target, fragment, query = fix_json_request(text, pydantic_object)
+    model = get_model(settings.api_base, settings.api_key, settings.model)
+    with scheduler.slot(settings.api_key, settings.model) as ticket:
+        with stage(
+            "repair", model=settings.model, fragment_chars=len(fragment)
+        ) as span:
+            span.set(**ticket.span_attributes())
+            message = model.invoke(query)
+            fixed_text = message.content
+            record_llm_span(span, settings, query, fixed_text, message.usage_metadata)
+    return merge_fixed_json(target, fixed_text, pydantic_object)
+
+
+async def afix_json(settings, text, pydantic_object):
+    target, fragment, query = fix_json_request(text, pydantic_object)
+    model = get_model(settings.api_base, settings.api_key, settings.model)
+    async with scheduler.aslot(settings.api_key, settings.model) as ticket:
+        with stage(
+            "repair", model=settings.model, fragment_chars=len(fragment)
+        ) as span:
+            span.set(**ticket.span_attributes())
+            message = await model.ainvoke(query)
+            fixed_text = message.content
+            record_llm_span(span, settings, query, fixed_text, message.usage_metadata)
+    return merge_fixed_json(target, fixed_text, pydantic_object)
+
+
+def record_llm_span(span, settings, prompt_text, completion_text, usage_metadata=None):
+    reported = usage_metadata or {}
+    cached_tokens = span.attributes.get("cached_tokens", 0)
+    input_tokens, output_tokens = record_usage(
+        settings.model,
+        prompt_text,
+        completion_text,
+        reported.get("input_tokens"),
+        reported.get("output_tokens"),
+        cached_tokens,
+    )
+    span.set(
+        prompt_chars=len(prompt_text),
+        completion_chars=len(completion_text),
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_tokens=cached_tokens,
+        prompt_cache_rate=(
+            round(cached_tokens / input_tokens, 3) if input_tokens else 0.0
+        ),
+        retries=max(0, span.attributes.get("http_requests", 1) - 1),
+    )
+
+
+def render_partial(parser, text, render):
+    from langchain_core.outputs import Generation
+
+    try:
+        partial = parser.parse_result([Generation(text=text)], partial=True)
+        if partial:
+            render(partial)
+    except Exception:
+        # Partial output is only a preview; the final parse reports real errors
+        pass
+
+
+# When settings.token_budget is set, trim text so that it plus fixed_parts and
+# the schema's format instructions fit, keeping the most relevant paragraphs
+def fit_to_budget(settings, pydantic_object, text, fixed_parts, relevant_words):
+    if not settings.token_budget:
+        return text
+    prompt = chain_steps(settings, pydantic_object)[0]
+    fixed_tokens = count_tokens(
+        prompt.format(instructions="", query=""), settings.model
+    ) + sum(count_tokens(part, settings.model) for part in fixed_parts)
+    trimmed = trim_to_budget(
+        text, settings.token_budget - fixed_tokens, settings.model, relevant_words
+    )
+    if trimmed != text:
+        record_trimmed(
+            count_tokens(text, settings.model) - count_tokens(trimmed, settings.model)
+        )
+    return trimmed
+
+
+def analyze_query(resume_text):
+    return "given resume_text:\n" + resume_text + "\n"
+
+
+def analyze_cache_key(settings, resume_text, prompt=analyze_resume_prompt):
+    return content_hash(content_hash(resume_text), settings.model, content_hash(prompt))
+
+
+# Resume without the *_original fields whose text was segmented locally
+@lru_cache(maxsize=None)
+def resume_schema(missing_originals):
+    if len(missing_originals) == len(ORIGINAL_KEYS):
+        return Resume
+    return create_model(
+        "Resume",
+        **{
+            name: (field.outer_type_, Field(description=field.field_info.description))
+            for name, field in Resume.__fields__.items()
+            if name not in ORIGINAL_KEYS or name in missing_originals
+        },
+    )
+
+
+def sections_text(sections):
+    return "\n\n".join(
+        f"{key.upper()}\n{sections[key]}" for key in SECTION_KEYS if key in sections
+    )
+
+
+# sections maps "skills" / "experiences" / "projects" to text found by
+# segment.segment_resume. Found sections are used as the *_original values as
+# is, and when all three are found only their text is sent for analysis.
+def analyze_resume_text(
+    settings, resume_text, render=None, use_cache=True, sections=None
+):
+    sections = {key: text for key, text in (sections or {}).items() if text}
+    missing = tuple(
+        original
+        for key, original in zip(SECTION_KEYS, ORIGINAL_KEYS)
+        if key not in sections
+    )
+    schema = resume_schema(missing)
+    prompt = analyze_resume_prompt if schema is Resume else analyze_fields_prompt
+    if not missing:
+        resume_text = sections_text(sections)
+    resume_text = fit_to_budget(
+        settings,
+        schema,
+        resume_text,
+        [prompt, analyze_query("")],
+        set().union(*SECTION_KEYWORDS.values()),
+    )
+    cache_key = analyze_cache_key(
+        settings, resume_text, prompt if schema is Resume else prompt + repr(missing)
+    )
+    with stage(
+        "analyze", resume_chars=len(resume_text), segmented=len(sections)
+    ) as span:
+        if use_cache:
+            cached = response_cache.get(cache_key)
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+        response = stream_chain(
+            settings,
+            schema,
+            {"instructions": prompt, "query": analyze_query(resume_text)},
+            render,
+        )
+        response.update({f"{key}_original": text for key, text in sections.items()})
+        response_cache.put(cache_key, response)
+        return response
+
+
+def company_product_query(company_name):
+    return f"Company: {company_name}\n"
+
+
+def company_product_key(settings, query):
+    return content_hash(settings.model, company_product_prompt, query)
+
+
+def fetch_company_product(settings, query):
+    inputs = {"instructions": company_product_prompt, "query": query}
+    with stage("company_product"):
+        return cached_call(
+            company_product_cache,
+            company_product_key(settings, query),
+            lambda: stream_chain(settings, CompanyProduct, inputs),
+        )
+
+
+async def afetch_company_product(settings, query):
+    inputs = {"instructions": company_product_prompt, "query": query}
+    with stage("company_product"):
+        return await acached_call(
+            company_product_cache,
+            company_product_key(settings, query),
+            lambda: astream_chain(settings, CompanyProduct, inputs),
+        )
+
+
+def add_company_product(update_prompt, company_product):
+    if company_product:
+        products_list = company_product["products"]
+        formatted_products = "\n\n".join(products_list)
+    else:
+        formatted_products = ""
+    return "Company Product: " + formatted_products + "\n\n" + update_prompt
+
+
+# The job description comes first so requests for the same job share a longer
+# cached prefix; prompt_text goes in the system message
+def update_section_query(section_name, original_data_str, job_description):
+    return (
+        "given job description:\n"
+        + job_description
+        + f"\nand original {section_name.lower()}:\n"
+        + original_data_str
+        + "\n"
+    )
+
+
+# Experience and Project describe a single entry while the section prompts ask
+# for {"experiences": [...]}, so wrap them to match what the app reads back
+@lru_cache(maxsize=None)
+def section_schema(section_name, pydantic_object):
+    key = section_name.lower()
+    if key in pydantic_object.__fields__:
+        return pydantic_object
+    return create_model(
+        section_name,
+        **{
+            key: (
+                List[pydantic_object],
+                Field(description=f"List of {key} entries"),
+            )
+        },
+    )
+
+
+def update_section_inputs(
+    settings, section_name, original_data_str, job_description, prompt_text, schema
+):
+    if section_name == "Skills" and settings.focus_skills:
+        job_description = job_skill_digest(job_description)
+    job_description = fit_to_budget(
+        settings,
+        schema,
+        job_description,
+        [prompt_text, update_section_query(section_name, original_data_str, "")],
+        keywords(original_data_str)
+        | SECTION_KEYWORDS.get(section_name, set())
+        | skill_words(job_description),
+    )
+    return {
+        "instructions": prompt_text,
+        "query": update_section_query(section_name, original_data_str, job_description),
+    }
+
+
+def update_section_data(
+    settings,
+    section_name,
+    original_data_str,
+    job_description,
+    prompt_text,
+    pydantic_object,
+    render=None,
+):
+    schema = section_schema(section_name, pydantic_object)
+    with stage("update", section=section_name):
+        return stream_chain(
+            settings,
+            schema,
+            update_section_inputs(
+                settings,
+                section_name,
+                original_data_str,
+                job_description,
+                prompt_text,
+                schema,
+            ),
+            render,
+        )
+
+
+async def aupdate_section_data(
+    settings,
+    section_name,
+    original_data_str,
+    job_description,
+    prompt_text,
+    pydantic_object,
+    render=None,
+):
+    schema = section_schema(section_name, pydantic_object)
+    with stage("update", section=section_name):
+        return await astream_chain(
+            settings,
+            schema,
+            update_section_inputs(
+                settings,
+                section_name,
+                original_data_str,
+                job_description,
+                prompt_text,
+                schema,
+            ),
+            render,
+        )
+
+
+def format_query(section_name, original_data, new_data):
+    return f"""
+    Here is the original resume content:
+    {original_data}
+
+    Here is the new content for the {section_name} section:
+    {new_data}
+    """
+
+
+def clean_formatted_text(response):
+    response_str = json.dumps(response["text"])
+    formatted_text = response_str.replace("\\n", "\n").replace("\\\\", "\\")
+    return formatted_text.strip('"')
+
+
+def format_key(settings, section_name, original_data, new_data):
+    return content_hash(
+        settings.model, format_prompt, section_name, original_data, new_data
+    )
+
+
+def format_section_text(settings, section_name, original_data, new_data, render=None):
+    inputs = {
+        "instructions": format_prompt,
+        "query": format_query(section_name, original_data, new_data),
+    }
+    with stage("format", section=section_name):
+        return cached_call(
+            format_cache,
+            format_key(settings, section_name, original_data, new_data),
+            lambda: clean_formatted_text(
+                stream_chain(settings, Format, inputs, render)
+            ),
+        )
+
+
+async def aformat_section_text(
+    settings, section_name, original_data, new_data, render=None
+):
+    inputs = {
+        "instructions": format_prompt,
+        "query": format_query(section_name, original_data, new_data),
+    }
+
+    async def format_text():
+        return clean_formatted_text(
+            await astream_chain(settings, Format, inputs, render)
+        )
+
+    with stage("format", section=section_name):
+        return await acached_call(
+            format_cache,
+            format_key(settings, section_name, original_data, new_data),
+            format_text,
+        )
+
+
+# The LaTeX source of the section whose original text section_name is
+# formatted against, or None when it cannot be found
+def latex_section_source(source, section_name):
+    section_key = original_section_key(section_name)[: -len("_original")]
+    span = tex_section_spans(source).get(section_key)
+    return source[span[0] : span[1]].strip("\n") if span else None
+
+
+# For LaTeX resumes the updated lines are written straight into the section's
+# source, so no format call is needed. Returns None when a change cannot be
+# placed (or for Genprojects) and the format pass has to run instead.
+def write_back_section(source, section_name, original_data_str, new_data_str):
+    if section_name == "Genprojects":
+        return None
+    with stage("format", section=section_name, method="latex_write_back") as span:
+        section_source = latex_section_source(source, section_name)
+        formatted_text = section_source and write_back(
+            section_source, original_data_str, new_data_str
+        )
+        span.set(written_back=bool(formatted_text))
+        return formatted_text or None
+
+
+# Re-renders new_data in the layout of the original section text without a
+# model call; None when the layout cannot be inferred
+def render_section_locally(section_name, resume_response, new_data):
+    original_key = original_section_key(section_name)
+    with stage("format", section=section_name, method="layout") as span:
+        formatted_text = render_layout(
+            original_key[: -len("_original")],
+            resume_response.get(original_key, ""),
+            resume_response.get(original_key[: -len("_original")]),
+            new_data,
+        )
+        span.set(rendered=formatted_text is not None)
+        return formatted_text
+
+
+# Formatted text for new section data: written back into latex_source when the
+# resume is LaTeX, else laid out like the original locally, with the model's
+# format pass as the fallback unless llm_format is False
+async def aformat_section_data(
+    settings,
+    resume_response,
+    section_name,
+    original_data_str,
+    new_data_str,
+    new_data,
+    latex_source=None,
+    llm_format=True,
+):
+    formatted_text = latex_source and write_back_section(
+        latex_source, section_name, original_data_str, new_data_str
+    )
+    if not formatted_text and not latex_source:
+        formatted_text = render_section_locally(section_name, resume_response, new_data)
+    if not formatted_text and not llm_format:
+        formatted_text = new_data_str
+    if not formatted_text:
+        original_data = resume_response.get(original_section_key(section_name), "")
+        if latex_source:
+            original_data = (
+                latex_section_source(latex_source, section_name) or original_data
+            )
+        formatted_text = await aformat_section_text(
+            settings, section_name, original_data, new_data_str
+        )
+    return formatted_text
+
+
+async def asection_prompt(settings, section_name, prompt_text, company_name):
+    if section_name != "Genprojects":
+        return prompt_text
+    company_product = await afetch_company_product(
+        settings, company_product_query(company_name)
+    )
+    return add_company_product(prompt_text, company_product)
+
+
+# Update one section (a SECTIONS entry) for a job description and format it.
+# render receives the partially streamed section data.
+async def atailor_section(
+    settings,
+    resume_response,
+    company_name,
+    job_description,
+    section,
+    latex_source=None,
+    llm_format=True,
+    render=None,
+):
+    section_name, section_key, prompt_text, schema, to_string = section
+    original_data_str = (
+        to_string(resume_response.get(section_key, {})) if section_key else ""
+    )
+    response = await aupdate_section_data(
+        settings,
+        section_name,
+        original_data_str,
+        job_description,
+        await asection_prompt(settings, section_name, prompt_text, company_name),
+        schema,
+        render and (lambda partial: render(partial.get(section_name.lower()))),
+    )
+    new_data = response.get(section_name.lower(), {})
+    new_data_str = section_to_string(section_name, new_data, to_string)
+    formatted_text = await aformat_section_data(
+        settings,
+        resume_response,
+        section_name,
+        original_data_str,
+        new_data_str,
+        new_data,
+        latex_source,
+        llm_format,
+    )
+    return {"data": new_data, "text": new_data_str, "formatted": formatted_text}
+
+
+# n candidate section updates from one request, ranked locally by job
+# description coverage and the prompt's bullet rules and formatted
+# concurrently; returns {"variants": [result with "scores", ...]} best first
+async def atailor_section_variants(
+    settings,
+    resume_response,
+    company_name,
+    job_description,
+    section,
+    n,
+    latex_source=None,
+    llm_format=True,
+):
+    section_name, section_key, prompt_text, schema, to_string = section
+    original_data = resume_response.get(section_key, {}) if section_key else {}
+    original_data_str = to_string(original_data) if section_key else ""
+    prompt_text = await asection_prompt(
+        settings, section_name, prompt_text, company_name
+    )
+    schema = section_schema(section_name, schema)
+    with stage("update", section=section_name, variants=n):
+        responses = await agenerate_variants(
+            settings,
+            schema,
+            update_section_inputs(
+                settings,
+                section_name,
+                original_data_str,
+                job_description,
+                prompt_text,
+                schema,
+            ),
+            n,
+        )
+    with stage("rank", section=section_name, candidates=len(responses)):
+        ranked = rank_variants(
+            [response.get(section_name.lower(), {}) for response in responses],
+            original_data,
+            job_description,
+            prompt_text,
+        )
+
+    async def variant(scores, new_data):
+        new_data_str = section_to_string(section_name, new_data, to_string)
+        formatted_text = await aformat_section_data(
+            settings,
+            resume_response,
+            section_name,
+            original_data_str,
+            new_data_str,
+            new_data,
+            latex_source,
+            llm_format,
+        )
+        return {
+            "data": new_data,
+            "text": new_data_str,
+            "formatted": formatted_text,
+            "scores": scores,
+        }
+
+    return {
+        "variants": await asyncio.gather(
+            *(variant(scores, new_data) for scores, new_data in ranked)
+        )
+    }
+
+
+# Run every section for one analyzed resume and one job description, with the
+# sections (and Genprojects' company lookup) in flight concurrently.
+# latex_source is the .tex the resume came from, if any.
+async def acustomize_resume(
+    settings,
+    resume_response,
+    company_name,
+    job_description,
+    sections=SECTIONS,
+    latex_source=None,
+    llm_format=True,
+):
+    results = await asyncio.gather(
+        *(
+            atailor_section(
+                settings,
+                resume_response,
+                company_name,
+                job_description,
+                section,
+                latex_source,
+                llm_format,
+            )
+            for section in sections
+        ),
+        return_exceptions=True,
+    )
+    sections_out, errors = {}, {}
+    for section, result in zip(sections, results):
+        if isinstance(result, Exception):
+            errors[section[0]] = f"{type(result).__name__}: {result}"
+        else:
+            sections_out[section[0]] = result
+    return {"sections": sections_out, "errors": errors}
+
+
+def customize_resume(
+    settings,
+    resume_response,
+    company_name,
+    job_description,
+    sections=SECTIONS,
+    latex_source=None,
+    llm_format=True,
+):
+    return run_async(
+        acustomize_resume(
+            settings,
+            resume_response,
+            company_name,
+            job_description,
+            sections,
+            latex_source,
+            llm_format,
+        )
+    )
@@ -0,0 +1,163 @@
+import re
+from html import escape
+from functools import lru_cache
+
+# Line-then-word diff for the section previews. Lines are compared with Myers'
+# O((N+M)D) algorithm after trimming the common prefix and suffix; lines that
+# were edited rather than replaced are diffed again word by word so only the
+# changed words are highlighted.
+
+ADDED_STYLE = "color: green; background-color: #e6ffe6"
+REMOVED_STYLE = "color: red; background-color: #ffe6e6"
+# Edit distance past which Myers gives up and reports a plain replacement
+MAX_EDIT_DISTANCE = 2000
+# Fraction of a line's words that must survive for an inline word diff
+MIN_LINE_SIMILARITY = 0.5
+TOKEN_RE = re.compile(r"\s+|\w+|[^\w\s]")
+
+
+def _myers(a, b):
+    n, m = len(a), len(b)
+    v = {1: 0}
+    trace = []
+    for d in range(min(n + m, MAX_EDIT_DISTANCE) + 1):
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return [("delete", i, None) for i in range(n)] + [
+        ("insert", None, j) for j in range(m)
+    ]
+
+
+def _backtrack(trace, x, y):
+    ops = []
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            ops.append(("equal", x, y))
+        if d > 0:
+            if x == prev_x:
+                ops.append(("insert", None, y - 1))
+            else:
+                ops.append(("delete", x - 1, None))
+        x, y = prev_x, prev_y
+    ops.reverse()
+    return ops
+
+
+# Edit script over two sequences as ("equal" | "delete" | "insert", i, j)
+# steps, where i indexes a and j indexes b
+def diff_sequences(a, b):
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < len(a) - prefix
+        and suffix < len(b) - prefix
+        and a[len(a) - 1 - suffix] == b[len(b) - 1 - suffix]
+    ):
+        suffix += 1
+    middle = _myers(a[prefix : len(a) - suffix], b[prefix : len(b) - suffix])
+    return (
+        [("equal", i, i) for i in range(prefix)]
+        + [
+            (
+                tag,
+                None if i is None else i + prefix,
+                None if j is None else j + prefix,
+            )
+            for tag, i, j in middle
+        ]
+        + [("equal", len(a) - suffix + i, len(b) - suffix + i) for i in range(suffix)]
+    )
+
+
+def _span(style, text):
+    return f'<span style="{style}">{escape(text)}</span>'
+
+
+def _word_diff(old_line, new_line):
+    old_words = TOKEN_RE.findall(old_line)
+    new_words = TOKEN_RE.findall(new_line)
+    ops = diff_sequences(old_words, new_words)
+    kept = sum(1 for tag, i, _ in ops if tag == "equal" and old_words[i].strip())
+    total = max(
+        sum(1 for word in old_words if word.strip()),
+        sum(1 for word in new_words if word.strip()),
+    )
+    if not total or kept / total < MIN_LINE_SIMILARITY:
+        return None
+    parts, removed, added = [], [], []
+    for tag, i, j in ops + [("equal", None, None)]:
+        if tag == "delete":
+            removed.append(old_words[i])
+        elif tag == "insert":
+            added.append(new_words[j])
+        else:
+            if removed:
+                parts.append(_span(REMOVED_STYLE, "".join(removed)))
+            if added:
+                parts.append(_span(ADDED_STYLE, "".join(added)))
+            removed, added = [], []
+            if i is not None:
+                parts.append(escape(old_words[i]))
+    return "".join(parts)
+
+
+def _changed_lines(removed, added):
+    parts = []
+    for old_line, new_line in zip(removed, added):
+        merged = _word_diff(old_line, new_line)
+        if merged is None:
+            parts.append(_span(REMOVED_STYLE, old_line) + "<br>")
+            parts.append(_span(ADDED_STYLE, new_line) + "<br>")
+        else:
+            parts.append(merged + "<br>")
+    for old_line in removed[len(added) :]:
+        parts.append(_span(REMOVED_STYLE, old_line) + "<br>")
+    for new_line in added[len(removed) :]:
+        parts.append(_span(ADDED_STYLE, new_line) + "<br>")
+    return parts
+
+
+# HTML for the changes from original to new: removed text in red, added text
+# in green, lines joined with <br>. Regenerating a section diffs the same
+# strings again, so results are memoized.
+@lru_cache(maxsize=256)
+def diff_html(original, new):
+    original_lines = original.splitlines()
+    new_lines = new.splitlines()
+    parts, removed, added = [], [], []
+    for tag, i, j in diff_sequences(original_lines, new_lines) + [
+        ("equal", None, None)
+    ]:
+        if tag == "delete":
+            removed.append(original_lines[i])
+        elif tag == "insert":
+            added.append(new_lines[j])
+        else:
+            parts.extend(_changed_lines(removed, added))
+            removed, added = [], []
+            if i is not None:
+                parts.append(escape(original_lines[i]) + "<br>")
+    return "".join(parts)
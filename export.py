@@ -0,0 +1,258 @@
+import io
+import copy
+
+from cache import LRUCache, content_hash
+from diff import diff_sequences
+from latex import escape_latex
+from metrics import stage
+from segment import (
+    docx_paragraph_lines,
+    pdf_line_boxes,
+    section_line_indices,
+    tex_section_spans,
+)
+
+# Patches the updated skills, experiences and projects text into the uploaded
+# document: DOCX paragraphs keep their styles and numbering, PDF sections are
+# redacted and re-set in the freed space, and LaTeX sections are replaced in
+# the source. Each export is written once to a single buffer and shared by
+# every session through a small LRU, so session state only holds the inputs.
+# fitz and python-docx are imported on first export of their file type.
+
+EXPORT_CACHE_SIZE = 16
+EXTENSIONS = {"DOC": ".docx", "PDF": ".pdf", "Latex": ".tex"}
+MIME_TYPES = {
+    "DOC": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "PDF": "application/pdf",
+    "Latex": "application/x-tex",
+}
+# Built-in Helvetica, embedded so bullets and dashes outside Latin-1 render
+PDF_FONT = "helv"
+PDF_FONT_NAME = "export-helv"
+# Text that no longer fits its section is set smaller, down to this size;
+# text that does not fit even then fails the export rather than being cut
+MIN_PDF_FONT_SIZE = 6.0
+PDF_FONT_STEP = 0.5
+
+export_cache = LRUCache(EXPORT_CACHE_SIZE)
+_pdf_font_buffer = None
+
+
+def _insert_pdf_font(page):
+    global _pdf_font_buffer
+    import fitz
+
+    if _pdf_font_buffer is None:
+        _pdf_font_buffer = fitz.Font(PDF_FONT).buffer
+    page.insert_font(fontname=PDF_FONT_NAME, fontbuffer=_pdf_font_buffer)
+
+
+# Edits turning old_lines into new_lines as ("replace", i, text),
+# ("insert", i, text) for a line going after old line i (-1 for before the
+# first) and ("delete", i, None)
+def line_edits(old_lines, new_lines):
+    edits, removed, added = [], [], []
+    anchor = -1
+    for tag, i, j in diff_sequences(old_lines, new_lines) + [("equal", None, None)]:
+        if tag == "delete":
+            removed.append(i)
+        elif tag == "insert":
+            added.append(new_lines[j])
+        else:
+            for old, text in zip(removed, added):
+                edits.append(("replace", old, text))
+                anchor = old
+            for text in added[len(removed) :]:
+                edits.append(("insert", anchor, text))
+            for old in removed[len(added) :]:
+                edits.append(("delete", old, None))
+            removed, added = [], []
+            if i is not None:
+                anchor = i
+    return edits
+
+
+def _set_paragraph_text(paragraph, text):
+    runs = paragraph.runs
+    if not runs:
+        paragraph.add_run(text)
+        return
+    # The first run's formatting carries the whole line
+    runs[0].text = text
+    for run in runs[1:]:
+        run._element.getparent().remove(run._element)
+
+
+def _copy_paragraph(paragraph, text, before=False):
+    from docx.text.paragraph import Paragraph
+
+    element = copy.deepcopy(paragraph._element)
+    if before:
+        paragraph._element.addprevious(element)
+    else:
+        paragraph._element.addnext(element)
+    new_paragraph = Paragraph(element, paragraph._parent)
+    _set_paragraph_text(new_paragraph, text)
+    return new_paragraph
+
+
+def export_docx(data, sections, out):
+    from docx import Document
+
+    document = Document(io.BytesIO(data))
+    paragraphs = document.paragraphs
+    body = section_line_indices(docx_paragraph_lines(paragraphs))
+    for section, text in sections.items():
+        if section not in body:
+            continue
+        old = [paragraphs[i] for i in body[section]]
+        new_lines = [line for line in text.splitlines() if line.strip()]
+        last_inserted = {}
+        for tag, i, line in line_edits([p.text.rstrip() for p in old], new_lines):
+            if tag == "replace":
+                _set_paragraph_text(old[i], line)
+            elif tag == "delete":
+                old[i]._element.getparent().remove(old[i]._element)
+            elif i < 0:
+                # Insert before the first line, copying its style
+                last_inserted[i] = _copy_paragraph(
+                    last_inserted.get(i, old[0]), line, before=i not in last_inserted
+                )
+            else:
+                last_inserted[i] = _copy_paragraph(last_inserted.get(i, old[i]), line)
+    document.save(out)
+
+
+# Union rect of each page's lines, in reading order
+def _regions(boxes):
+    import fitz
+
+    regions = []
+    for page_number, rect in boxes:
+        if regions and regions[-1][0] == page_number:
+            regions[-1][1].include_rect(rect)
+        else:
+            regions.append((page_number, fitz.Rect(rect)))
+    return regions
+
+
+# How many of lines fit in each region at fontsize, tried on a scratch page
+def _fit(regions, lines, fontsize):
+    import fitz
+
+    counts, start = [], 0
+    with fitz.open() as scratch:
+        for _, rect in regions:
+            page = scratch.new_page(width=rect.x1 + 1, height=rect.y1 + 1)
+            _insert_pdf_font(page)
+            count = len(lines) - start
+            while (
+                count
+                and page.insert_textbox(
+                    rect,
+                    "\n".join(lines[start : start + count]),
+                    fontsize=fontsize,
+                    fontname=PDF_FONT_NAME,
+                )
+                < 0
+            ):
+                count -= 1
+            counts.append(count)
+            start += count
+    return counts, start == len(lines)
+
+
+def export_pdf(data, sections, out):
+    import fitz
+
+    with fitz.open(stream=data, filetype="pdf") as pdf_document:
+        boxes = pdf_line_boxes(pdf_document)
+        body = section_line_indices([(text, styled) for text, styled, _, _ in boxes])
+        placements = []
+        for section, text in sections.items():
+            if section not in body:
+                continue
+            line_boxes = [boxes[i][2:] for i in body[section]]
+            regions = _regions(line_boxes)
+            lines = [line for line in text.splitlines() if line.strip()]
+            fontsize = max(rect.height for _, rect in line_boxes) / 1.2
+            counts, fits = _fit(regions, lines, fontsize)
+            while not fits and fontsize - PDF_FONT_STEP >= MIN_PDF_FONT_SIZE:
+                fontsize -= PDF_FONT_STEP
+                counts, fits = _fit(regions, lines, fontsize)
+            if not fits:
+                raise ValueError(
+                    f"the new {section} text does not fit its space in the PDF even "
+                    f"at {MIN_PDF_FONT_SIZE:g} pt ({sum(counts)} of {len(lines)} "
+                    "lines fit); shorten it or export from a DOCX or LaTeX resume"
+                )
+            for page_number, rect in line_boxes:
+                pdf_document[page_number].add_redact_annot(rect)
+            start = 0
+            for (page_number, rect), count in zip(regions, counts):
+                placements.append(
+                    (
+                        page_number,
+                        rect,
+                        "\n".join(lines[start : start + count]),
+                        fontsize,
+                    )
+                )
+                start += count
+        for page in pdf_document:
+            page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
+        for page_number in sorted({placement[0] for placement in placements}):
+            _insert_pdf_font(pdf_document[page_number])
+        for page_number, rect, text, fontsize in placements:
+            pdf_document[page_number].insert_textbox(
+                rect, text, fontsize=fontsize, fontname=PDF_FONT_NAME
+            )
+        pdf_document.save(out, garbage=3, deflate=True)
+
+
+# Sections from the LaTeX write-back are already source; plain text (from a
+# failed write-back with the model fallback off) is escaped line by line
+def _latex_section(text):
+    if "\\" in text:
+        return text
+    return " \\\\\n".join(
+        escape_latex(line) for line in text.splitlines() if line.strip()
+    )
+
+
+def export_latex(source, sections, out):
+    spans = tex_section_spans(source)
+    edits = sorted(
+        (spans[section], text) for section, text in sections.items() if section in spans
+    )
+    for (start, end), text in reversed(edits):
+        source = source[:start] + "\n" + _latex_section(text) + "\n" + source[end:]
+    out.write(source.encode("utf-8"))
+
+
+def _export(data, file_type, sections):
+    out = io.BytesIO()
+    if file_type == "DOC":
+        export_docx(data, sections, out)
+    elif file_type == "PDF":
+        export_pdf(data, sections, out)
+    elif file_type == "Latex":
+        export_latex(data.decode("utf-8"), sections, out)
+    else:
+        raise ValueError("Unsupported file type")
+    return out.getvalue()
+
+
+# The uploaded document with sections ({"skills": text, ...}) patched in, as
+# bytes. Identical exports are built once.
+def export_resume(data, file_type, sections):
+    with stage(
+        "export", file_type=file_type, sections=",".join(sorted(sections))
+    ) as span:
+        span.set(cache_hit=True)
+        exported = export_cache.get_or_compute(
+            content_hash(data, file_type, sections),
+            lambda: span.set(cache_hit=False) or _export(data, file_type, sections),
+        )
+        span.set(payload_bytes=len(exported))
+    return exported
@@ -0,0 +1,124 @@
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import LRUCache, content_hash
+from latex import latex_to_text
+from metrics import stage
+from segment import segment_resume
+
+# fitz and python-docx are imported where they are used: a session only needs
+# the parser for the file type it uploads, and none is needed before an upload
+
+DOCX_MIME_TYPE = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+)
+# Extracted text for the most recent uploads, keyed by a hash of the file bytes
+# and shared across sessions
+EXTRACTION_CACHE_SIZE = 128
+# PDFs with at least this many pages are split into page ranges and extracted
+# in a worker pool; smaller ones are not worth the process round trip
+PARALLEL_PAGE_THRESHOLD = 8
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+extraction_cache = LRUCache(EXTRACTION_CACHE_SIZE)
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # fitz is not fork-safe inside Streamlit's threaded server, so spawn
+        _pool = ProcessPoolExecutor(
+            max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def extract_pdf_pages(data, start, stop):
+    import fitz
+
+    with fitz.open(stream=data, filetype="pdf") as pdf_document:
+        return [pdf_document.load_page(i).get_text() for i in range(start, stop)]
+
+
+def extract_pdf_text(data):
+    import fitz
+
+    with fitz.open(stream=data, filetype="pdf") as pdf_document:
+        page_count = len(pdf_document)
+        if page_count < PARALLEL_PAGE_THRESHOLD or MAX_WORKERS < 2:
+            return "".join(
+                pdf_document.load_page(i).get_text() for i in range(page_count)
+            )
+    step = -(-page_count // MAX_WORKERS)
+    ranges = [
+        (start, min(start + step, page_count)) for start in range(0, page_count, step)
+    ]
+    futures = [
+        _get_pool().submit(extract_pdf_pages, data, start, stop)
+        for start, stop in ranges
+    ]
+    # Join in page order so the result does not depend on worker timing
+    return "".join("".join(future.result()) for future in futures)
+
+
+def extract_docx_text(data):
+    from docx import Document
+
+    doc = Document(io.BytesIO(data))
+    return "".join(para.text + "\n" for para in doc.paragraphs)
+
+
+def detect_file_type(file_name, mime_type):
+    if mime_type == "application/pdf":
+        return "PDF"
+    if mime_type == DOCX_MIME_TYPE:
+        return "DOC"
+    if mime_type == "application/x-tex" or (
+        mime_type == "application/octet-stream" and file_name.endswith(".tex")
+    ):
+        return "Latex"
+    return {".pdf": "PDF", ".docx": "DOC", ".tex": "Latex"}.get(
+        os.path.splitext(file_name)[1].lower(), ""
+    )
+
+
+def _extract(data, file_type):
+    if file_type == "PDF":
+        return extract_pdf_text(data)
+    if file_type == "DOC":
+        return extract_docx_text(data)
+    if file_type == "Latex":
+        # Plain text without the preamble and markup, a fraction of the source
+        return latex_to_text(data.decode("utf-8")).text
+    raise ValueError("Unsupported file type")
+
+
+# Returns (file_hash, file_type, text); each unique file is extracted once
+def extract_resume_text(data, file_name, mime_type):
+    file_type = detect_file_type(file_name, mime_type)
+    file_hash = content_hash(data)
+    with stage("extract", file_type=file_type, payload_bytes=len(data)) as span:
+        span.set(cache_hit=True)
+        text = extraction_cache.get_or_compute(
+            (file_hash, file_type),
+            lambda: span.set(cache_hit=False) or _extract(data, file_type),
+        )
+        span.set(text_chars=len(text))
+    return file_hash, file_type, text
+
+
+# Skills, experiences and projects text found from the file's headings and
+# layout, cached alongside the extracted text
+def extract_resume_sections(data, file_type, file_hash=None):
+    file_hash = file_hash or content_hash(data)
+    with stage("segment", file_type=file_type) as span:
+        span.set(cache_hit=True)
+        sections = extraction_cache.get_or_compute(
+            (file_hash, file_type, "sections"),
+            lambda: span.set(cache_hit=False) or segment_resume(data, file_type),
+        )
+        span.set(sections=",".join(sorted(sections)))
+    return sections
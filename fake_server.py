@@ -0,0 +1,503 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# OpenAI-compatible stand-in for /v1/chat/completions. Point the app's
+# "OpenAI API Base" (or LLMSettings.api_base) at http://host:port/v1 to run the
+# whole pipeline offline. The schema a request asks for is read from the
+# format instructions in the prompt, and the reply is either replayed from a
+# recorded JSONL file or synthesized.
+
+DETAIL = (
+    "Implemented a {tech}-based service for {area}, reducing p95 latency by {n}% "
+    "and improving reliability for {m}k daily users."
+)
+# Prompt caching as OpenAI does it: prefixes of at least ~1024 tokens are
+# cached in ~128 token blocks (approximated as 4 characters per token)
+PREFIX_BLOCK = 512
+MIN_CACHED_PREFIX = 4096
+MAX_CACHED_PREFIXES = 100000
+TECHNOLOGIES = ["Python", "Go", "React", "Kubernetes", "PostgreSQL", "Kafka", "AWS"]
+AREAS = ["billing", "search", "onboarding", "analytics", "notifications"]
+
+
+def _detail(rng):
+    return DETAIL.format(
+        tech=rng.choice(TECHNOLOGIES),
+        area=rng.choice(AREAS),
+        n=rng.randint(10, 60),
+        m=rng.randint(5, 500),
+    )
+
+
+def _projects(rng, count, bullets):
+    return [
+        {
+            "name": f"{rng.choice(AREAS).title()} Platform {i + 1}",
+            "technologies": rng.sample(TECHNOLOGIES, 3),
+            "details": [_detail(rng) for _ in range(bullets)],
+        }
+        for i in range(count)
+    ]
+
+
+def _experiences(rng, count, bullets):
+    return [
+        {
+            "company": f"Company {i + 1}",
+            "role": "Software Engineer",
+            "details": [_detail(rng) for _ in range(bullets)],
+        }
+        for i in range(count)
+    ]
+
+
+def _skills(rng):
+    return {
+        "Programming Languages": ["Python", "Go", "TypeScript", "Java"],
+        "Frameworks and Tools": rng.sample(TECHNOLOGIES, 5),
+        "Databases": ["PostgreSQL", "Redis", "MongoDB", "MySQL"],
+    }
+
+
+# The schema comes from the forced tool's parameters when the request uses
+# function calling, otherwise from the format instructions in the prompt
+def detect_schema(prompt, tools=None):
+    if tools:
+        properties = set(tools[0]["function"]["parameters"].get("properties", {}))
+        return schema_from_properties(properties)
+    marker = "Here is the output schema:\n```\n"
+    if marker not in prompt:
+        return None
+    schema_text = prompt.split(marker, 1)[1].split("\n```", 1)[0]
+    try:
+        properties = set(json.loads(schema_text).get("properties", {}))
+    except ValueError:
+        return None
+    return schema_from_properties(properties)
+
+
+def schema_from_properties(properties):
+    if "skills_original" in properties or {"skills", "experiences"} <= properties:
+        return "Resume"
+    if properties == {"skills"}:
+        return "Skill"
+    if properties == {"products"}:
+        return "CompanyProduct"
+    if properties == {"text"}:
+        return "Format"
+    if "company" in properties or properties == {"experiences"}:
+        return "Experience"
+    if "technologies" in properties or properties & {"projects", "genprojects"}:
+        return "Project"
+    return None
+
+
+# Drop the first comma between list items, which no local repair can undo
+def corrupt(content):
+    return content.replace('", "', '" "', 1)
+
+
+# Answer to core.fix_json: the fragment after the prompt's blank line with the
+# corruption above undone
+def fix_fragment(prompt):
+    fragment = prompt.split("\n\n", 1)[1].strip()
+    return re.sub(r'"\s+"', '", "', fragment)
+
+
+def synthesize(schema, prompt, rng):
+    if schema == "Resume":
+        skills = _skills(rng)
+        experiences = _experiences(rng, 2, 4)
+        projects = _projects(rng, 2, 3)
+        return {
+            "skills": skills,
+            "skills_original": "\n".join(
+                f"{category}: {', '.join(items)}" for category, items in skills.items()
+            ),
+            "experiences": experiences,
+            "experiences_original": "\n".join(
+                f"{e['company']} - {e['role']}\n" + "\n".join(e["details"])
+                for e in experiences
+            ),
+            "projects": projects,
+            "projects_original": "\n".join(
+                f"{p['name']}\n" + "\n".join(p["details"]) for p in projects
+            ),
+        }
+    if schema == "Skill":
+        return {"skills": _skills(rng)}
+    if schema == "Experience":
+        return {"experiences": _experiences(rng, 2, 5)}
+    if schema == "Project":
+        key = "genprojects" if "genprojects" in prompt else "projects"
+        return {key: _projects(rng, 3 if key == "genprojects" else 2, 4)}
+    if schema == "CompanyProduct":
+        return {
+            "products": [
+                f"{area.title()} Cloud: managed {area} for businesses" for area in AREAS
+            ]
+        }
+    if schema == "Format":
+        return {"text": "\n".join(_detail(rng) for _ in range(4))}
+    return {}
+
+
+def cached_prefix_chars(seen, text):
+    cached = 0
+    for end in range(PREFIX_BLOCK, len(text) + 1, PREFIX_BLOCK):
+        key = hash(text[:end])
+        if key in seen:
+            cached = end
+        else:
+            seen.add(key)
+    if len(seen) > MAX_CACHED_PREFIXES:
+        seen.clear()
+    return cached if cached >= MIN_CACHED_PREFIX else 0
+
+
+class Replay:
+    def __init__(self, path):
+        self.completions = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.completions.setdefault(record["schema"], []).append(
+                        record["content"]
+                    )
+
+    def next(self, schema):
+        with self._lock:
+            completions = self.completions.get(schema)
+            if not completions:
+                return None
+            position = self._positions.get(schema, 0)
+            self._positions[schema] = position + 1
+            return completions[position % len(completions)]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set by make_server
+    latency = 0.0
+    chunk_rate = 0.0
+    chunk_size = 16
+    replay = None
+    seed = 0
+    invalid_rate = 0.0
+    throttle_rate = 0.0
+    retry_after = 1.0
+    stats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": []})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        # Not seeded by the prompt, so a retried request can get through
+        if random.random() < self.throttle_rate:
+            with self.stats["lock"]:
+                self.stats["throttled"] += 1
+            body = b'{"error": {"message": "Rate limit reached", "type": "requests"}}'
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Retry-After", str(self.retry_after))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        prompt = "\n".join(
+            message["content"]
+            for message in request.get("messages", [])
+            if isinstance(message.get("content"), str)
+        )
+        tools = request.get("tools")
+        schema = detect_schema(prompt, tools)
+        rng = random.Random(f"{self.seed}:{prompt}")
+        content = self.replay.next(schema) if self.replay else None
+        if prompt.startswith("The JSON below is invalid"):
+            schema = "fix"
+            content = fix_fragment(prompt)
+        elif content is None:
+            response = synthesize(schema, prompt, rng)
+            if schema == "Resume" and "skills_original" not in prompt + json.dumps(
+                tools
+            ):
+                # Original text was segmented locally and is not requested
+                response = {
+                    key: value
+                    for key, value in response.items()
+                    if not key.endswith("_original")
+                }
+            content = json.dumps(response)
+        if schema != "fix" and rng.random() < self.invalid_rate:
+            content = corrupt(content)
+        tool_name = tools[0]["function"]["name"] if tools else None
+        # Tools precede the messages in the prefix the provider caches
+        cache_text = json.dumps(tools) + "".join(
+            f"{message.get('role')}:{message.get('content')}\n"
+            for message in request.get("messages", [])
+        )
+        with self.stats["lock"]:
+            self.stats["requests"] += 1
+            self.stats["by_schema"][schema] = self.stats["by_schema"].get(schema, 0) + 1
+            cached = cached_prefix_chars(self.stats["prefixes"], cache_text) // 4
+            self.stats["cached_tokens"] += cached
+
+        contents = [content]
+        if schema != "fix":
+            # Further choices (the n parameter) are drawn independently
+            contents += [
+                json.dumps(
+                    synthesize(
+                        schema, prompt, random.Random(f"{self.seed}:{prompt}:{i}")
+                    )
+                )
+                for i in range(1, request.get("n") or 1)
+            ]
+        completion_chars = sum(len(content) for content in contents)
+        usage = {
+            "prompt_tokens": len(cache_text) // 4,
+            "completion_tokens": completion_chars // 4,
+            "total_tokens": (len(cache_text) + completion_chars) // 4,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+        time.sleep(self.latency)
+        if request.get("stream"):
+            self._stream(request, content, usage, tool_name)
+        else:
+            self._send_json(
+                200,
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [
+                        {
+                            "index": i,
+                            "message": self._message(choice, tool_name),
+                            "finish_reason": "tool_calls" if tool_name else "stop",
+                        }
+                        for i, choice in enumerate(contents)
+                    ],
+                    "usage": usage,
+                },
+            )
+
+    def _message(self, content, tool_name):
+        if not tool_name:
+            return {"role": "assistant", "content": content}
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": "call_fake",
+                    "type": "function",
+                    "function": {"name": tool_name, "arguments": content},
+                }
+            ],
+        }
+
+    def _stream(self, request, content, usage, tool_name=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None, **extra):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+                **extra,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def delta(piece):
+            if not tool_name:
+                return {"content": piece}
+            return {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}
+
+        if tool_name:
+            event(
+                {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "index": 0,
+                            "id": "call_fake",
+                            "type": "function",
+                            "function": {"name": tool_name, "arguments": ""},
+                        }
+                    ],
+                }
+            )
+        else:
+            event({"role": "assistant", "content": ""})
+        for start in range(0, len(content), self.chunk_size):
+            if self.chunk_rate:
+                time.sleep(1.0 / self.chunk_rate)
+            event(delta(content[start : start + self.chunk_size]))
+        event({}, "tool_calls" if tool_name else "stop")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [],
+                "usage": usage,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def make_server(
+    host="127.0.0.1",
+    port=0,
+    latency=0.0,
+    chunk_rate=0.0,
+    chunk_size=16,
+    replay_path=None,
+    seed=0,
+    invalid_rate=0.0,
+    throttle_rate=0.0,
+    retry_after=1.0,
+):
+    handler = type(
+        "ConfiguredFakeOpenAIHandler",
+        (FakeOpenAIHandler,),
+        {
+            "latency": latency,
+            "chunk_rate": chunk_rate,
+            "chunk_size": chunk_size,
+            "replay": Replay(replay_path) if replay_path else None,
+            "seed": seed,
+            "invalid_rate": invalid_rate,
+            "throttle_rate": throttle_rate,
+            "retry_after": retry_after,
+            "stats": {
+                "lock": threading.Lock(),
+                "requests": 0,
+                "throttled": 0,
+                "by_schema": {},
+                "cached_tokens": 0,
+                "prefixes": set(),
+            },
+        },
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stats = handler.stats
+    server.api_base = f"http://{host}:{server.server_address[1]}/v1"
+    return server
+
+
+# Start a server on a free port in a daemon thread; returns the server, whose
+# api_base can go straight into LLMSettings
+def serve_in_background(**kwargs):
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve fake OpenAI chat completions for offline runs and benchmarks."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds before the first byte"
+    )
+    parser.add_argument(
+        "--chunk-rate",
+        type=float,
+        default=0.0,
+        help="Streamed chunks per second (0 sends as fast as possible)",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=16, help="Characters per chunk"
+    )
+    parser.add_argument(
+        "--replay",
+        help='JSONL of {"schema": ..., "content": ...} completions to replay per schema',
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--invalid-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of completions sent as invalid JSON, to exercise repair",
+    )
+    parser.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with 429 and a Retry-After header",
+    )
+    parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=1.0,
+        help="Seconds sent in Retry-After with throttled replies",
+    )
+    args = parser.parse_args(argv)
+
+    server = make_server(
+        args.host,
+        args.port,
+        args.latency,
+        args.chunk_rate,
+        args.chunk_size,
+        args.replay,
+        args.seed,
+        args.invalid_rate,
+        args.throttle_rate,
+        args.retry_after,
+    )
+    print(f"Serving fake completions at {server.api_base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
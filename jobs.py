@@ -0,0 +1,157 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from collections import OrderedDict
+
+from cache import content_hash
+from scheduler import SchedulerFull, current_priority
+
+# Runs model work on a process-wide worker pool instead of the Streamlit script
+# thread, so a rerun (a widget change, another click) neither blocks on it nor
+# cancels it. Sessions keep only job ids and poll until the job is finished.
+# Submitting a job whose inputs match one that is still pending or running
+# returns that job instead of starting a second one. Like the scheduler's
+# lanes, pending jobs start interactive first, then background, then in
+# arrival order, and once MAX_QUEUED_JOBS are pending new ones are turned away.
+
+JOB_WORKERS = int(os.environ.get("AI_COACH_JOB_WORKERS", "8"))
+MAX_QUEUED_JOBS = int(os.environ.get("AI_COACH_MAX_QUEUED_JOBS", "64"))
+# Finished jobs kept for sessions that have not collected them yet
+MAX_JOBS = 256
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    def __init__(self, job_id, kind):
+        self.id = job_id
+        self.kind = kind
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        # Latest partially streamed result, for previews while running
+        self.partial = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED)
+
+    def set_partial(self, partial):
+        self.partial = partial
+
+
+class JobRunner:
+    def __init__(
+        self, workers=JOB_WORKERS, max_jobs=MAX_JOBS, max_queued=MAX_QUEUED_JOBS
+    ):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.max_queued = max_queued
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self._jobs = OrderedDict()
+        # Heap of (priority, sequence, job, func, context)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._threads = []
+        self._idle = 0
+
+    # func(job) runs on a worker with a copy of the caller's context, so the
+    # session's token usage, trace and scheduler priority carry over
+    def submit(self, kind, key_parts, func):
+        job_id = f"{kind}:{content_hash(*key_parts)}"
+        level = current_priority()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.done:
+                self.coalesced += 1
+                return job
+            if len(self._queue) >= self.max_queued:
+                self.rejected += 1
+                raise SchedulerFull(
+                    f"{len(self._queue)} jobs are already waiting; try again shortly"
+                )
+            job = Job(job_id, kind)
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            self.submitted += 1
+            self._evict()
+            heapq.heappush(
+                self._queue,
+                (level, next(self._sequence), job, func, contextvars.copy_context()),
+            )
+            # Workers start as they are first needed, up to self.workers
+            if self._idle < len(self._queue) and len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"ai-coach-job_{len(self._threads)}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+            self._ready.notify()
+        return job
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+                while not self._queue:
+                    self._ready.wait()
+                self._idle -= 1
+                _, _, job, func, context = heapq.heappop(self._queue)
+            context.run(self._run, job, func)
+
+    def _run(self, job, func):
+        job.started = time.time()
+        job.status = RUNNING
+        try:
+            job.result = func(job)
+            job.status = DONE
+        except Exception as error:
+            job.error = error
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+
+    # Drops the oldest finished jobs; unfinished ones are never dropped
+    def _evict(self):
+        excess = len(self._jobs) - self.max_jobs
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done]:
+            if excess <= 0:
+                break
+            del self._jobs[job_id]
+            excess -= 1
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "pending": statuses.count(PENDING),
+            "running": statuses.count(RUNNING),
+            "done": statuses.count(DONE),
+            "failed": statuses.count(FAILED),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+
+jobs = JobRunner()
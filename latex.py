@@ -0,0 +1,423 @@
+import re
+from functools import lru_cache
+
+from diff import diff_sequences
+from tokens import keywords
+
+# Plain text for LaTeX resumes that remembers where every character came from,
+# so prompts get a fraction of the source (no preamble, macros or wrappers like
+# \resumeItem{}) and updated lines can be written back into the .tex in place.
+# pylatexenc is imported on first use, since only LaTeX uploads need it.
+
+# Macros whose arguments are layout or definitions rather than resume text
+SKIPPED_MACROS = {
+    "documentclass",
+    "usepackage",
+    "newcommand",
+    "renewcommand",
+    "providecommand",
+    "newenvironment",
+    "renewenvironment",
+    "def",
+    "let",
+    "setlength",
+    "addtolength",
+    "vspace",
+    "hspace",
+    "pagestyle",
+    "thispagestyle",
+    "label",
+    "ref",
+    "input",
+    "include",
+    "titleformat",
+    "titlespacing",
+    "geometry",
+    "pdfgminorversion",
+    "color",
+    "definecolor",
+}
+LINE_BREAK_MACROS = {"\\", "newline", "linebreak", "par", "break"}
+LIST_ENVIRONMENTS = {"itemize", "enumerate", "description"}
+# Macros whose rendered text is the last argument, e.g. \href{url}{text}
+LAST_ARGUMENT_MACROS = {"href"}
+BULLET = "• "
+SEPARATOR = " | "
+# Keyword overlap (Jaccard) for a changed line to be matched to a LaTeX line
+MIN_LINE_OVERLAP = 0.6
+# Section strings indent detail bullets by four spaces (see core.*_to_string)
+DETAIL_INDENT = "    "
+LATEX_SPECIALS = set("&%$#_{}")
+LATEX_REPLACEMENTS = {
+    "~": r"\textasciitilde{}",
+    "^": r"\^{}",
+    "\\": r"\textbackslash{}",
+}
+
+
+@lru_cache(maxsize=None)
+def _latex2text():
+    from pylatexenc.latex2text import LatexNodes2Text
+
+    return LatexNodes2Text()
+
+
+class LatexText:
+    def __init__(self, source, text, positions):
+        self.source = source
+        self.text = text
+        # Source offset of every text character, or -1 for characters that
+        # stand for a macro (bullets, line breaks, separators)
+        self.positions = positions
+
+    # Source offsets [start, end) covering text[start:end]
+    def source_span(self, start, end):
+        mapped = [p for p in self.positions[start:end] if p >= 0]
+        if not mapped:
+            return None
+        return mapped[0], mapped[-1] + 1
+
+    # Text offsets [start, end) covering source[start:end], with the bullet or
+    # other macro characters that start the first line
+    def text_range(self, start, end):
+        inside = [i for i, p in enumerate(self.positions) if start <= p < end]
+        if not inside:
+            return None
+        first = inside[0]
+        while first > 0 and self.positions[first - 1] < 0:
+            if self.text[first - 1] == "\n":
+                break
+            first -= 1
+        return first, inside[-1] + 1
+
+    # (start, end) text offsets of each non-empty line
+    def lines(self):
+        return [
+            (match.start(), match.end())
+            for match in re.finditer(r"[^\n]+", self.text)
+            if match.group().strip()
+        ]
+
+
+class _Builder:
+    def __init__(self):
+        self.chars = []
+        self.positions = []
+
+    def add(self, text, position=-1):
+        for i, char in enumerate(text):
+            self.chars.append(char)
+            self.positions.append(position + i if position >= 0 else -1)
+
+    def nodes(self, nodelist):
+        from pylatexenc.latexwalker import LatexCharsNode, LatexGroupNode
+
+        previous_group = False
+        for node in nodelist or []:
+            is_group = isinstance(node, LatexGroupNode)
+            if is_group and previous_group:
+                # Consecutive arguments of an unknown macro, e.g.
+                # \resumeSubheading{Acme}{2020}{Engineer}{NYC}
+                self.add(SEPARATOR)
+            if not (isinstance(node, LatexCharsNode) and not node.chars.strip()):
+                previous_group = is_group
+            self.node(node)
+
+    def node(self, node):
+        from pylatexenc.latexwalker import (
+            LatexCharsNode,
+            LatexCommentNode,
+            LatexEnvironmentNode,
+            LatexGroupNode,
+            LatexMacroNode,
+        )
+
+        if isinstance(node, LatexCharsNode):
+            self.add(node.chars, node.pos)
+        elif isinstance(node, LatexCommentNode):
+            return
+        elif isinstance(node, LatexGroupNode):
+            self.nodes(node.nodelist)
+        elif isinstance(node, LatexEnvironmentNode):
+            list_environment = node.environmentname in LIST_ENVIRONMENTS
+            if list_environment:
+                self.add("\n")
+            self.nodes(node.nodelist)
+            if list_environment:
+                self.add("\n")
+        elif isinstance(node, LatexMacroNode):
+            self.macro(node)
+        else:
+            # Math and specials such as -- or ~
+            self.add(_latex2text().nodelist_to_text([node]))
+
+    def macro(self, node):
+        name = node.macroname
+        arguments = [
+            argument
+            for argument in (node.nodeargd.argnlist if node.nodeargd else [])
+            if argument is not None
+        ]
+        if name in SKIPPED_MACROS:
+            return
+        if name in LINE_BREAK_MACROS:
+            self.add("\n")
+        elif len(name) == 1 and not name.isalpha():
+            # Escaped characters like \% or \&
+            self.add(name, node.pos + 1)
+        elif name.lower().endswith("item"):
+            # \item, \resumeItem, \resumeSubItem, but not \resumeItemListStart
+            self.add("\n" + BULLET)
+            self.nodes(arguments)
+        elif name.lower().endswith("section"):
+            self.add("\n")
+            self.nodes(arguments[-1:])
+            self.add("\n")
+        elif name in LAST_ARGUMENT_MACROS:
+            self.nodes(arguments[-1:])
+        elif arguments:
+            self.nodes(arguments)
+        else:
+            text = _latex2text().nodelist_to_text([node])
+            self.add(text if text.strip() else " ")
+
+    # Collapse whitespace the way LaTeX does: runs of spaces and single
+    # newlines become one space and blank lines or explicit breaks one newline
+    def build(self, source):
+        text, positions = [], []
+        whitespace = []
+        for char, position in list(zip(self.chars, self.positions)) + [("x", -2)]:
+            if char.isspace():
+                whitespace.append((char, position))
+                continue
+            if whitespace:
+                synthetic_break = any(c == "\n" and p < 0 for c, p in whitespace)
+                blank_line = sum(c == "\n" for c, _ in whitespace) > 1
+                if synthetic_break or blank_line:
+                    if text and text[-1] != "\n":
+                        text.append("\n")
+                        positions.append(-1)
+                elif text and text[-1] != "\n":
+                    text.append(" ")
+                    positions.append(whitespace[0][1])
+                whitespace = []
+            if position != -2:
+                text.append(char)
+                positions.append(position)
+        if text and text[-1] == "\n":
+            text.pop()
+            positions.pop()
+        return LatexText(source, "".join(text), positions)
+
+
+def _body(source):
+    begin = source.find("\\begin{document}")
+    start = begin + len("\\begin{document}") if begin >= 0 else 0
+    end = source.find("\\end{document}", start)
+    return start, end if end >= 0 else len(source)
+
+
+def latex_to_text(source):
+    from pylatexenc.latexwalker import LatexWalker
+
+    start, end = _body(source)
+    # Parsing stops at \end{document}; offsets stay those of the full source
+    walker = LatexWalker(source[:end], tolerant_parsing=True)
+    nodes, _, _ = walker.get_latex_nodes(pos=start)
+    builder = _Builder()
+    builder.nodes(nodes)
+    return builder.build(source)
+
+
+def escape_latex(text):
+    return "".join(
+        LATEX_REPLACEMENTS.get(char, "\\" + char if char in LATEX_SPECIALS else char)
+        for char in text
+    )
+
+
+# Label and value of a section string line: "Role: Engineer" is ("Role",
+# "Engineer"), a detail bullet has no label
+def _split_line(line):
+    if line.startswith(DETAIL_INDENT) or ": " not in line:
+        return None, line.strip()
+    label, value = line.split(": ", 1)
+    return label.strip(), value.strip()
+
+
+def _overlap(a, b):
+    a, b = keywords(a), keywords(b)
+    return len(a & b) / len(a | b) if a and b else 0
+
+
+# Unescaped braces in source[start:end] as (offset, brace)
+def _braces(source, start, end):
+    for i in range(start, end):
+        if source[i] in "{}":
+            backslashes = 0
+            while i - backslashes > 0 and source[i - backslashes - 1] == "\\":
+                backslashes += 1
+            if backslashes % 2 == 0:
+                yield i, source[i]
+
+
+# span widened to whole groups, so replacing it keeps the braces balanced: a
+# group closed inside span starts at its macro (\textbf{Led} a team) and one
+# opened inside it ends at its closing brace (with \textbf{Redis})
+def _whole_groups(source, span):
+    if span is None:
+        return None
+    start, end = span
+    opened, closed = 0, 0
+    for _, brace in _braces(source, start, end):
+        if brace == "{":
+            opened += 1
+        elif opened:
+            opened -= 1
+        else:
+            closed += 1
+    if closed:
+        depth = closed
+        for i, brace in reversed(list(_braces(source, 0, start))):
+            depth += 1 if brace == "}" else -1
+            if depth == 0:
+                start = i
+                break
+        else:
+            return None
+        macro = re.search(r"\\[A-Za-z@]+\*?\s*$", source[:start])
+        if macro:
+            start = macro.start()
+    if opened:
+        depth = opened
+        for i, brace in _braces(source, end, len(source)):
+            depth += 1 if brace == "{" else -1
+            if depth == 0:
+                end = i + 1
+                break
+        else:
+            return None
+    return start, end
+
+
+# Source span of value in latex_text: its only exact occurrence, else the line
+# (or the part of a "Category: items" line after the colon) sharing the most
+# keywords with it
+def _locate(latex_text, value):
+    if not value:
+        return None
+    start = latex_text.text.find(value)
+    if start >= 0 and latex_text.text.find(value, start + 1) < 0:
+        return _whole_groups(
+            latex_text.source, latex_text.source_span(start, start + len(value))
+        )
+    best, best_score = None, MIN_LINE_OVERLAP
+    for start, end in latex_text.lines():
+        line = latex_text.text[start:end]
+        if line.startswith(BULLET):
+            start += len(BULLET)
+        candidates = [(start, end)]
+        colon = latex_text.text.find(": ", start, end)
+        if colon >= 0:
+            candidates.append((colon + 2, end))
+        for candidate in candidates:
+            score = _overlap(value, latex_text.text[candidate[0] : candidate[1]])
+            if score >= best_score:
+                best, best_score = candidate, score
+    return (
+        _whole_groups(latex_text.source, latex_text.source_span(*best))
+        if best
+        else None
+    )
+
+
+# Start and end offsets of the source lines holding span
+def _source_lines(source, span):
+    start = source.rfind("\n", 0, span[0]) + 1
+    end = source.find("\n", span[1])
+    return start, end if end >= 0 else len(source)
+
+
+# Source edits (start, end, replacement) for one run of removed and added
+# lines, or None when a line cannot be placed
+def _run_edits(latex_text, removed, added, anchor):
+    source = latex_text.source
+    edits = []
+    for old_line, new_line in zip(removed, added):
+        old_label, old_value = _split_line(old_line)
+        new_label, new_value = _split_line(new_line)
+        if old_label != new_label:
+            return None
+        span = _locate(latex_text, old_value)
+        if span is None:
+            return None
+        edits.append((span[0], span[1], escape_latex(new_value)))
+        anchor = span
+    extra = added[len(removed) :]
+    if extra:
+        if anchor is None or not all(line.startswith(DETAIL_INDENT) for line in extra):
+            return None
+        # New bullets copy the markup around the previous one
+        line_start, line_end = _source_lines(source, anchor)
+        prefix, suffix = source[line_start : anchor[0]], source[anchor[1] : line_end]
+        edits.append(
+            (
+                line_end,
+                line_end,
+                "".join(
+                    "\n" + prefix + escape_latex(line.strip()) + suffix
+                    for line in extra
+                ),
+            )
+        )
+    for old_line in removed[len(added) :]:
+        span = _locate(latex_text, old_line.strip())
+        if not old_line.startswith(DETAIL_INDENT) or span is None:
+            return None
+        line_start, line_end = _source_lines(source, span)
+        # Only drop whole source lines that hold nothing but this bullet
+        for line in latex_text.lines():
+            other = latex_text.source_span(*line)
+            if (
+                other
+                and other[0] < line_end
+                and other[1] > line_start
+                and not (span[0] <= other[0] and other[1] <= span[1])
+            ):
+                return None
+        edits.append((line_start, min(line_end + 1, len(source)), ""))
+    return edits
+
+
+# Writes the changes between two section strings (as built by core's
+# *_to_string functions) into the LaTeX source of that section, keeping its
+# macros and layout. Returns None when any changed line cannot be located.
+def write_back(source, old_text, new_text):
+    latex_text = latex_to_text(source)
+    old_lines, new_lines = old_text.splitlines(), new_text.splitlines()
+    edits, removed, added = [], [], []
+    anchor_line = None
+    for tag, i, j in diff_sequences(old_lines, new_lines) + [("equal", None, None)]:
+        if tag == "delete":
+            removed.append(old_lines[i])
+        elif tag == "insert":
+            added.append(new_lines[j])
+        else:
+            if removed or added:
+                anchor = None
+                if anchor_line and anchor_line.startswith(DETAIL_INDENT):
+                    anchor = _locate(latex_text, anchor_line.strip())
+                run_edits = _run_edits(latex_text, removed, added, anchor)
+                if run_edits is None:
+                    return None
+                edits.extend(run_edits)
+                removed, added = [], []
+            if i is not None:
+                anchor_line = old_lines[i]
+    edits.sort()
+    for (_, end, _), (start, _, _) in zip(edits, edits[1:]):
+        if start < end:
+            return None
+    for start, end, replacement in reversed(edits):
+        source = source[:start] + replacement + source[end:]
+    return source
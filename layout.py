@@ -0,0 +1,219 @@
+import re
+
+from tokens import keywords
+
+# Re-renders updated section data in the layout of the original section text:
+# its bullet glyphs and indentation, category separators, item joiners and each
+# entry's header lines (dates, locations, separators) are taken from the
+# original, so the format pass does not need a model call.
+
+GLYPHS = "•●○◦▪▫■□‣∙·*>\\-–—"
+GLYPH_RE = re.compile(rf"^(\s*[{GLYPHS}]\s*)(?=\S)")
+LONE_GLYPH_RE = re.compile(rf"^\s*[{GLYPHS}]\s*$")
+# Joiners tried in order when splitting a list of skills or technologies
+JOINERS = (", ", " | ", " · ", " • ", "; ", " / ", "/", ",")
+CATEGORY_SEPARATOR_RE = r"(\s*[:\-–|]\s*)"
+# Share of a line's keywords that must come from a detail for the line to be
+# taken as (part of) that detail
+MIN_DETAIL_CONTAINMENT = 0.6
+# Entry fields that may appear in header lines and are substituted there
+HEADER_FIELDS = {"experiences": ("company", "role"), "projects": ("name",)}
+NAME_FIELDS = {"experiences": "company", "projects": "name"}
+
+
+def _detail_line(line, details):
+    if GLYPH_RE.match(line) or LONE_GLYPH_RE.match(line):
+        return True
+    words = keywords(line)
+    return bool(words) and any(
+        len(words & keywords(detail)) / len(words) >= MIN_DETAIL_CONTAINMENT
+        for detail in details
+    )
+
+
+def _bullet_prefix(lines, details):
+    for line in lines:
+        if LONE_GLYPH_RE.match(line):
+            # PDF text often puts the glyph on a line of its own
+            return line.strip() + " "
+        match = GLYPH_RE.match(line)
+        if match:
+            return match.group(1)
+        if _detail_line(line, details):
+            return line[: len(line) - len(line.lstrip())]
+    return ""
+
+
+def _joiner(text, items):
+    for joiner in JOINERS:
+        if len(items) > 1 and joiner.join(items[:2]) in text:
+            return joiner
+    for joiner in JOINERS:
+        if joiner in text:
+            return joiner
+    return ", "
+
+
+def _find_line(lines, value, start):
+    value = value.strip().lower()
+    if not value:
+        return None
+    for i in range(start, len(lines)):
+        if value in lines[i].lower():
+            return i
+    return None
+
+
+# [(header_lines, bullet_prefix)] for each original entry, or None when an
+# entry's name or bullets cannot be found in the text
+def _entry_blocks(section_key, lines, entries):
+    name_field = NAME_FIELDS[section_key]
+    name_lines, start = [], 0
+    for entry in entries:
+        i = _find_line(lines, str(entry.get(name_field, "")), start)
+        if i is None:
+            return None
+        name_lines.append(i)
+        start = i + 1
+    blocks, block_start = [], 0
+    for n, (entry, name_line) in enumerate(zip(entries, name_lines)):
+        details = entry.get("details", [])
+        next_name = name_lines[n + 1] if n + 1 < len(name_lines) else len(lines)
+        body = range(name_line + 1, next_name)
+        detail_lines = [i for i in body if _detail_line(lines[i], details)]
+        if details and not detail_lines:
+            return None
+        header_end = detail_lines[0] if detail_lines else next_name
+        block_end = detail_lines[-1] + 1 if detail_lines else next_name
+        header = [line for line in lines[block_start:header_end] if line.strip()]
+        prefix = _bullet_prefix([lines[i] for i in detail_lines], details)
+        blocks.append((header, prefix))
+        block_start = block_end
+    return blocks
+
+
+def _substitute(header, old_entry, new_entry, section_key):
+    lines = []
+    for line in header:
+        for field in HEADER_FIELDS[section_key]:
+            old, new = str(old_entry.get(field, "")), str(new_entry.get(field, ""))
+            if old and old in line:
+                line = line.replace(old, new)
+        old_items = old_entry.get("technologies") or []
+        if old_items:
+            joiner = _joiner(line, old_items)
+            if joiner.join(old_items) in line:
+                line = line.replace(
+                    joiner.join(old_items),
+                    joiner.join(new_entry.get("technologies", [])),
+                )
+        lines.append(line)
+    return lines
+
+
+# [(offset, field, value)] of entry's header fields found in line, in line
+# order; technologies are one value joined as in the line
+def _header_values(line, entry, section_key):
+    values = [
+        (field, str(entry.get(field, ""))) for field in HEADER_FIELDS[section_key]
+    ]
+    items = entry.get("technologies") or []
+    if items:
+        values.append(("technologies", _joiner(line, items).join(items)))
+    return sorted(
+        (line.find(value), field, value)
+        for field, value in values
+        if value and value in line
+    )
+
+
+# Entries with no original keep only the header lines naming a field, and of
+# those only the fields themselves, so another entry's dates and locations
+# are not copied: "Acme | Engineer | 2020 - 2023" becomes "Gamma | Contractor"
+def _template_header(header, old_entry, new_entry, section_key):
+    lines = []
+    for line in header:
+        found = _header_values(line, old_entry, section_key)
+        if not found:
+            continue
+        first_end = found[0][0] + len(found[0][2])
+        separator = line[first_end : found[1][0]] if len(found) > 1 else " "
+        if not separator or any(char.isalnum() for char in separator):
+            # Overlapping fields, or a location between them
+            separator = " "
+        values = []
+        for _, field, value in found:
+            if field == "technologies":
+                joiner = _joiner(value, old_entry["technologies"])
+                values.append(joiner.join(new_entry.get("technologies") or []))
+            else:
+                values.append(str(new_entry.get(field, "")))
+        indent = line[: len(line) - len(line.lstrip())]
+        lines.append(indent + separator.join(value for value in values if value))
+    if not lines:
+        return [str(new_entry.get(NAME_FIELDS[section_key], ""))]
+    return lines
+
+
+def _render_entries(section_key, original_text, old_entries, new_entries):
+    lines = original_text.splitlines()
+    blocks = _entry_blocks(section_key, lines, old_entries)
+    if not blocks:
+        return None
+    name_field = NAME_FIELDS[section_key]
+    by_name = {
+        str(entry.get(name_field, "")).strip().lower(): i
+        for i, entry in enumerate(old_entries)
+    }
+    # Entries pair up by name, then in order among the ones left over
+    pairs = [
+        by_name.get(str(entry.get(name_field, "")).strip().lower())
+        for entry in new_entries
+    ]
+    unused = [i for i in range(len(old_entries)) if i not in pairs]
+    pairs = [i if i is not None else (unused.pop(0) if unused else None) for i in pairs]
+    separator = "\n\n" if re.search(r"\n\s*\n", original_text.strip()) else "\n"
+    rendered = []
+    for new_entry, i in zip(new_entries, pairs):
+        if i is None:
+            header, prefix = blocks[0]
+            header = _template_header(header, old_entries[0], new_entry, section_key)
+        else:
+            header, prefix = blocks[i]
+            header = _substitute(header, old_entries[i], new_entry, section_key)
+        details = [prefix + detail for detail in new_entry.get("details", [])]
+        rendered.append("\n".join(header + details))
+    return separator.join(rendered)
+
+
+def _render_skills(original_text, old_skills, new_skills):
+    for category, items in old_skills.items():
+        match = re.search(
+            rf"^(\s*(?:[{GLYPHS}]\s*)?){re.escape(category)}{CATEGORY_SEPARATOR_RE}(.*)$",
+            original_text,
+            re.MULTILINE | re.IGNORECASE,
+        )
+        if match:
+            prefix, separator, rest = match.groups()
+            joiner = _joiner(rest, items)
+            return "\n".join(
+                prefix + new_category + separator + joiner.join(new_items)
+                for new_category, new_items in new_skills.items()
+            )
+    return None
+
+
+# New section text in the layout of original_text, which was written from
+# original_data; None when the layout cannot be recognised
+def render_layout(section_key, original_text, original_data, new_data):
+    if not original_text or not original_text.strip() or not original_data:
+        return None
+    if section_key == "skills":
+        if not isinstance(original_data, dict) or not isinstance(new_data, dict):
+            return None
+        return _render_skills(original_text, original_data, new_data)
+    if section_key in NAME_FIELDS:
+        if not isinstance(original_data, list) or not isinstance(new_data, list):
+            return None
+        return _render_entries(section_key, original_text, original_data, new_data)
+    return None
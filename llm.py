@@ -0,0 +1,346 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+import concurrent.futures
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict
+
+from metrics import (
+    acount_http_request,
+    ascan_cached_tokens,
+    count_http_request,
+    current_span,
+    scan_cached_tokens,
+)
+
+# Process-wide registry of chat clients keyed by (api_base, api_key, model).
+# Streamlit runs every session in its own thread, so all access is guarded by
+# one lock and the sync httpx pool is shared by every session using that key.
+# httpx and LangChain are imported when the first client or chain is built, so
+# starting the app and rendering the upload page does not pay for them.
+MAX_CLIENTS = 64
+HTTP_LIMITS = dict(
+    max_connections=100, max_keepalive_connections=20, keepalive_expiry=120
+)
+HTTP_TIMEOUT = dict(timeout=120.0, connect=10.0)
+# How replies are constrained to the schema: a forced tool call whose arguments
+# follow the pydantic model, OpenAI's JSON mode, or format instructions only
+FUNCTION_CALLING = "function_calling"
+JSON_MODE = "json_mode"
+NO_STRUCTURED_OUTPUT = "none"
+STRUCTURED_OUTPUT_MODES = (FUNCTION_CALLING, JSON_MODE, NO_STRUCTURED_OUTPUT)
+# Requests per minute for each API key and model unless set_rate_limit says
+# otherwise
+DEFAULT_REQUESTS_PER_MINUTE = float(os.environ.get("AI_COACH_RPM", "500"))
+# Pause after a 429 or 503 without a usable Retry-After, and the longest
+# Retry-After honoured
+DEFAULT_RETRY_AFTER = 1.0
+MAX_RETRY_AFTER = 60.0
+
+_lock = threading.Lock()
+_clients = OrderedDict()
+_chains = OrderedDict()
+# httpx.AsyncClient pools are bound to the event loop that opened them, so
+# async clients are kept per loop and dropped once that loop is closed. Jobs
+# and batch runs all use the one long-lived model loop (see run_async), so
+# each key there keeps a single async pool that every call reuses.
+_loop_clients = {}
+_loop_chains = {}
+_model_loop = None
+
+
+def _new_model(api_base, api_key, model_name, asynchronous, streaming=True):
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    limits = httpx.Limits(**HTTP_LIMITS)
+    timeout = httpx.Timeout(**HTTP_TIMEOUT)
+    return ChatOpenAI(
+        model_name=model_name,
+        openai_api_base=api_base,
+        openai_api_key=api_key,
+        streaming=streaming,
+        # Ask for the usage chunk at the end of the stream for token accounting
+        stream_usage=True,
+        http_client=(
+            None
+            if asynchronous
+            else httpx.Client(
+                limits=limits,
+                timeout=timeout,
+                event_hooks={
+                    "request": [count_http_request],
+                    "response": [
+                        scan_cached_tokens,
+                        _retry_after_hook(api_key, model_name),
+                    ],
+                },
+            )
+        ),
+        http_async_client=(
+            httpx.AsyncClient(
+                limits=limits,
+                timeout=timeout,
+                event_hooks={
+                    "request": [acount_http_request],
+                    "response": [
+                        ascan_cached_tokens,
+                        _aretry_after_hook(api_key, model_name),
+                    ],
+                },
+            )
+            if asynchronous
+            else None
+        ),
+    )
+
+
+def model_loop():
+    global _model_loop
+    with _lock:
+        if _model_loop is None:
+            _model_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_model_loop.run_forever, name="ai-coach-model-loop", daemon=True
+            ).start()
+        return _model_loop
+
+
+def _settle(task, future):
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+# Runs coro on the model loop and waits for its result. Used instead of
+# asyncio.run, whose new loop per call would open a new async client and
+# connection pool every time; the task still runs in a copy of the caller's
+# context, so token usage, trace and scheduler priority carry over.
+def run_async(coro):
+    loop = model_loop()
+    context = contextvars.copy_context()
+    future = concurrent.futures.Future()
+
+    def start():
+        task = context.run(loop.create_task, coro)
+        task.add_done_callback(lambda task: _settle(task, future))
+
+    loop.call_soon_threadsafe(start)
+    return future.result()
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _drop_closed_loops():
+    for loops in (_loop_clients, _loop_chains):
+        for loop in [loop for loop in loops if loop.is_closed()]:
+            del loops[loop]
+
+
+# Returns value after adding it to cache, and whatever that evicted
+def _remember(cache, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    evicted = []
+    while len(cache) > MAX_CLIENTS:
+        evicted.append(cache.popitem(last=False)[1])
+    return value, evicted
+
+
+# An evicted async client is closed once any request it still has in flight
+# has timed out
+def _close_later(loop, model):
+    client = model.http_async_client
+    loop.call_later(HTTP_TIMEOUT["timeout"], lambda: loop.create_task(client.aclose()))
+
+
+# Non-streaming clients are only used for requests with n > 1, which the API
+# cannot stream
+def get_model(api_base, api_key, model_name, streaming=True):
+    key = (api_base, api_key, model_name, streaming)
+    loop = _running_loop()
+    with _lock:
+        _drop_closed_loops()
+        clients = _loop_clients.setdefault(loop, OrderedDict()) if loop else _clients
+        if key in clients:
+            clients.move_to_end(key)
+            return clients[key]
+        model, evicted = _remember(
+            clients,
+            key,
+            _new_model(api_base, api_key, model_name, loop is not None, streaming),
+        )
+        for old_model in evicted if loop is not None else []:
+            _close_later(loop, old_model)
+        return model
+
+
+# Static instructions and the schema make up the system message and only the
+# user message varies, so providers can serve the long shared prefix from
+# their prompt cache
+def _build_prompt(parser, structured_output):
+    from langchain_core.prompts import ChatPromptTemplate
+
+    if structured_output == FUNCTION_CALLING:
+        # The schema travels in the tool definition instead of the prompt
+        return ChatPromptTemplate.from_messages(
+            [("system", "{instructions}"), ("user", "{query}")]
+        )
+    return ChatPromptTemplate.from_messages(
+        [("system", "{format_instructions}\n{instructions}"), ("user", "{query}")]
+    ).partial(format_instructions=parser.get_format_instructions())
+
+
+def _constrain(model, pydantic_object, structured_output):
+    if structured_output == FUNCTION_CALLING:
+        return model.bind_tools([pydantic_object], tool_choice=pydantic_object.__name__)
+    if structured_output == JSON_MODE:
+        return model.bind(response_format={"type": "json_object"})
+    return model.bind()
+
+
+# Prebuilt prompt | model | parser per client, pydantic schema and output mode,
+# so format instructions and tool schemas are rendered once instead of on
+# every call. With n > 1 the model step asks for n completions in one request.
+def get_chain(
+    api_base,
+    api_key,
+    model_name,
+    pydantic_object,
+    structured_output=FUNCTION_CALLING,
+    n=1,
+):
+    model = get_model(api_base, api_key, model_name, streaming=n == 1)
+    key = (api_base, api_key, model_name, pydantic_object, structured_output, n)
+    loop = _running_loop()
+    with _lock:
+        chains = _loop_chains.setdefault(loop, OrderedDict()) if loop else _chains
+        chain = chains.get(key)
+        if chain is None or chain.steps[1].bound is not model:
+            from langchain_core.output_parsers import JsonOutputParser
+
+            parser = JsonOutputParser(pydantic_object=pydantic_object)
+            constrained = _constrain(model, pydantic_object, structured_output)
+            chain = (
+                _build_prompt(parser, structured_output)
+                | (constrained.bind(n=n) if n > 1 else constrained)
+                | parser
+            )
+            _remember(chains, key, chain)
+        else:
+            chains.move_to_end(key)
+        return chain
+
+
+# Token bucket allowing `rate` requests per second with bursts up to `capacity`.
+# reserve() takes a token immediately and returns how long the caller has to
+# wait before using it, so sync and async callers share the same bucket. A
+# rate of 0 is unlimited and only waits out pauses.
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        with self._lock:
+            if not self.rate:
+                return max(0.0, self.paused_until - time.monotonic())
+            self._refill()
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    # Hold every reservation for at least `seconds`, e.g. after a Retry-After
+    def pause(self, seconds):
+        with self._lock:
+            if not self.rate:
+                self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+                return
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+# Buckets keyed by (api_key, model_name); model_name None covers every model
+# of that key
+_rate_limits = {}
+
+
+# requests_per_minute 0 lifts the limit, including the default one
+def set_rate_limit(api_key, requests_per_minute, burst=None, model_name=None):
+    rate = requests_per_minute / 60.0
+    with _lock:
+        _rate_limits[(api_key, model_name)] = TokenBucket(rate, burst or max(1, rate))
+
+
+def rate_limit_bucket(api_key, model_name):
+    with _lock:
+        bucket = _rate_limits.get((api_key, model_name)) or _rate_limits.get(
+            (api_key, None)
+        )
+        if bucket is None:
+            rate = DEFAULT_REQUESTS_PER_MINUTE / 60.0
+            bucket = _rate_limits[(api_key, model_name)] = TokenBucket(
+                rate, max(1, rate)
+            )
+        return bucket
+
+
+# Seconds to back off from a Retry-After (or retry-after-ms) header, which
+# may hold seconds or an HTTP date
+def retry_after_seconds(headers):
+    try:
+        if "retry-after-ms" in headers:
+            seconds = float(headers["retry-after-ms"]) / 1000
+        else:
+            seconds = float(headers["retry-after"])
+    except (KeyError, ValueError):
+        try:
+            retry_at = parsedate_to_datetime(headers["retry-after"])
+            seconds = retry_at.timestamp() - time.time()
+        except (KeyError, TypeError, ValueError):
+            seconds = DEFAULT_RETRY_AFTER
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+# The OpenAI SDK retries a throttled request itself; pausing the bucket makes
+# every other session using the key and model back off as well
+def _retry_after_hook(api_key, model_name):
+    def hook(response):
+        if response.status_code in (429, 503):
+            rate_limit_bucket(api_key, model_name).pause(
+                retry_after_seconds(response.headers)
+            )
+            span = current_span()
+            if span is not None:
+                span.add("rate_limited")
+
+    return hook
+
+
+def _aretry_after_hook(api_key, model_name):
+    hook = _retry_after_hook(api_key, model_name)
+
+    async def ahook(response):
+        hook(response)
+
+    return ahook
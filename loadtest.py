@@ -0,0 +1,312 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+
+# Keep load-test analyses out of the app's response cache
+os.environ.setdefault(
+    "AI_COACH_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "loadtest.sqlite3")
+)
+
+from unittest.mock import MagicMock
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import (
+    MemoryCacheStorageManager,
+)
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+
+from artifacts import artifacts
+from benchmark import SAMPLE_JOB_DESCRIPTION, percentile, sample_documents
+from extract import extract_resume_sections, extract_resume_text
+from fake_server import serve_in_background
+from jobs import jobs
+from scheduler import scheduler
+
+# Runs many simulated sessions of app.py in this process with Streamlit's
+# AppTest against the local fake endpoint, at growing concurrency, and reports
+# per-step latency percentiles, throughput, peak RSS and thread counts. Every
+# session scripts load -> upload -> analyze -> update all sections -> rerun
+# with its own resume and company, so responses are neither cached nor
+# coalesced across sessions. AppTest cannot drive st.file_uploader, so the
+# upload step runs the same extraction the app does on upload and puts the
+# result in session state.
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+STEPS = ("load", "upload", "analyze", "update", "rerun")
+FILE_NAMES = {"PDF": "resume.pdf", "DOC": "resume.docx", "Latex": "resume.tex"}
+MIME_TYPES = {
+    "PDF": "application/pdf",
+    "DOC": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "Latex": "application/x-tex",
+}
+SAMPLE_INTERVAL = 0.05
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+# Samples RSS and the thread count in the background while a level runs
+class Monitor:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak_rss = rss_bytes()
+        self.peak_threads = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+# AppTest installs a mock Runtime singleton for each script run and clears it
+# afterwards, which breaks runs on other threads. Lookups fall back to one
+# shared mock instead, so sessions can run concurrently as on a real server.
+def share_runtime():
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or shared)
+    Runtime.exists = classmethod(lambda cls: True)
+    # Session state is set between runs, outside any script run
+    logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage()
+    )
+
+
+class SessionError(Exception):
+    pass
+
+
+def _button(at, label):
+    for button in at.button:
+        if button.label == label:
+            return button
+    raise SessionError(f"no {label!r} button")
+
+
+def _check(at, step):
+    if at.exception:
+        raise SessionError(f"{step}: {at.exception[0].value}")
+    if at.error:
+        raise SessionError(f"{step}: {at.error[0].value}")
+
+
+def run_flow(api_base, session, file_type, pages, timeout, samples, lock):
+    def timed(step, func):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.setdefault(step, []).append(elapsed)
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def load():
+        at.run()
+        at.sidebar.text_input(key="chatbot_api_base").set_value(api_base)
+        at.sidebar.text_input(key="chatbot_api_key").set_value("sk-loadtest")
+        at.run()
+        _check(at, "load")
+
+    def upload():
+        data = sample_documents(pages, f"Candidate {session}")[file_type]
+        file_hash, detected, resume_text = extract_resume_text(
+            data, FILE_NAMES[file_type], MIME_TYPES[file_type]
+        )
+        at.session_state["resume_text"] = artifacts.put(resume_text)
+        at.session_state["file_type"] = detected
+        at.session_state["resume_source"] = artifacts.put(
+            data.decode("utf-8") if detected == "Latex" else None
+        )
+        at.session_state["resume_sections"] = artifacts.put(
+            extract_resume_sections(data, detected, file_hash)
+        )
+        at.run()
+        _check(at, "upload")
+
+    def analyze():
+        _button(at, "Analyze Resume").click().run()
+        _check(at, "analyze")
+        if not at.session_state["resume_analyzed"]:
+            raise SessionError("analyze: resume was not analyzed")
+
+    def update():
+        for text_input in at.text_input:
+            if text_input.label == "Enter company name:":
+                text_input.set_value(f"Company {session}")
+        for text_area in at.text_area:
+            if text_area.label == "Paste job description text:":
+                text_area.set_value(SAMPLE_JOB_DESCRIPTION)
+        at.run()
+        _button(at, "Update all sections").click().run()
+        _check(at, "update")
+        if "skills_formatted_data" not in at.session_state:
+            raise SessionError("update: no formatted skills")
+
+    def rerun():
+        at.run()
+        _check(at, "rerun")
+
+    for step, func in zip(STEPS, (load, upload, analyze, update, rerun)):
+        timed(step, func)
+
+
+def run_level(api_base, concurrency, flows, args):
+    samples, errors = {}, []
+    lock = threading.Lock()
+    counter = iter(range(flows))
+
+    def worker():
+        while True:
+            with lock:
+                session = next(counter, None)
+            if session is None:
+                return
+            try:
+                run_flow(
+                    api_base,
+                    f"{concurrency}-{session}",
+                    args.file_type,
+                    args.pages,
+                    args.timeout,
+                    samples,
+                    lock,
+                )
+            except Exception as error:
+                with lock:
+                    errors.append(f"{type(error).__name__}: {error}")
+
+    threads = [
+        threading.Thread(target=worker, name=f"loadtest-session-{i}")
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    with Monitor() as monitor:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "flows": flows,
+        "completed": flows - len(errors),
+        "errors": errors,
+        "seconds": elapsed,
+        "flows_per_second": (flows - len(errors)) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": monitor.peak_rss / 2**20,
+        "peak_threads": monitor.peak_threads,
+        "steps": {
+            step: {
+                "n": len(samples[step]),
+                "p50_ms": 1000 * percentile(samples[step], 0.5),
+                "p95_ms": 1000 * percentile(samples[step], 0.95),
+                "p99_ms": 1000 * percentile(samples[step], 0.99),
+            }
+            for step in STEPS
+            if samples.get(step)
+        },
+    }
+
+
+def print_level(result):
+    print(
+        f"\nconcurrency {result['concurrency']}: {result['completed']}/"
+        f"{result['flows']} flows in {result['seconds']:.1f} s "
+        f"({result['flows_per_second']:.2f}/s), peak RSS "
+        f"{result['peak_rss_mb']:.0f} MB, peak threads {result['peak_threads']}"
+    )
+    print(f"{'step':<10}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, stats in result["steps"].items():
+        print(
+            f"{step:<10}{stats['n']:>5}{stats['p50_ms']:>10.1f}"
+            f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+        )
+    for error in result["errors"][:5]:
+        print(f"ERROR {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load-test app.py with simulated Streamlit sessions against a local fake OpenAI endpoint."
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,2,4,8",
+        help="Comma-separated numbers of concurrent sessions, run in turn",
+    )
+    parser.add_argument(
+        "--flows", type=int, default=2, help="Flows per session at each level"
+    )
+    parser.add_argument("--file-type", choices=sorted(FILE_NAMES), default="PDF")
+    parser.add_argument(
+        "--pages", type=int, default=1, help="Pages in each sample resume"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Fake time to first byte (s)"
+    )
+    parser.add_argument(
+        "--chunk-rate", type=float, default=0.0, help="Fake streamed chunks per second"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="Seconds allowed per script run"
+    )
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    share_runtime()
+    # One script run before the levels: the process cold start is not what they
+    # measure, and concurrent first runs race in AppTest's widget bookkeeping
+    AppTest.from_file(APP_PATH, default_timeout=args.timeout).run()
+    server = serve_in_background(latency=args.latency, chunk_rate=args.chunk_rate)
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    # Every session of a level can have all of its sections waiting at once
+    scheduler.max_queued = max(scheduler.max_queued, 4 * max(levels))
+    jobs.max_queued = max(jobs.max_queued, 4 * max(levels))
+    results = []
+    try:
+        for concurrency in levels:
+            result = run_level(
+                server.api_base, concurrency, concurrency * args.flows, args
+            )
+            print_level(result)
+            results.append(result)
+    finally:
+        server.shutdown()
+    print(f"\nfake server requests: {server.stats['requests']}, jobs: {jobs.stats()}")
+    print(f"artifact store: {artifacts.stats()}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if any(result["errors"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+# Lightweight per-stage tracing. Code wraps each stage in `with stage(name):`
+# and fills in attributes (token counts, cache hits, payload sizes); finished
+# spans go to the Trace set for the current session or batch run, and are
+# appended to AI_COACH_TRACE_FILE when that is set.
+
+MAX_SPANS = 2000
+TRACE_FILE = os.environ.get("AI_COACH_TRACE_FILE")
+
+_current_trace = ContextVar("current_trace", default=None)
+_current_span = ContextVar("current_span", default=None)
+_file_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration = 0.0
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, key, amount=1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            **self.attributes,
+        }
+
+
+class Trace:
+    def __init__(self, max_spans=MAX_SPANS):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.spans)
+
+    def summary(self):
+        stages = {}
+        for span in self.snapshot():
+            stats = stages.setdefault(
+                span.name,
+                {
+                    "stage": span.name,
+                    "count": 0,
+                    "errors": 0,
+                    "cache_hits": 0,
+                    "input_tokens": 0,
+                    "cached_tokens": 0,
+                    "durations": [],
+                },
+            )
+            stats["count"] += 1
+            stats["errors"] += span.error is not None
+            stats["cache_hits"] += bool(span.attributes.get("cache_hit"))
+            stats["input_tokens"] += span.attributes.get("input_tokens", 0)
+            stats["cached_tokens"] += span.attributes.get("cached_tokens", 0)
+            stats["durations"].append(span.duration * 1000)
+        rows = []
+        for stats in stages.values():
+            durations = sorted(stats.pop("durations"))
+            stats["mean_ms"] = round(sum(durations) / len(durations), 2)
+            stats["p95_ms"] = round(durations[int(0.95 * (len(durations) - 1))], 2)
+            stats["prompt_cache_rate"] = (
+                round(stats["cached_tokens"] / stats["input_tokens"], 3)
+                if stats["input_tokens"]
+                else None
+            )
+            rows.append(stats)
+        return rows
+
+
+def set_trace(trace):
+    _current_trace.set(trace)
+
+
+@contextmanager
+def track_trace(trace):
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def stage(name, **attributes):
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    span = Span(
+        name,
+        trace.trace_id if trace else uuid.uuid4().hex,
+        parent.span_id if parent else None,
+        attributes,
+    )
+    token = _current_span.set(span)
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as error:
+        span.error = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        span.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        if trace is not None:
+            trace.add(span)
+        if TRACE_FILE:
+            append_spans(TRACE_FILE, [span])
+
+
+def current_span():
+    return _current_span.get()
+
+
+# Called from the pooled HTTP clients so retries inside the OpenAI SDK show up
+# on the span that made the call
+def count_http_request(request=None):
+    span = _current_span.get()
+    if span is not None:
+        span.add("http_requests")
+
+
+async def acount_http_request(request=None):
+    count_http_request(request)
+
+
+# OpenAI reports prompt-cache hits only in the raw usage object, which the
+# streamed LangChain chunks drop, so response bodies are scanned on the way
+# through and the count lands on the span that made the call
+CACHED_TOKENS_RE = re.compile(rb'"cached_tokens":\s*(\d+)')
+
+
+class _CachedTokenScanner:
+    def __init__(self, span):
+        self.span = span
+        self.tail = b""
+
+    def scan(self, chunk):
+        data = self.tail + chunk
+        for match in CACHED_TOKENS_RE.finditer(data):
+            self.span.set(cached_tokens=int(match.group(1)))
+        # Keep enough bytes to catch a match split across chunks
+        self.tail = data[-64:]
+
+
+# (sync, async) stream wrappers, defined on first response so importing
+# metrics does not import httpx
+@lru_cache(maxsize=None)
+def _scanning_streams():
+    import httpx
+
+    class ScanningStream(httpx.SyncByteStream):
+        def __init__(self, stream, scanner):
+            self.stream = stream
+            self.scanner = scanner
+
+        def __iter__(self):
+            for chunk in self.stream:
+                self.scanner.scan(chunk)
+                yield chunk
+
+        def close(self):
+            self.stream.close()
+
+    class AsyncScanningStream(httpx.AsyncByteStream):
+        def __init__(self, stream, scanner):
+            self.stream = stream
+            self.scanner = scanner
+
+        async def __aiter__(self):
+            async for chunk in self.stream:
+                self.scanner.scan(chunk)
+                yield chunk
+
+        async def aclose(self):
+            await self.stream.aclose()
+
+    return ScanningStream, AsyncScanningStream
+
+
+def scan_cached_tokens(response):
+    span = _current_span.get()
+    if span is not None:
+        scanning_stream = _scanning_streams()[0]
+        response.stream = scanning_stream(response.stream, _CachedTokenScanner(span))
+
+
+async def ascan_cached_tokens(response):
+    span = _current_span.get()
+    if span is not None:
+        async_scanning_stream = _scanning_streams()[1]
+        response.stream = async_scanning_stream(
+            response.stream, _CachedTokenScanner(span)
+        )
+
+
+def to_jsonl(spans):
+    return "".join(json.dumps(span.to_dict()) + "\n" for span in spans)
+
+
+def append_spans(path, spans):
+    with _file_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(to_jsonl(spans))
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# OTLP/JSON (the OpenTelemetry collector's HTTP JSON format) for the spans
+def to_otlp(spans, service_name="ai-coach"):
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": service_name}}
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "ai-coach"},
+                        "spans": [
+                            {
+                                "traceId": span.trace_id,
+                                "spanId": span.span_id,
+                                **(
+                                    {"parentSpanId": span.parent_id}
+                                    if span.parent_id
+                                    else {}
+                                ),
+                                "name": span.name,
+                                "kind": 1,
+                                "startTimeUnixNano": str(int(span.start * 1e9)),
+                                "endTimeUnixNano": str(
+                                    int((span.start + span.duration) * 1e9)
+                                ),
+                                "attributes": [
+                                    {"key": key, "value": _otlp_value(value)}
+                                    for key, value in span.attributes.items()
+                                    if value is not None
+                                ],
+                                "status": (
+                                    {"code": 2, "message": span.error}
+                                    if span.error
+                                    else {"code": 1}
+                                ),
+                            }
+                            for span in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
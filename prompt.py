@@ -35,6 +35,41 @@ Output format:
 }
 """
 
+# Used when the original section text was found locally, so the model only
+# returns the structured fields
+analyze_fields_prompt = """Requirements:
+1. Format the output as JSON objects for each tech skill section, work experience, and project, with sections containing lists of items.
+2. Bullet points in the work experience and projects sections should be nested within lists.
+
+Action:
+1. Return three items of data: the tech skill, work experience, and projects in the resume text. Here is an example:
+
+Output format:
+{
+  "skills": {
+    "Programming Languages": ["Java", "Python"],
+  },
+  "experiences": [
+    {
+      "company": "ABC Corp",
+      "role": "Software Developer",
+      "details": [
+        "Implemented a Vite-based build system using Django and React, reducing build times by 40% and improving overall application performance."
+      ]
+    }
+  ],
+  "projects": [
+    {
+      "name": "Inventory Management System",
+      "technologies": ["Python", "Django"],
+      "details": [
+        "Implemented a Vite-based build system using Django and React, reducing build times by 40% and improving overall application performance.",
+      ]
+    }
+  ]
+}
+"""
+
 update_skill_prompt = """
 Requirements:
 1. The updated tech skills should be categorized into no more than 5 sections: Programming Languages, Frameworks and Tools, Databases, Cloud Services (choose from AWS, GCP, Azure, Oracle Cloud) and Others (Protocol, Design Pattern, CI/CD, ).
@@ -146,3 +181,10 @@ Action:
 Review:
 1. Review the response to ensure it meets all the requirements and Action.
 """
+
+company_product_prompt = """Provide an overview of the main products and services offered by the company the user names. Please include details about their core features, target audience, and how these products serve the needs of professionals and businesses. If you don't know the company, just return an empty response.
+"""
+
+format_prompt = """Generate a text that corresponds to the original resume format using the new content. Looks like
+{"text": ...}
+"""
@@ -0,0 +1,147 @@
+import re
+import zlib
+
+from cache import LRUCache, content_hash
+from skills import TAXONOMY, leaf_texts, matcher, resume_skills
+from tokens import STOPWORDS, WORD_RE
+
+# Ranks many job descriptions against one analyzed resume locally, so only the
+# best few need a model call to customize for. Every posting and the resume
+# become hashed TF-IDF vectors (words plus the canonical skills they name)
+# held as sparse (row, column, weight) arrays, and all postings are scored
+# against the resume at once. A posting's fit blends its weighted skill
+# coverage, as in skills.match_report, with the text similarity. NumPy is
+# imported on first use like the other heavy dependencies.
+
+# Hashed feature columns; collisions are rare at this size and only blur
+# similarity a little
+FEATURES = 2**18
+# Share of the fit that comes from skill coverage; the rest is similarity
+SKILL_WEIGHT = 0.7
+# Largest number of postings ranked at once
+MAX_POSTINGS = 500
+TITLE_LENGTH = 80
+UNTITLED = "(untitled posting)"
+# Postings pasted together are separated by a line of three or more dashes
+SEPARATOR_RE = re.compile(r"^\s*-{3,}\s*$", re.MULTILINE)
+SKILL_NAMES = [name for skills in TAXONOMY.values() for name in skills]
+SKILL_INDEX = {name: i for i, name in enumerate(SKILL_NAMES)}
+
+# Rankings for the most recent (resume, postings) pairs, shared by sessions
+ranking_cache = LRUCache(16)
+
+
+def split_postings(text):
+    return [posting.strip() for posting in SEPARATOR_RE.split(text) if posting.strip()]
+
+
+def posting_title(posting):
+    title = next(
+        (line.strip() for line in posting.splitlines() if line.strip()), UNTITLED
+    )
+    return title if len(title) <= TITLE_LENGTH else title[: TITLE_LENGTH - 1] + "…"
+
+
+# Words and skills of text as hashed feature columns, repeated per mention
+def _columns(text, skills, hashes):
+    tokens = [word.strip(".") for word in WORD_RE.findall(text.lower())]
+    tokens = [token for token in tokens if token and token not in STOPWORDS]
+    tokens += [f"skill:{skill}" for skill in skills]
+    columns = []
+    for token in tokens:
+        column = hashes.get(token)
+        if column is None:
+            column = hashes[token] = zlib.crc32(token.encode("utf-8")) % FEATURES
+        columns.append(column)
+    return columns
+
+
+# (rows, columns, weights) of the L2-normalized TF-IDF matrix of texts, with
+# sublinear term frequency and smoothed IDF over the same texts
+def tfidf(texts, skills):
+    import numpy as np
+
+    hashes = {}
+    per_text = [_columns(text, found, hashes) for text, found in zip(texts, skills)]
+    rows = np.repeat(np.arange(len(texts)), [len(columns) for columns in per_text])
+    columns = np.fromiter(
+        (column for text_columns in per_text for column in text_columns),
+        dtype=np.int64,
+        count=len(rows),
+    )
+    keys, counts = np.unique(rows * FEATURES + columns, return_counts=True)
+    rows, columns = keys // FEATURES, keys % FEATURES
+    document_frequency = np.bincount(columns, minlength=FEATURES)
+    idf = np.log((1 + len(texts)) / (1 + document_frequency[columns])) + 1
+    weights = (1 + np.log(counts)) * idf
+    norms = np.sqrt(np.bincount(rows, weights**2, minlength=len(texts)))
+    weights /= np.maximum(norms[rows], 1e-12)
+    return rows, columns, weights
+
+
+# [{"index", "title", "fit", "similarity", "skill_score", "matched",
+# "missing"}] for postings, best fit first; missing is most mentioned first
+def rank_postings(postings, resume_response):
+    import numpy as np
+
+    postings = postings[:MAX_POSTINGS]
+    if not postings:
+        return []
+    skill_matcher = matcher()
+    posting_skills = [skill_matcher.counts(posting) for posting in postings]
+    resume_text = "\n".join(
+        text
+        for key in ("skills", "experiences", "projects")
+        for text in leaf_texts(resume_response.get(key) or {})
+    )
+    listed, mentioned = resume_skills(resume_response)
+    has_skill = np.zeros(len(SKILL_NAMES))
+    has_skill[[SKILL_INDEX[name] for name in listed | mentioned]] = 1
+
+    # Row 0 is the resume, so its words count towards IDF like a posting's
+    rows, columns, weights = tfidf(
+        [resume_text] + postings,
+        [skill_matcher.counts(resume_text).elements()]
+        + [counts.elements() for counts in posting_skills],
+    )
+    resume_vector = np.zeros(FEATURES)
+    resume_vector[columns[rows == 0]] = weights[rows == 0]
+    similarity = np.bincount(
+        rows, weights * resume_vector[columns], minlength=len(postings) + 1
+    )[1:]
+
+    mentions = np.zeros((len(postings), len(SKILL_NAMES)))
+    for i, counts in enumerate(posting_skills):
+        for name, count in counts.items():
+            mentions[i, SKILL_INDEX[name]] = count
+    totals = mentions.sum(axis=1)
+    skill_score = np.divide(
+        mentions @ has_skill, totals, out=np.zeros(len(postings)), where=totals > 0
+    )
+    fit = SKILL_WEIGHT * skill_score + (1 - SKILL_WEIGHT) * similarity
+
+    ranked = []
+    for i in np.argsort(-fit, kind="stable"):
+        counts = posting_skills[i]
+        ranked.append(
+            {
+                "index": int(i),
+                "title": posting_title(postings[i]),
+                "fit": round(100 * float(fit[i])),
+                "similarity": round(float(similarity[i]), 4),
+                "skill_score": round(100 * float(skill_score[i])),
+                "matched": [name for name in counts if has_skill[SKILL_INDEX[name]]],
+                "missing": sorted(
+                    (name for name in counts if not has_skill[SKILL_INDEX[name]]),
+                    key=lambda name: -counts[name],
+                ),
+            }
+        )
+    return ranked
+
+
+def cached_rank_postings(postings, resume_response):
+    return ranking_cache.get_or_compute(
+        content_hash(postings, resume_response),
+        lambda: rank_postings(postings, resume_response),
+    )
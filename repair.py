@@ -0,0 +1,231 @@
+import re
+import json
+
+# Local fixes for almost-JSON completions: code fences and prose around the
+# object, trailing commas, raw newlines inside strings and output cut off
+# between two values. Anything still broken is narrowed down to the smallest
+# object or list that fails to parse so only that fragment has to be sent back
+# to the model.
+
+_decoder = json.JSONDecoder()
+FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+FIX_JSON_PROMPT = """The JSON below is invalid ({error}).
+Return only the corrected JSON with the same keys and values. Do not add, remove or reword anything.
+
+{fragment}
+"""
+
+FIX_SCHEMA_PROMPT = """The JSON below is invalid for the required schema:
+{error}
+Return only the corrected JSON. Keep every key and value it already has; only add the missing fields and correct values of the wrong type.
+
+{fragment}
+"""
+
+
+# Offset just past the object or list text starts with, or None when it is
+# never closed
+def _container_end(text):
+    depth = 0
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def _strip_wrapping(text):
+    match = FENCE_RE.search(text)
+    if match:
+        text = match.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text
+    text = text[min(starts) :]
+    # Prose after the value goes too, whether or not the value parses yet
+    try:
+        end = _decoder.raw_decode(text)[1]
+    except ValueError:
+        end = _container_end(text)
+    return text[:end] if end else text
+
+
+# One pass over the text, outside strings dropping commas that directly precede
+# a closing bracket and inside strings escaping raw control characters
+def _clean(text):
+    out = []
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            elif char == "\t":
+                char = "\\t"
+        elif char == '"':
+            in_string = True
+        elif char == ",":
+            rest = text[i + 1 :].lstrip()
+            if rest[:1] in ("}", "]"):
+                continue
+        out.append(char)
+    return "".join(out)
+
+
+def clean_json(text):
+    return _clean(_strip_wrapping(text))
+
+
+# Whether text ends right after a complete value (a string that is not a key,
+# an object or a list), so closing the brackets it left open cannot turn a
+# half-written string into an entry
+def _ends_with_value(text):
+    stack = []
+    in_string = escaped = is_key = False
+    last = ""
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char.isspace():
+            continue
+        if char == '"':
+            in_string = True
+            is_key = stack[-1:] == ["{"] and last in ("{", ",")
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]" and stack:
+            stack.pop()
+        last = char
+    return not in_string and (last in ("}", "]") or (last == '"' and not is_key))
+
+
+def repair_json(text):
+    cleaned = clean_json(text)
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        pass
+    if not _ends_with_value(cleaned):
+        return None
+    # Closes the objects and lists left open by output cut off between values
+    from langchain_core.utils.json import parse_partial_json
+
+    try:
+        return parse_partial_json(cleaned)
+    except ValueError:
+        return None
+
+
+# (start, end) offsets of each member of the object or list text starts with
+def top_level_members(text):
+    members = []
+    depth = 0
+    in_string = escaped = False
+    start = None
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+            if depth == 1:
+                start = i + 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                break
+        elif char == "," and depth == 1:
+            members.append((start, i))
+            start = i + 1
+    if start is not None and text[start:i].strip():
+        members.append((start, i if depth == 0 else len(text)))
+    return members
+
+
+def _parse_members(text):
+    is_object = text.startswith("{")
+    items, broken = [], None
+    for start, end in top_level_members(text):
+        member = text[start:end].strip()
+        key, value_text = len(items), member
+        if is_object:
+            try:
+                key, offset = _decoder.raw_decode(member)
+            except ValueError:
+                return None, None
+            value_text = member[offset:].lstrip()
+            if not value_text.startswith(":"):
+                return None, None
+            value_text = value_text[1:].strip()
+        try:
+            items.append((key, json.loads(value_text)))
+        except ValueError:
+            if broken is not None:
+                return None, None
+            broken = len(items)
+            items.append((key, value_text))
+    return items, broken
+
+
+# Narrow a broken container down to the smallest object or list that holds the
+# error, e.g. one bullet list inside one experience. Returns (root, holder,
+# key, fragment): root is everything that parsed, and the fixed fragment goes
+# in holder[key]. Returns None when text itself is the smallest broken part.
+def narrow_broken(text):
+    if not text.startswith(("{", "[")):
+        return None
+    items, broken = _parse_members(text)
+    if broken is None:
+        return None
+    if text.startswith("{"):
+        root = dict(items)
+    else:
+        root = [value for _, value in items]
+    key, value_text = items[broken]
+    if not value_text.startswith(("{", "[")):
+        return None
+    inner = narrow_broken(value_text)
+    if inner is None:
+        return root, root, key, value_text
+    root[key] = inner[0]
+    return (root,) + inner[1:]
+
+
+def fix_json_query(fragment, error):
+    return FIX_JSON_PROMPT.format(error=error, fragment=fragment)
+
+
+def fix_schema_query(text, error):
+    return FIX_SCHEMA_PROMPT.format(error=error, fragment=text)
@@ -0,0 +1,211 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+
+from llm import rate_limit_bucket
+
+# Process-wide admission control for model calls. Every Streamlit session runs
+# in its own thread, so calls for the same API key and model queue in one lane:
+# at most MAX_IN_FLIGHT run at once, waiting calls are admitted interactive
+# first, then background, then in arrival order, and once MAX_QUEUED are waiting
+# new calls are turned away instead of piling up. Admitted calls then take a
+# token from the lane's rate-limit bucket, which 429 Retry-After replies pause.
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+MAX_IN_FLIGHT = int(os.environ.get("AI_COACH_MAX_IN_FLIGHT", "8"))
+MAX_QUEUED = int(os.environ.get("AI_COACH_MAX_QUEUED", "64"))
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class SchedulerFull(RuntimeError):
+    pass
+
+
+# Calls made inside the block (and tasks or threads started from it with the
+# current context) are queued at this priority
+@contextmanager
+def priority(level):
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class Ticket:
+    def __init__(self, priority, queue_depth):
+        self.priority = priority
+        self.queue_depth = queue_depth
+        self.start = time.monotonic()
+        self.queue_ms = 0.0
+
+    def admitted(self):
+        self.queue_ms = round((time.monotonic() - self.start) * 1000, 1)
+
+    def span_attributes(self):
+        return {
+            "priority": PRIORITY_NAMES[self.priority],
+            "queue_depth": self.queue_depth,
+            "queue_ms": self.queue_ms,
+        }
+
+
+class _Lane:
+    def __init__(self):
+        self.in_flight = 0
+        # Heap of [priority, sequence, notify, state]
+        self.waiting = []
+        self.admitted = 0
+        self.rejected = 0
+        self.max_queued = 0
+        self.wait_ms = 0.0
+
+
+class Scheduler:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queued=MAX_QUEUED):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def _queued(self, lane):
+        return sum(1 for waiter in lane.waiting if waiter[3] == "waiting")
+
+    # Returns (waiter, queue depth); the waiter is None when admitted at once
+    def _enqueue(self, key, level, notify):
+        with self._lock:
+            lane = self._lanes.setdefault(key, _Lane())
+            queued = self._queued(lane)
+            if lane.in_flight < self.max_in_flight and not queued:
+                lane.in_flight += 1
+                lane.admitted += 1
+                return None, 0
+            if queued >= self.max_queued:
+                lane.rejected += 1
+                raise SchedulerFull(
+                    f"{queued} model calls are already waiting; try again shortly"
+                )
+            waiter = [level, next(self._sequence), notify, "waiting"]
+            heapq.heappush(lane.waiting, waiter)
+            lane.max_queued = max(lane.max_queued, queued + 1)
+            return waiter, queued + 1
+
+    def _dispatch(self, lane):
+        while lane.waiting and lane.in_flight < self.max_in_flight:
+            waiter = heapq.heappop(lane.waiting)
+            if waiter[3] != "waiting":
+                continue
+            waiter[3] = "admitted"
+            lane.in_flight += 1
+            lane.admitted += 1
+            waiter[2]()
+
+    def _release(self, key, ticket):
+        with self._lock:
+            lane = self._lanes[key]
+            lane.in_flight -= 1
+            lane.wait_ms += ticket.queue_ms
+            self._dispatch(lane)
+
+    # Gives up a queued waiter, or the slot it was granted meanwhile
+    def _cancel(self, key, waiter):
+        with self._lock:
+            if waiter[3] == "waiting":
+                waiter[3] = "cancelled"
+                return
+        self._release(key, Ticket(waiter[0], 0))
+
+    @contextmanager
+    def slot(self, api_key, model_name):
+        key = (api_key, model_name)
+        admitted = threading.Event()
+        level = _priority.get()
+        waiter, depth = self._enqueue(key, level, admitted.set)
+        ticket = Ticket(level, depth)
+        try:
+            if waiter is not None:
+                admitted.wait()
+            time.sleep(rate_limit_bucket(api_key, model_name).reserve())
+        except BaseException:
+            if waiter is not None:
+                self._cancel(key, waiter)
+            else:
+                self._release(key, ticket)
+            raise
+        ticket.admitted()
+        try:
+            yield ticket
+        finally:
+            self._release(key, ticket)
+
+    @asynccontextmanager
+    async def aslot(self, api_key, model_name):
+        key = (api_key, model_name)
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        # Called under the scheduler lock, possibly from another thread
+        def notify():
+            loop.call_soon_threadsafe(
+                lambda: admitted.done() or admitted.set_result(None)
+            )
+
+        level = _priority.get()
+        waiter, depth = self._enqueue(key, level, notify)
+        ticket = Ticket(level, depth)
+        try:
+            if waiter is not None:
+                await admitted
+            await asyncio.sleep(rate_limit_bucket(api_key, model_name).reserve())
+        except BaseException:
+            if waiter is not None:
+                self._cancel(key, waiter)
+            else:
+                self._release(key, ticket)
+            raise
+        ticket.admitted()
+        try:
+            yield ticket
+        finally:
+            self._release(key, ticket)
+
+    # One row per API key and model for the diagnostics panel
+    def stats(self):
+        rows = []
+        with self._lock:
+            for (api_key, model_name), lane in self._lanes.items():
+                waiting = [w[0] for w in lane.waiting if w[3] == "waiting"]
+                rows.append(
+                    {
+                        "api_key": f"…{api_key[-4:]}" if api_key else "",
+                        "model": model_name,
+                        "in_flight": lane.in_flight,
+                        "queued_interactive": waiting.count(INTERACTIVE),
+                        "queued_background": waiting.count(BACKGROUND),
+                        "max_queued": lane.max_queued,
+                        "admitted": lane.admitted,
+                        "rejected": lane.rejected,
+                        "mean_wait_ms": (
+                            round(lane.wait_ms / lane.admitted, 1)
+                            if lane.admitted
+                            else 0.0
+                        ),
+                    }
+                )
+        return rows
+
+
+scheduler = Scheduler()
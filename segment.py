@@ -0,0 +1,197 @@
+import io
+import re
+from collections import Counter
+
+from latex import latex_to_text
+
+# Finds the skills, experiences and projects sections of a resume locally from
+# its headings, so analysis does not need the model to echo them back. PDF and
+# DOCX headings are recognised by their text plus styling (bold, larger font,
+# heading style or all caps), LaTeX ones by their sectioning command and mapped
+# back to the source so updated lines can be written into the .tex.
+
+SECTION_WORDS = {
+    "skills": {"skills", "technologies", "competencies", "proficiencies", "stack"},
+    "experiences": {"experience", "experiences", "employment", "history"},
+    "projects": {"project", "projects"},
+}
+# Headings that end the current section without starting a wanted one
+OTHER_WORDS = {
+    "education",
+    "summary",
+    "objective",
+    "profile",
+    "certifications",
+    "certificates",
+    "awards",
+    "honors",
+    "achievements",
+    "publications",
+    "interests",
+    "languages",
+    "volunteering",
+    "activities",
+    "involvement",
+    "leadership",
+    "references",
+    "contact",
+    "coursework",
+}
+MAX_HEADING_WORDS = 5
+# \section, \section*, \subsection and template commands like \resumeSection
+TEX_SECTION_RE = re.compile(
+    r"\\[A-Za-z]*section\*?\s*(?:\[[^\]]*\])?\s*\{([^}]*)\}", re.IGNORECASE
+)
+
+
+def heading_section(text):
+    text = text.strip().rstrip(":").replace("&", " and ")
+    words = re.sub(r"[^a-z ]", " ", text.lower()).split()
+    if not words or len(words) > MAX_HEADING_WORDS or ":" in text:
+        return None
+    if "skills" in words:
+        return "skills"
+    for section, section_words in SECTION_WORDS.items():
+        if words[-1] in section_words:
+            return section
+    if words[-1] in OTHER_WORDS:
+        return "other"
+    return None
+
+
+# lines are (text, styled) pairs; styled is None when there is no styling
+# information. Headings must be styled when any heading is, so a "Languages"
+# line inside the skills section is not taken for a heading.
+def segment_lines(lines):
+    return {
+        section: "\n".join(lines[i][0].rstrip() for i in indices)
+        for section, indices in section_line_indices(lines).items()
+    }
+
+
+# {section: [index of each non-empty body line]}
+def section_line_indices(lines):
+    sections = _segment(lines, strict=True)
+    return sections or _segment(lines, strict=False)
+
+
+def _segment(lines, strict):
+    sections = {}
+    current = None
+    for i, (text, styled) in enumerate(lines):
+        section = heading_section(text) if styled or not strict else None
+        if section:
+            current = None if section == "other" else section
+            if current:
+                sections.setdefault(current, [])
+            continue
+        if current and text.strip():
+            sections[current].append(i)
+    return {section: body for section, body in sections.items() if body}
+
+
+# (text, styled, page_number, rect) for each text line of an open PDF
+def pdf_line_boxes(pdf_document):
+    import fitz
+
+    lines = []
+    for page in pdf_document:
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                spans = [span for span in line["spans"] if span["text"].strip()]
+                if not spans:
+                    continue
+                text = "".join(span["text"] for span in line["spans"]).strip()
+                bold = all(
+                    span["flags"] & 16 or "bold" in span["font"].lower()
+                    for span in spans
+                )
+                size = max(span["size"] for span in spans)
+                lines.append((text, bold, size, page.number, fitz.Rect(line["bbox"])))
+    sizes = Counter()
+    for text, _, size, _, _ in lines:
+        sizes[round(size, 1)] += len(text)
+    body_size = sizes.most_common(1)[0][0] if sizes else 0
+    return [
+        (text, bold or size > body_size + 0.5 or text.isupper(), page_number, rect)
+        for text, bold, size, page_number, rect in lines
+    ]
+
+
+def pdf_lines(data):
+    import fitz
+
+    with fitz.open(stream=data, filetype="pdf") as pdf_document:
+        return [(text, styled) for text, styled, _, _ in pdf_line_boxes(pdf_document)]
+
+
+def docx_paragraph_lines(paragraphs):
+    lines = []
+    for para in paragraphs:
+        runs = [run for run in para.runs if run.text.strip()]
+        style = (para.style.name if para.style is not None else "").lower()
+        styled = (
+            style.startswith(("heading", "title"))
+            or (runs and all(run.bold for run in runs))
+            or para.text.isupper()
+        )
+        lines.append((para.text, bool(styled)))
+    return lines
+
+
+def docx_lines(data):
+    from docx import Document
+
+    return docx_paragraph_lines(Document(io.BytesIO(data)).paragraphs)
+
+
+# {"skills": (start, end), ...} source offsets of each wanted section's body
+# in a .tex file, found from its sectioning commands or, for templates without
+# them, from heading lines in the converted text. The first heading wins.
+def tex_section_spans(source, latex_text=None):
+    end = source.find("\\end{document}")
+    end = end if end >= 0 else len(source)
+    headings = [
+        (match.start(), match.end(), heading_section(match.group(1)))
+        for match in TEX_SECTION_RE.finditer(source, 0, end)
+    ]
+    if not headings:
+        latex_text = latex_text or latex_to_text(source)
+        for start, stop in latex_text.lines():
+            section = heading_section(latex_text.text[start:stop])
+            span = latex_text.source_span(start, stop)
+            if section and span:
+                # Whole source lines, so markup around the heading stays put
+                line_start = source.rfind("\n", 0, span[0]) + 1
+                line_end = source.find("\n", span[1])
+                headings.append(
+                    (line_start, line_end + 1 if line_end >= 0 else end, section)
+                )
+    spans = {}
+    for i, (_, body_start, section) in enumerate(headings):
+        body_end = headings[i + 1][0] if i + 1 < len(headings) else end
+        if section in SECTION_WORDS and section not in spans:
+            spans[section] = (body_start, body_end)
+    return spans
+
+
+def tex_sections(source):
+    latex_text = latex_to_text(source)
+    sections = {}
+    for section, (start, end) in tex_section_spans(source, latex_text).items():
+        text_range = latex_text.text_range(start, end)
+        if text_range:
+            sections[section] = latex_text.text[slice(*text_range)].strip()
+    return {section: text for section, text in sections.items() if text}
+
+
+# {"skills": text, "experiences": text, "projects": text} for the sections
+# that were found; missing sections are simply left out
+def segment_resume(data, file_type):
+    if file_type == "PDF":
+        return segment_lines(pdf_lines(data))
+    if file_type == "DOC":
+        return segment_lines(docx_lines(data))
+    if file_type == "Latex":
+        return tex_sections(data.decode("utf-8"))
+    return {}
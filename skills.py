@@ -0,0 +1,389 @@
+from collections import Counter, deque
+from functools import lru_cache
+
+from tokens import keywords
+
+# Local skill matching for job descriptions and resumes, with no model call.
+# A small taxonomy maps the ways skills are written ("k8s", "Postgres",
+# "node.js") to one canonical name, and every alias is compiled into a single
+# Aho-Corasick automaton so a job description is scanned once whatever the
+# number of aliases. Matches must sit on word boundaries and overlapping
+# matches keep the longest (C++ rather than C, Spring Boot rather than Spring).
+
+# {section: {canonical name: [aliases]}}; sections follow update_skill_prompt
+TAXONOMY = {
+    "Programming Languages": {
+        "Python": ["python", "python3"],
+        "Java": ["java"],
+        "JavaScript": ["javascript", "js", "es6", "ecmascript"],
+        "TypeScript": ["typescript"],
+        "Go": ["golang"],
+        "Rust": ["rust"],
+        "C": [],
+        "C++": ["c++", "cpp"],
+        "C#": ["c#", "csharp"],
+        "Ruby": ["ruby"],
+        "PHP": ["php"],
+        "Kotlin": ["kotlin"],
+        "Swift": [],
+        "Objective-C": ["objective-c", "objective c"],
+        "Scala": ["scala"],
+        "R": [],
+        "MATLAB": ["matlab"],
+        "Perl": ["perl"],
+        "Dart": ["dart"],
+        "Elixir": ["elixir"],
+        "Haskell": ["haskell"],
+        "Lua": ["lua"],
+        "SQL": ["sql"],
+        "Bash": ["bash", "shell scripting", "shell script"],
+        "HTML": ["html", "html5"],
+        "CSS": ["css", "css3"],
+        "Solidity": ["solidity"],
+    },
+    "Frameworks and Tools": {
+        "React": ["react", "react.js", "reactjs"],
+        "React Native": ["react native"],
+        "Angular": ["angular", "angularjs", "angular.js"],
+        "Vue": ["vue", "vue.js", "vuejs"],
+        "Next.js": ["next.js", "nextjs"],
+        "Svelte": ["svelte"],
+        "Redux": ["redux"],
+        "Tailwind CSS": ["tailwind", "tailwind css", "tailwindcss"],
+        "Vite": ["vite"],
+        "Webpack": ["webpack"],
+        "Node.js": ["node.js", "nodejs"],
+        "Express": ["express.js", "expressjs"],
+        "NestJS": ["nestjs", "nest.js"],
+        "Django": ["django"],
+        "Flask": ["flask"],
+        "FastAPI": ["fastapi"],
+        "Spring": ["spring framework"],
+        "Spring Boot": ["spring boot", "springboot"],
+        "Hibernate": ["hibernate"],
+        ".NET": [".net", "dotnet", ".net core", "asp.net"],
+        "Ruby on Rails": ["ruby on rails", "rails"],
+        "Laravel": ["laravel"],
+        "Flutter": ["flutter"],
+        "GraphQL": ["graphql"],
+        "gRPC": ["grpc"],
+        "REST": ["restful", "rest api", "rest apis", "restful api"],
+        "Microservices": ["microservices", "microservice"],
+        "Docker": ["docker", "containerization"],
+        "Kubernetes": ["kubernetes", "k8s"],
+        "Helm": ["helm"],
+        "Terraform": ["terraform"],
+        "Ansible": ["ansible"],
+        "Jenkins": ["jenkins"],
+        "GitHub Actions": ["github actions"],
+        "GitLab CI": ["gitlab ci", "gitlab ci/cd"],
+        "CI/CD": ["ci/cd", "ci cd", "cicd", "continuous integration"],
+        "Git": ["git"],
+        "Linux": ["linux", "unix"],
+        "Kafka": ["kafka", "apache kafka"],
+        "RabbitMQ": ["rabbitmq"],
+        "Spark": ["spark", "apache spark", "pyspark"],
+        "Hadoop": ["hadoop"],
+        "Airflow": ["airflow", "apache airflow"],
+        "dbt": ["dbt"],
+        "Pandas": ["pandas"],
+        "NumPy": ["numpy"],
+        "scikit-learn": ["scikit-learn", "sklearn", "scikit learn"],
+        "TensorFlow": ["tensorflow"],
+        "PyTorch": ["pytorch", "torch"],
+        "Keras": ["keras"],
+        "Hugging Face": ["hugging face", "huggingface", "transformers"],
+        "LangChain": ["langchain"],
+        "OpenCV": ["opencv"],
+        "Prometheus": ["prometheus"],
+        "Grafana": ["grafana"],
+        "Datadog": ["datadog"],
+        "Splunk": ["splunk"],
+        "Nginx": ["nginx"],
+        "Jira": ["jira"],
+        "Figma": ["figma"],
+        "Selenium": ["selenium"],
+        "Cypress": ["cypress"],
+        "Jest": ["jest"],
+        "pytest": ["pytest"],
+        "JUnit": ["junit"],
+        "Maven": ["maven"],
+        "Gradle": ["gradle"],
+        "Tableau": ["tableau"],
+        "Power BI": ["power bi", "powerbi"],
+        "Unity": ["unity3d"],
+    },
+    "Databases": {
+        "PostgreSQL": ["postgresql", "postgres", "psql"],
+        "MySQL": ["mysql"],
+        "SQLite": ["sqlite"],
+        "SQL Server": ["sql server", "mssql", "microsoft sql server"],
+        "Oracle Database": ["oracle database", "oracle db", "pl/sql"],
+        "MongoDB": ["mongodb", "mongo"],
+        "Redis": ["redis"],
+        "Cassandra": ["cassandra"],
+        "DynamoDB": ["dynamodb"],
+        "Elasticsearch": ["elasticsearch", "elastic search", "opensearch"],
+        "Snowflake": ["snowflake"],
+        "BigQuery": ["bigquery", "big query"],
+        "Redshift": ["redshift"],
+        "Neo4j": ["neo4j"],
+        "Firebase": ["firebase", "firestore"],
+        "Memcached": ["memcached"],
+        "ClickHouse": ["clickhouse"],
+    },
+    "Cloud Services": {
+        "AWS": ["aws", "amazon web services"],
+        "EC2": ["ec2"],
+        "S3": ["s3"],
+        "AWS Lambda": ["aws lambda", "lambda functions"],
+        "ECS": ["ecs"],
+        "EKS": ["eks"],
+        "CloudFormation": ["cloudformation"],
+        "GCP": ["gcp", "google cloud", "google cloud platform"],
+        "GKE": ["gke"],
+        "Azure": ["azure", "microsoft azure"],
+        "Oracle Cloud": ["oracle cloud", "oci"],
+        "Heroku": ["heroku"],
+        "Vercel": ["vercel"],
+        "Serverless": ["serverless"],
+    },
+    "Others": {
+        "Machine Learning": ["machine learning", "ml"],
+        "Deep Learning": ["deep learning"],
+        "NLP": ["nlp", "natural language processing"],
+        "Computer Vision": ["computer vision"],
+        "LLM": ["llm", "llms", "large language models", "large language model"],
+        "Data Structures": ["data structures"],
+        "Algorithms": ["algorithms"],
+        "Distributed Systems": ["distributed systems"],
+        "System Design": ["system design"],
+        "OOP": ["oop", "object-oriented programming", "object oriented programming"],
+        "Design Patterns": ["design patterns"],
+        "TDD": ["tdd", "test-driven development", "test driven development"],
+        "Agile": ["agile", "scrum", "kanban"],
+        "DevOps": ["devops"],
+        "Observability": ["observability"],
+        "OAuth": ["oauth", "oauth2", "oauth 2.0"],
+        "WebSockets": ["websockets", "websocket"],
+        "HTTP": ["http", "https"],
+        "TCP/IP": ["tcp/ip", "tcp"],
+        "ETL": ["etl", "elt"],
+        "Data Warehousing": ["data warehousing", "data warehouse"],
+        "A/B Testing": ["a/b testing", "ab testing"],
+        "Blockchain": ["blockchain"],
+    },
+}
+# Names that are also ordinary words or letters only count written exactly so
+CASE_SENSITIVE = {
+    "Go": ["Go"],
+    "C": ["C"],
+    "R": ["R"],
+    "Swift": ["Swift"],
+    "Node.js": ["Node"],
+    "Express": ["Express"],
+    "Spring": ["Spring"],
+    "REST": ["REST"],
+}
+# A resume listing the child skill also covers the parent in a job description
+PARENTS = {
+    "EC2": "AWS",
+    "S3": "AWS",
+    "AWS Lambda": "AWS",
+    "ECS": "AWS",
+    "EKS": "AWS",
+    "CloudFormation": "AWS",
+    "DynamoDB": "AWS",
+    "Redshift": "AWS",
+    "GKE": "GCP",
+    "BigQuery": "GCP",
+    "React Native": "React",
+    "Next.js": "React",
+    "Spring Boot": "Spring",
+    "PyTorch": "Machine Learning",
+    "TensorFlow": "Machine Learning",
+    "scikit-learn": "Machine Learning",
+    "GitHub Actions": "CI/CD",
+    "GitLab CI": "CI/CD",
+    "Jenkins": "CI/CD",
+}
+# Characters that continue a word, so a match next to them is not a whole word
+WORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789_+#")
+
+
+# Multi-pattern string search: finds every occurrence of every pattern in one
+# pass over the text
+class AhoCorasick:
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for i, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append(i)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+    # (start, end, pattern index) for every occurrence, by end offset
+    def finditer(self, text):
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for i in self._out[state]:
+                yield end - len(self.patterns[i]), end, i
+
+
+# Lower-cased text with whitespace as spaces and the same offsets as the input
+def _fold(text):
+    folded = text.lower()
+    if len(folded) != len(text):
+        folded = "".join(
+            char.lower() if len(char.lower()) == 1 else char for char in text
+        )
+    return "".join(" " if char.isspace() else char for char in folded)
+
+
+class SkillMatcher:
+    def __init__(self, taxonomy=TAXONOMY, case_sensitive=CASE_SENSITIVE):
+        self.sections = {}
+        forms = {}
+        for section, skills in taxonomy.items():
+            for canonical, aliases in skills.items():
+                self.sections[canonical] = section
+                for alias in aliases:
+                    forms.setdefault(_fold(alias), (canonical, None))
+        for canonical, exact_forms in case_sensitive.items():
+            for exact in exact_forms:
+                if _fold(exact) not in forms:
+                    forms[_fold(exact)] = (canonical, exact)
+        self._forms = list(forms.values())
+        self._automaton = AhoCorasick(forms)
+
+    # [(start, end, canonical)] in text order, longest match where they overlap
+    def find(self, text):
+        folded = _fold(text)
+        candidates = []
+        for start, end, i in self._automaton.finditer(folded):
+            canonical, exact = self._forms[i]
+            if start > 0 and folded[start - 1] in WORD_CHARS:
+                continue
+            if end < len(folded) and folded[end] in WORD_CHARS:
+                continue
+            # "Go" in "Go-to-market" or "R" in "R&D" is not the skill
+            if exact is not None and (
+                text[start:end] != exact
+                or (end < len(text) and text[end] in "-&'")
+                or (start > 0 and text[start - 1] in "-&'")
+            ):
+                continue
+            candidates.append((start, end, canonical))
+        candidates.sort(key=lambda match: (match[0], match[0] - match[1]))
+        matches, covered = [], 0
+        for start, end, canonical in candidates:
+            if start >= covered:
+                matches.append((start, end, canonical))
+                covered = end
+        return matches
+
+    # Counter of canonical skills in order of first mention
+    def counts(self, text):
+        return Counter(canonical for _, _, canonical in self.find(text))
+
+
+@lru_cache(maxsize=None)
+def matcher():
+    return SkillMatcher()
+
+
+def _with_parents(skills):
+    return set(skills) | {PARENTS[skill] for skill in skills if skill in PARENTS}
+
+
+# Every string in nested section data
+def leaf_texts(data):
+    if isinstance(data, dict):
+        return [text for value in data.values() for text in leaf_texts(value)]
+    if isinstance(data, list):
+        return [text for item in data for text in leaf_texts(item)]
+    return [str(data)]
+
+
+# (skills listed in the skills section, skills anywhere else in the resume)
+def resume_skills(resume_response):
+    skill_matcher = matcher()
+    listed = set()
+    for text in leaf_texts(resume_response.get("skills") or {}):
+        listed |= set(skill_matcher.counts(text))
+    mentioned = set()
+    for key in ("experiences", "projects"):
+        for text in leaf_texts(resume_response.get(key) or []):
+            mentioned |= set(skill_matcher.counts(text))
+    return _with_parents(listed), _with_parents(mentioned)
+
+
+# ATS-style fit of a resume for a job description. Job skills are weighted by
+# how often the description mentions them: coverage is the share of distinct
+# job skills the resume has and score the weighted share out of 100. missing
+# are the job skills the resume lacks, most mentioned first, and unlisted the
+# ones it only mentions outside its skills section.
+def match_report(job_description, resume_response):
+    job = matcher().counts(job_description)
+    listed, mentioned = resume_skills(resume_response)
+    matched = [skill for skill in job if skill in listed or skill in mentioned]
+    missing = sorted(
+        (skill for skill in job if skill not in listed and skill not in mentioned),
+        key=lambda skill: -job[skill],
+    )
+    total = sum(job.values())
+    return {
+        "job_skills": dict(job),
+        "matched": matched,
+        "missing": missing,
+        "unlisted": [skill for skill in matched if skill not in listed],
+        "coverage": round(len(matched) / len(job), 4) if job else 0.0,
+        "score": (
+            round(100 * sum(job[skill] for skill in matched) / total) if total else 0
+        ),
+    }
+
+
+# The job description cut down to its skills for the Skills update: the
+# canonical skill names followed by only the lines that name one. The whole
+# description is returned when it names no known skill or is shorter anyway.
+def job_skill_digest(job_description):
+    skill_matcher = matcher()
+    skills, lines = [], []
+    for line in job_description.splitlines():
+        found = [canonical for _, _, canonical in skill_matcher.find(line)]
+        if found:
+            lines.append(line.strip())
+            skills += [skill for skill in found if skill not in skills]
+    digest = "Skills: " + ", ".join(skills) + "\n" + "\n".join(lines)
+    return digest if skills and len(digest) < len(job_description) else job_description
+
+
+# Words of the skills the text names, as aliases and canonical names, for
+# ranking paragraphs when a prompt is trimmed to the token budget
+def skill_words(text):
+    words = set()
+    for start, end, canonical in matcher().find(text):
+        words |= keywords(text[start:end]) | keywords(canonical)
+    return words
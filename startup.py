@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Cold-start profile of the app entry point. A child interpreter runs with
+# -X importtime, imports Streamlit's test harness, then does the first script
+# run of app.py (the upload page a new session sees) and, with --deferred,
+# loads each dependency the app only imports on first use. Import time is
+# reported per module and per top-level package for every phase, with the
+# deferred packages that the first run loaded anyway.
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+MARKER = "-- phase "
+# Imported on first use: the parser for an uploaded file type, NumPy for
+# ranking postings, and the model client stack once a resume is analyzed
+DEFERRED = {
+    "pdf": ["fitz"],
+    "docx": ["docx"],
+    "latex": ["pylatexenc.latexwalker", "pylatexenc.latex2text"],
+    "tokens": ["tiktoken"],
+    "ranking": ["numpy"],
+    "llm": [
+        "httpx",
+        "openai",
+        "langchain_openai",
+        "langchain_core.prompts",
+        "langchain_core.output_parsers",
+        "langchain_core.outputs",
+    ],
+}
+
+CHILD = """
+import sys, json, time, importlib
+
+def phase(name):
+    sys.stderr.write({marker!r} + name + "\\n")
+    sys.stderr.flush()
+
+phase("harness")
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+phase("app")
+start = time.perf_counter()
+at.run()
+first_run = time.perf_counter() - start
+deferred = {deferred!r}
+loaded = sorted(
+    name for names in deferred.values() for name in names if name in sys.modules
+)
+if {load_deferred!r}:
+    for group, names in deferred.items():
+        phase(group)
+        for name in names:
+            importlib.import_module(name)
+print(json.dumps({{
+    "first_run_s": first_run,
+    "exceptions": [str(e.value) for e in at.exception],
+    "loaded_deferred": loaded,
+}}))
+"""
+
+
+# {phase: [(module, self_us, cumulative_us)]} from -X importtime output
+def parse_importtime(stderr):
+    phases, current = {}, None
+    for line in stderr.splitlines():
+        if line.startswith(MARKER):
+            current = phases.setdefault(line[len(MARKER) :], [])
+        elif line.startswith("import time:") and current is not None:
+            fields = line[len("import time:") :].split("|")
+            if len(fields) != 3 or not fields[0].strip().isdigit():
+                continue
+            current.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return phases
+
+
+def package_totals(modules):
+    totals = {}
+    for name, self_us, _ in modules:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def profile(load_deferred):
+    code = CHILD.format(
+        marker=MARKER, app=APP_PATH, deferred=DEFERRED, load_deferred=load_deferred
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(APP_PATH),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+    summary["phases"] = {
+        phase: {
+            "total_ms": sum(self_us for _, self_us, _ in modules) / 1000,
+            "modules": len(modules),
+            "packages": [
+                {"package": package, "ms": us / 1000}
+                for package, us in package_totals(modules)
+            ],
+            "top": [
+                {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cum / 1000}
+                for name, self_us, cum in sorted(modules, key=lambda m: -m[2])
+            ],
+        }
+        for phase, modules in parse_importtime(result.stderr).items()
+    }
+    return summary
+
+
+def print_profile(summary, top):
+    print(f"first script run: {1000 * summary['first_run_s']:.0f} ms")
+    for error in summary["exceptions"]:
+        print(f"ERROR {error}")
+    loaded = summary["loaded_deferred"]
+    print(f"deferred packages loaded by the first run: {', '.join(loaded) or 'none'}")
+    for phase, stats in summary["phases"].items():
+        print(
+            f"\n{phase}: {stats['total_ms']:.0f} ms importing "
+            f"{stats['modules']} modules"
+        )
+        for entry in stats["packages"][:top]:
+            print(f"  {entry['package']:<40}{entry['ms']:>10.1f} ms")
+        if stats["top"]:
+            print(f"  {'slowest imports':<40}{'self ms':>10}{'cum ms':>10}")
+        for entry in stats["top"][:top]:
+            print(
+                f"  {entry['module'][:40]:<40}{entry['self_ms']:>10.1f}"
+                f"{entry['cumulative_ms']:>10.1f}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report the import-time cost of the app's cold start per module."
+    )
+    parser.add_argument(
+        "--deferred",
+        action="store_true",
+        help="Also time each dependency the app imports on first use",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Rows shown per phase and table"
+    )
+    parser.add_argument("--json", help="Write the profile to this file")
+    args = parser.parse_args(argv)
+
+    summary = profile(args.deferred)
+    print_profile(summary, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if summary["exceptions"] or summary["loaded_deferred"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+from artifacts import ArtifactStore
+
+
+def test_json_key_order_survives_round_trip():
+    store = ArtifactStore()
+    skills = {"Programming Languages": ["Python"], "Frameworks": ["Django"]}
+    value = store.get(store.put({"skills": skills}))
+    assert list(value["skills"]) == ["Programming Languages", "Frameworks"]
+
+
+def test_key_order_survives_spill(tmp_path):
+    store = ArtifactStore(max_bytes=1, spill_dir=str(tmp_path))
+    handle = store.put({"b": 1, "a": 2})
+    store.put("evicts the first value")
+    assert list(store.get(handle)) == ["b", "a"]
+
+
+def test_stored_value_is_a_copy():
+    store = ArtifactStore()
+    value = {"b": [1]}
+    handle = store.put(value)
+    value["b"].append(2)
+    assert store.get(handle) == {"b": [1]}
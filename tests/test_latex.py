@@ -0,0 +1,85 @@
+from latex import latex_to_text, write_back
+
+SOURCE = r"""\begin{itemize}
+\resumeItem{\textbf{Led} a team of five engineers}
+\resumeItem{Built a cache service with \textbf{Redis}}
+\end{itemize}"""
+
+
+def braces_balanced(source):
+    depth = 0
+    for i, char in enumerate(source):
+        if char in "{}" and (i == 0 or source[i - 1] != "\\"):
+            depth += 1 if char == "{" else -1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def test_write_back_keeps_groups_of_bullets_with_nested_macros():
+    old = "    Led a team of five engineers\n    Built a cache service with Redis"
+    new = "    Led a team of six engineers\n    Built a cache layer with Redis and Go"
+    result = write_back(SOURCE, old, new)
+    assert braces_balanced(result)
+    assert latex_to_text(result).text.splitlines() == [
+        "• Led a team of six engineers",
+        "• Built a cache layer with Redis and Go",
+    ]
+
+
+def test_write_back_adds_bullet_after_one_ending_in_a_group():
+    old = "    Led a team of five engineers\n    Built a cache service with Redis"
+    new = old + "\n    Cut costs by 30%"
+    result = write_back(SOURCE, old, new)
+    assert braces_balanced(result)
+    assert latex_to_text(result).text.splitlines()[-1] == "• Cut costs by 30%"
+
+
+def test_section_text_keeps_its_first_bullet():
+    from segment import tex_sections
+
+    source = r"""\begin{document}
+\section{Skills}
+\begin{itemize}
+\item Languages: Python, Go
+\item Frameworks: Django
+\end{itemize}
+\end{document}"""
+    assert tex_sections(source)["skills"] == (
+        "• Languages: Python, Go\n• Frameworks: Django"
+    )
+
+
+# Jake's resume template wraps each list in \resumeItemListStart and
+# \resumeItemListEnd, which must not become bullets of their own
+JAKE_SOURCE = r"""\documentclass{article}
+\newcommand{\resumeItem}[1]{\item\small{#1}}
+\newcommand{\resumeSubheading}[4]{\item #1 #2 #3 #4}
+\newcommand{\resumeItemListStart}{\begin{itemize}}
+\newcommand{\resumeItemListEnd}{\end{itemize}}
+\newcommand{\resumeSubHeadingListStart}{\begin{itemize}}
+\newcommand{\resumeSubHeadingListEnd}{\end{itemize}}
+\begin{document}
+\section{Experience}
+  \resumeSubHeadingListStart
+    \resumeSubheading
+      {Acme Corp}{2020 -- 2023}
+      {Software Engineer}{Remote}
+      \resumeItemListStart
+        \resumeItem{Built a billing service in \textbf{Go}}
+        \resumeItem{Cut latency by 40\%}
+      \resumeItemListEnd
+  \resumeSubHeadingListEnd
+\end{document}
+"""
+
+
+def test_item_list_macros_of_jakes_template_add_no_bullets():
+    from segment import tex_sections
+
+    lines = latex_to_text(JAKE_SOURCE).text.splitlines()
+    assert [line.strip() for line in lines if line.startswith("•")] == [
+        "• Built a billing service in Go",
+        "• Cut latency by 40%",
+    ]
+    assert tex_sections(JAKE_SOURCE)["experiences"].count("•") == 2
@@ -0,0 +1,26 @@
+from layout import render_layout
+
+ORIGINAL = """Acme Corp | Software Engineer | 2020 - 2023
+• Built a billing service in Go
+Beta Labs | Intern | 2019
+• Wrote data pipelines"""
+OLD = [
+    {
+        "company": "Acme Corp",
+        "role": "Software Engineer",
+        "details": ["Built a billing service in Go"],
+    },
+    {"company": "Beta Labs", "role": "Intern", "details": ["Wrote data pipelines"]},
+]
+
+
+def test_new_entry_does_not_copy_dates_from_a_one_line_header():
+    new = OLD + [{"company": "Gamma", "role": "Contractor", "details": ["Ran audits"]}]
+    text = render_layout("experiences", ORIGINAL, OLD, new)
+    assert text.splitlines()[-2:] == ["Gamma | Contractor", "• Ran audits"]
+
+
+def test_existing_entry_keeps_its_dates():
+    new = [dict(OLD[0], role="Senior Engineer"), OLD[1]]
+    text = render_layout("experiences", ORIGINAL, OLD, new)
+    assert text.splitlines()[0] == "Acme Corp | Senior Engineer | 2020 - 2023"
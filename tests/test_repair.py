@@ -0,0 +1,38 @@
+from repair import clean_json, narrow_broken, repair_json
+
+
+def test_prose_around_the_object_is_dropped():
+    text = 'Here you go:\n{"skills": {"Languages": ["Python"]}}\nLet me know!'
+    assert repair_json(text) == {"skills": {"Languages": ["Python"]}}
+
+
+def test_trailing_prose_after_object_with_trailing_comma():
+    text = 'Sure:\n{"skills": {"Languages": ["Python", "Go",]}}\nHope this helps {:'
+    assert repair_json(text) == {"skills": {"Languages": ["Python", "Go"]}}
+
+
+def test_code_fence_and_raw_newline():
+    text = '```json\n{"text": "line one\nline two"}\n```'
+    assert repair_json(text) == {"text": "line one\nline two"}
+
+
+def test_output_cut_off_between_values_is_closed():
+    text = '{"company": "A", "role": "B", "details": ["Built X"'
+    assert repair_json(text) == {"company": "A", "role": "B", "details": ["Built X"]}
+
+
+def test_output_cut_off_inside_a_string_is_not_repaired():
+    assert repair_json('{"skills": {"Databases": ["Post') is None
+    assert repair_json('{"details": ["Built X", "Led Y') is None
+
+
+def test_output_cut_off_after_a_key_is_not_repaired():
+    assert repair_json('{"company": "A", "role"') is None
+
+
+def test_narrow_broken_finds_the_broken_list():
+    text = clean_json('{"company": "A", "details": ["x" "y"]}')
+    root, holder, key, fragment = narrow_broken(text)
+    assert root == {"company": "A", "details": '["x" "y"]'}
+    assert holder is root and key == "details"
+    assert fragment == '["x" "y"]'
@@ -0,0 +1,147 @@
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+STOPWORDS = set(
+    "a an and are as at be by for from in is it of on or our that the this to we "
+    "will with you your".split()
+)
+# Extra words that mark a paragraph as relevant to a section when trimming
+SECTION_KEYWORDS = {
+    "Skills": set(
+        "skills languages frameworks tools databases cloud experience proficiency "
+        "knowledge familiarity stack".split()
+    ),
+    "Experiences": set(
+        "experience responsibilities responsible develop design build maintain "
+        "lead collaborate years requirements".split()
+    ),
+    "Projects": set(
+        "projects build develop design product platform system services features "
+        "requirements".split()
+    ),
+    "Genprojects": set(
+        "projects product platform system services features customers build "
+        "requirements".split()
+    ),
+}
+WORD_RE = re.compile(r"[a-z0-9+#.]+")
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    import tiktoken
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken downloads its BPE files on first use; without network access
+        # fall back to the usual ~4 characters per token estimate
+        return None
+
+
+def count_tokens(text, model):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def keywords(text):
+    return {word.strip(".") for word in WORD_RE.findall(text.lower())} - STOPWORDS
+
+
+# Keep the paragraphs (or lines) of text that share the most words with
+# relevant_words, in their original order, until budget tokens are used
+def trim_to_budget(text, budget, model, relevant_words=()):
+    if budget <= 0:
+        return ""
+    if count_tokens(text, model) <= budget:
+        return text
+    separator = "\n\n" if "\n\n" in text else "\n"
+    chunks = [chunk for chunk in text.split(separator) if chunk.strip()]
+    relevant_words = set(relevant_words)
+    scored = sorted(
+        range(len(chunks)),
+        key=lambda i: (-len(keywords(chunks[i]) & relevant_words), i),
+    )
+    separator_tokens = count_tokens(separator, model)
+    kept, used = set(), 0
+    for i in scored:
+        cost = count_tokens(chunks[i], model) + separator_tokens
+        if used + cost <= budget:
+            kept.add(i)
+            used += cost
+    return separator.join(chunks[i] for i in sorted(kept))
+
+
+class TokenUsage:
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.trimmed_tokens = 0
+        # Input tokens the provider served from its prompt cache
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, input_tokens, output_tokens, cached_tokens=0):
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cached_tokens += cached_tokens
+
+    def add_trimmed(self, tokens):
+        with self._lock:
+            self.trimmed_tokens += tokens
+
+
+# Usage collector for the current session (or batch run); set with track_usage
+# so async tasks started inside it report into the same totals
+_current_usage = ContextVar("current_usage", default=None)
+
+
+@contextmanager
+def track_usage(usage):
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+# Counts reported by the API win over local estimates when they are available
+def record_usage(
+    model,
+    prompt_text,
+    completion_text,
+    input_tokens=None,
+    output_tokens=None,
+    cached_tokens=0,
+):
+    if input_tokens is None:
+        input_tokens = count_tokens(prompt_text, model)
+    if output_tokens is None:
+        output_tokens = count_tokens(completion_text, model)
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add(input_tokens, output_tokens, cached_tokens)
+    return input_tokens, output_tokens
+
+
+def record_trimmed(tokens):
+    usage = _current_usage.get()
+    if usage is not None and tokens > 0:
+        usage.add_trimmed(tokens)
+
+
+# Streamlit runs each script in its own thread, so the app sets the session's
+# collector once per run instead of wrapping the whole script in track_usage
+def set_usage_tracker(usage):
+    _current_usage.set(usage)
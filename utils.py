@@ -1,65 +1,55 @@
 import json
+import time
 import streamlit as st
-from difflib import Differ
-from typing import List, Dict, Any
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import PromptTemplate
-from langchain_core.pydantic_v1 import BaseModel, Field
-from prompt import *
-
-
-class Resume(BaseModel):
-    skills: Dict[str, List[str]] = Field(
-        description="Dictionary of tech skills with categories as keys and lists of skills as values"
-    )
-    skills_original: str = Field(description="Original text for skills section")
-    experiences: List[Dict[str, Any]] = Field(
-        description="List of work experience entries"
-    )
-    experiences_original: str = Field(
-        description="Original text for experiences section"
-    )
-    projects: List[Dict[str, Any]] = Field(description="List of project entries")
-    projects_original: str = Field(description="Original text for projects section")
-
+from dataclasses import asdict
+from diff import diff_html
+from export import EXTENSIONS, MIME_TYPES, export_resume
+from core import *
+from artifacts import artifacts
+from jobs import jobs
+from metrics import stage
+from scheduler import BACKGROUND, SchedulerFull, priority, scheduler
+from skills import match_report
+from ranking import MAX_POSTINGS, cached_rank_postings, split_postings
 
-class Format(BaseModel):
-    text: str = Field(description="New test with original format")
 
+def is_valid_json(json_str):
+    try:
+        json.loads(json_str)
+        return True
+    except ValueError:
+        return False
 
-class Skill(BaseModel):
-    skills: Dict[str, List[str]] = Field(
-        description="Dictionary of tech skills with categories as keys and lists of skills as values"
-    )
 
+# Throttling and a full scheduler queue get their own message instead of the
+# generic one for unparseable replies
+def error_message(error, default):
+    if isinstance(error, SchedulerFull):
+        return "Too many requests are waiting for the model right now. Please try again in a moment."
+    # Only reached after a model call, so the OpenAI client is already loaded
+    from openai import RateLimitError
 
-class Experience(BaseModel):
-    company: str = Field(description="Name of the company")
-    role: str = Field(description="Role in the company")
-    details: List[str] = Field(description="List of details about the work experience")
+    if isinstance(error, RateLimitError):
+        return (
+            "The OpenAI API rate limit was reached. Please wait a moment and try again."
+        )
+    return default
 
 
-class CompanyProduct(BaseModel):
-    products: List[str] = Field(
-        description="List of main products and services offered by the company, each as a single formatted string"
-    )
+# Seconds between reruns while this session waits on background jobs
+JOB_POLL_INTERVAL = 0.5
+MAX_JOB_DESCRIPTION_CHARS = 12000
 
 
-class Project(BaseModel):
-    name: str = Field(description="Name of the project")
-    technologies: List[str] = Field(
-        description="List of technologies used in the project"
+def current_settings():
+    return LLMSettings(
+        api_base=st.session_state.openai_api_base,
+        api_key=st.session_state.openai_api_key,
+        model=st.session_state.get("selected_model", "gpt-4"),
+        token_budget=st.session_state.get("token_budget", 0),
+        structured_output=st.session_state.get("structured_output", FUNCTION_CALLING),
+        focus_skills=st.session_state.get("focus_skills", True),
     )
-    details: List[str] = Field(description="List of details about the project")
-
-
-def is_valid_json(json_str):
-    try:
-        json.loads(json_str)
-        return True
-    except ValueError:
-        return False
 
 
 # Highlight changes function
@@ -71,83 +61,68 @@ def highlight_changes(original, new):
             return json.dumps(d, indent=2)
         return str(d)
 
-    original_str = dict_to_str(original)
-    new_str = dict_to_str(new)
-    d = Differ()
-    diff = d.compare(original_str.splitlines(), new_str.splitlines())
-    highlighted = ""
-    for line in diff:
-        if line.startswith("+ "):
-            highlighted += f'<span style="color: green; background-color: #e6ffe6">{line[2:]}</span><br>'
-        elif line.startswith("- "):
-            highlighted += f'<span style="color: red; background-color: #ffe6e6">{line[2:]}</span><br>'
-        else:
-            highlighted += f"{line[2:]}<br>"
-    return highlighted
-
-
-def skills_dict_to_string(skills_dict):
-    skills_str = ""
-    for category, skills in skills_dict.items():
-        skills_str += f'{category}: {", ".join(skills)}\n'
-    return skills_str.strip()
-
-
-def experiences_list_to_string(experiences_list):
-    experiences_str = ""
-    for experience in experiences_list:
-        company = experience.get("company", "")
-        role = experience.get("role", "")
-        details = experience.get("details", [])
-        details_str = "\n    ".join(details)
-        experiences_str += (
-            f"Company: {company}\nRole: {role}\nDetails:\n    {details_str}\n\n"
-        )
-    return experiences_str.strip()
+    return diff_html(dict_to_str(original), dict_to_str(new))
 
 
-def projects_list_to_string(projects_list):
-    projects_str = ""
-    for project in projects_list:
-        name = project.get("name", "")
-        technologies = project.get("technologies", [])
-        details = project.get("details", [])
-        technologies_str = ", ".join(technologies)
-        details_str = "\n    ".join(details)
-        projects_str += f"Project Name: {name}\nTechnologies: {technologies_str}\nDetails:\n    {details_str}\n\n"
-    return projects_str.strip()
+def render_resume_preview(partial):
+    st.text(skills_dict_to_string(partial.get("skills") or {}))
+    st.text(experiences_list_to_string(partial.get("experiences") or []))
+    st.text(projects_list_to_string(partial.get("projects") or []))
 
 
-def get_company_product(company_name):
-    if not st.session_state.get("openai_api_key"):
-        st.error("Please enter your OpenAI API key.")
-        return
-
-    selected_model = st.session_state.get("selected_model", "gpt-4")
-    model = ChatOpenAI(
-        model_name=selected_model,
-        openai_api_key=st.session_state.openai_api_key,
-        streaming=True,
+def render_section_preview(section_name):
+    to_string = section_entry(section_name)[4]
+    return lambda partial: st.text(
+        section_to_string(section_name, partial or {}, to_string)
     )
-    parser = JsonOutputParser(pydantic_object=CompanyProduct)
-    prompt = PromptTemplate(
-        template="{format_instructions}\n{query}\n",
-        input_variables=["query"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
-    query = f"Can you provide an overview of the main products and services offered by {company_name}? Please include details about their core features, target audience, and how these products serve the needs of professionals and businesses. If you don't know the {company_name}, just return an empty response"
-    chain = prompt | model | parser
+
+
+def section_entry(section_name):
+    for section in SECTIONS:
+        if section[0] == section_name:
+            return section
+    raise KeyError(section_name)
+
+
+# Large session values (resume text and source, the analysis, section text,
+# diffs) live in the shared artifact store; session state keeps their handles
+# under the same keys
+def get_artifact(key, default=None):
+    value = artifacts.get(st.session_state.get(key))
+    return default if value is None else value
+
+
+def set_artifact(key, value):
+    st.session_state[key] = artifacts.put(value)
+
+
+# Jobs this session is waiting on, by slot ("analyze", "section:Skills", ...)
+def session_jobs():
+    return st.session_state.setdefault("jobs", {})
+
+
+def job_errors():
+    return st.session_state.setdefault("job_errors", {})
+
+
+# A full job queue shows as the slot's error, like a failed job
+def submit_job(slot, kind, key_parts, func):
     try:
-        response = chain.invoke({"query": query})
-    except:
-        st.error(
-            f"The ChatGPT response sometimes didn't return a valid JSON. Please try update again."
-        )
-        return
-    return response
+        job = jobs.submit(kind, key_parts, func)
+    except SchedulerFull as error:
+        job_errors()[slot] = error_message(error, str(error))
+        return None
+    session_jobs()[slot] = job.id
+    job_errors().pop(slot, None)
+    return job
+
 
+def slot_job(slot):
+    job_id = session_jobs().get(slot)
+    return jobs.get(job_id) if job_id else None
 
-def analyze_resume(resume_text):
+
+def analyze_resume(resume_text, sections=None):
     if not st.session_state.get("openai_api_key"):
         st.error("Please enter your OpenAI API key.")
         return
@@ -155,59 +130,183 @@ def analyze_resume(resume_text):
         st.error("Please provide your resume.")
         return
 
-    selected_model = st.session_state.get("selected_model", "gpt-4")
-    model = ChatOpenAI(
-        model_name=selected_model,
-        openai_api_base=st.session_state.openai_api_base,
-        openai_api_key=st.session_state.openai_api_key,
-        streaming=True,
+    settings = current_settings()
+    use_cache = not st.session_state.get("bypass_response_cache")
+    submit_job(
+        "analyze",
+        "analyze",
+        [asdict(settings), resume_text, sections or {}, use_cache],
+        lambda job: analyze_resume_text(
+            settings,
+            resume_text,
+            job.set_partial,
+            use_cache=use_cache,
+            sections=sections,
+        ),
+    )
+
+
+# With more than one variant requested, the candidates come from a single
+# request and are ranked locally
+def submit_section(section_name, company_name, job_description, prompt_text):
+    _, section_key, _, schema, to_string = section_entry(section_name)
+    section = (section_name, section_key, prompt_text, schema, to_string)
+    settings = current_settings()
+    resume_response = get_artifact("resume_response")
+    source = latex_source()
+    llm_format = st.session_state.get("llm_format_fallback", True)
+    variants = st.session_state.get("variants", 1)
+
+    def run(job):
+        if variants > 1:
+            return run_async(
+                atailor_section_variants(
+                    settings,
+                    resume_response,
+                    company_name,
+                    job_description,
+                    section,
+                    variants,
+                    source,
+                    llm_format,
+                )
+            )
+        return run_async(
+            atailor_section(
+                settings,
+                resume_response,
+                company_name,
+                job_description,
+                section,
+                source,
+                llm_format,
+                job.set_partial,
+            )
+        )
+
+    submit_job(
+        f"section:{section_name}",
+        "section",
+        [
+            asdict(settings),
+            section_name,
+            company_name,
+            job_description,
+            prompt_text,
+            resume_response,
+            source,
+            llm_format,
+            variants,
+        ],
+        run,
     )
-    parser = JsonOutputParser(pydantic_object=Resume)
-    prompt = PromptTemplate(
-        template="{format_instructions}\n{query}\n",
-        input_variables=["query"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
+
+
+def section_diff(section_name, new_data_str):
+    _, section_key, _, _, to_string = section_entry(section_name)
+    original_data_str = (
+        to_string(get_artifact("resume_response", {}).get(section_key, {}))
+        if section_key
+        else ""
     )
-    chain = prompt | model | parser
-    try:
-        response = chain.invoke(
-            {
-                "query": "given resume_text:\n"
-                + resume_text
-                + "\n"
-                + analyze_resume_prompt
-            }
+    with stage("diff", section=section_name) as span:
+        highlighted_data = highlight_changes(original_data_str, new_data_str)
+        span.set(
+            original_chars=len(original_data_str),
+            new_chars=len(new_data_str),
+            html_chars=len(highlighted_data),
         )
-    except Exception as error:
-        # st.error(
-        #     f"The ChatGPT response sometimes didn't return a valid JSON. Please try update again."
-        # )
-        st.error(error)
+    return highlighted_data
+
+
+def store_section_result(section_name, result):
+    variants_key = f"{section_name.lower()}_variants"
+    if "variants" in result:
+        set_artifact(
+            variants_key,
+            [
+                {**variant, "highlighted": section_diff(section_name, variant["text"])}
+                for variant in result["variants"]
+            ],
+        )
+        choose_variant(section_name, 0)
         return
-    return response
+    st.session_state.pop(variants_key, None)
+    # Store results in session state
+    set_artifact(f"{section_name.lower()}_new_data", result["text"])
+    set_artifact(
+        f"{section_name.lower()}_highlighted_data",
+        section_diff(section_name, result["text"]),
+    )
+    store_formatted_text(section_name, result["formatted"])
+
+
+# Makes the i-th ranked variant the section's result, which is what the
+# formatted text and the export use
+def choose_variant(section_name, i):
+    variant = get_artifact(f"{section_name.lower()}_variants")[i]
+    st.session_state[f"{section_name.lower()}_variant"] = i
+    set_artifact(f"{section_name.lower()}_new_data", variant["text"])
+    set_artifact(f"{section_name.lower()}_highlighted_data", variant["highlighted"])
+    store_formatted_text(section_name, variant["formatted"])
 
 
-def update_section(
-    section_name,
-    company_name,
-    job_description,
-    original_data_str,
-    update_prompt,
-    pydantic_object,
-    data_to_string_func,
-    tab_index,
-):
-    if section_name == "Genprojects":
-        company_product = get_company_product(company_name)
-        if company_product:
-            products_list = company_product["products"]
-            formatted_products = "\n\n".join(products_list)
+def store_formatted_text(section_name, formatted_text):
+    if formatted_text is None:
+        st.session_state.pop(f"{section_name.lower()}_formatted_data", None)
+    else:
+        set_artifact(f"{section_name.lower()}_formatted_data", formatted_text)
+
+
+# Moves the results of this session's finished jobs into session state; runs
+# at the top of every script run, before anything renders them
+def commit_finished_jobs():
+    for slot, job_id in list(session_jobs().items()):
+        job = jobs.get(job_id)
+        if job is not None and not job.done:
+            continue
+        del session_jobs()[slot]
+        section_name = slot.split(":", 1)[-1]
+        if job is None:
+            job_errors()[slot] = "The request was dropped. Please try again."
+        elif job.error is not None:
+            job_errors()[slot] = error_message(
+                job.error,
+                (
+                    str(job.error)
+                    if slot == "analyze"
+                    else f"The ChatGPT response for {section_name} sometimes didn't return a valid JSON. Please try update again."
+                ),
+            )
+        elif slot == "analyze":
+            st.session_state.resume_analyzed = True
+            set_artifact("resume_response", job.result)
         else:
-            formatted_products = ""
-        update_prompt = (
-            "Company Product: " + formatted_products + "\n\n" + update_prompt
-        )
-    prompt_text = update_prompt
+            store_section_result(section_name, job.result)
+
+
+# Progress and partial results of the slot's job while it runs, or the error
+# it failed with
+def display_job(slot, label, render_partial):
+    job = slot_job(slot)
+    if job is not None and not job.done:
+        st.info(f"{label} ({job.status})...")
+        if job.partial:
+            render_partial(job.partial)
+    elif slot in job_errors():
+        st.error(job_errors()[slot])
+
+
+# While jobs are outstanding, rerun shortly to pick up their results; any
+# widget interaction in the meantime simply starts the next run sooner. A job
+# that finished after commit_finished_jobs ran still needs that next run.
+def poll_jobs():
+    if session_jobs():
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+
+
+def update_section(section_name, company_name, job_description, prompt_text, tab_index):
     if st.button(f"Update {section_name}", type="primary", use_container_width=True):
         if not st.session_state.job_description or not st.session_state.company_name:
             st.error("Please provide company name and job description.")
@@ -218,111 +317,161 @@ def update_section(
         if not st.session_state.get("openai_api_key"):
             st.error("Please enter your OpenAI API key.")
             return
+        submit_section(section_name, company_name, job_description, prompt_text)
+
 
-        selected_model = st.session_state.get("selected_model", "gpt-4")
-        model = ChatOpenAI(
-            model_name=selected_model,
-            openai_api_base=st.session_state.openai_api_base,
-            openai_api_key=st.session_state.openai_api_key,
-            streaming=True,
+# Queue every section update at once; prompts is {section name: prompt text}
+def update_all_sections(company_name, job_description, prompts):
+    if not job_description or not company_name:
+        st.error("Please provide company name and job description.")
+        return
+    if not st.session_state.get("openai_api_key"):
+        st.error("Please enter your OpenAI API key.")
+        return
+
+    # Bulk updates yield to single-section updates from other sessions
+    with priority(BACKGROUND):
+        for section_name, prompt_text in prompts.items():
+            submit_section(section_name, company_name, job_description, prompt_text)
+
+
+# Local skill match of the analyzed resume against the job description,
+# refreshed on every rerun without a model call
+def display_job_match(job_description):
+    resume_response = get_artifact("resume_response")
+    if not job_description or not resume_response:
+        return
+    with stage("match"):
+        report = match_report(job_description, resume_response)
+    if not report["job_skills"]:
+        st.caption("No known skills found in the job description.")
+        return
+    matched, total = len(report["matched"]), len(report["job_skills"])
+    st.metric(
+        "Job match",
+        f"{report['score']}%",
+        help="Share of the job description's skill mentions your resume covers, found locally from a skills list without calling the model.",
+    )
+    st.caption(f"{matched} of {total} skills in the job description")
+    if report["missing"]:
+        st.markdown("**Missing:** " + ", ".join(report["missing"]))
+    if report["unlisted"]:
+        st.markdown(
+            "**In your experience but not your skills section:** "
+            + ", ".join(report["unlisted"])
         )
-        parser = JsonOutputParser(pydantic_object=pydantic_object)
-        prompt = PromptTemplate(
-            template="{format_instructions}\n{query}\n",
-            input_variables=["query"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
+
+
+# Many postings ranked locally against the analyzed resume; the chosen one
+# becomes the job description the sections are customized for
+def display_posting_ranking():
+    resume_response = get_artifact("resume_response")
+    with st.expander("Rank many job descriptions"):
+        text = st.text_area(
+            "Paste job descriptions, separated by a line of ---",
+            height=200,
+            key="postings_text",
         )
-        chain = prompt | model | parser
-        try:
-            response = chain.invoke(
+        files = st.file_uploader(
+            "Or upload them as text files, one posting per file",
+            type=["txt", "md"],
+            accept_multiple_files=True,
+            key="postings_files",
+        )
+        postings = split_postings(text or "") + [
+            file.getvalue().decode("utf-8", "replace").strip()
+            for file in files or []
+            if file.getvalue().strip()
+        ]
+        if not postings or not resume_response:
+            return
+        if len(postings) > MAX_POSTINGS:
+            st.warning(f"Only the first {MAX_POSTINGS} postings are ranked.")
+        with stage("rank_postings", postings=min(len(postings), MAX_POSTINGS)):
+            ranked = cached_rank_postings(postings, resume_response)
+        st.dataframe(
+            [
                 {
-                    "query": f"given original {section_name.lower()}:\n"
-                    + original_data_str
-                    + "\nand job description:\n"
-                    + job_description
-                    + "\n"
-                    + prompt_text
+                    "Rank": rank,
+                    "Posting": entry["title"],
+                    "Fit %": entry["fit"],
+                    "Skills %": entry["skill_score"],
+                    "Similarity": entry["similarity"],
+                    "Matched": ", ".join(entry["matched"]),
+                    "Missing": ", ".join(entry["missing"]),
                 }
-            )
-        except:
-            st.error(
-                f"The ChatGPT response sometimes didn't return a valid JSON. Please try update again."
-            )
-            return
-        new_data = response.get(section_name.lower(), {})
-        new_data_str = (
-            data_to_string_func(new_data)
-            if data_to_string_func
-            else projects_list_to_string(new_data)
+                for rank, entry in enumerate(ranked, 1)
+            ],
+            hide_index=True,
+            use_container_width=True,
         )
-        highlighted_data = highlight_changes(original_data_str, new_data_str)
-        # Store results in session state
-        st.session_state[f"{section_name.lower()}_new_data"] = new_data_str
-        st.session_state[f"{section_name.lower()}_highlighted_data"] = highlighted_data
+        choice = st.selectbox(
+            "Posting to customize for",
+            range(len(ranked)),
+            format_func=lambda i: f"#{i + 1} {ranked[i]['title']} ({ranked[i]['fit']}%)",
+        )
+        if st.button("Use as job description", use_container_width=True):
+            st.session_state.job_description = postings[ranked[choice]["index"]][
+                :MAX_JOB_DESCRIPTION_CHARS
+            ]
+            st.rerun()
 
 
 def display_results(section_name):
-    new_data_key = f"{section_name.lower()}_new_data"
-    highlighted_data_key = f"{section_name.lower()}_highlighted_data"
-    if new_data_key in st.session_state and highlighted_data_key in st.session_state:
+    new_data = get_artifact(f"{section_name.lower()}_new_data")
+    highlighted_data = get_artifact(f"{section_name.lower()}_highlighted_data")
+    if new_data is not None and highlighted_data is not None:
         st.subheader("Compare the differences", divider="rainbow")
-        st.markdown(st.session_state[highlighted_data_key], unsafe_allow_html=True)
+        st.markdown(highlighted_data, unsafe_allow_html=True)
         st.subheader(f"New {section_name}", divider="rainbow")
-        st.text(st.session_state[new_data_key])
+        st.text(new_data)
 
 
-def display_format(section_name):
-    # Get the original and new data from session state
-    new_data_key = f"{section_name.lower()}_new_data"
-    if section_name == "Genprojects":
-        original_data_key = "projects_original"
-    else:
-        original_data_key = f"{section_name.lower()}_original"
-    if new_data_key in st.session_state:
-        original_data = st.session_state.resume_response[original_data_key]
-        new_data = st.session_state.get(f"{section_name.lower()}_new_data", "")
-
-        selected_model = st.session_state.get("selected_model", "gpt-4")
-        model = ChatOpenAI(
-            model_name=selected_model,
-            openai_api_base=st.session_state.openai_api_base,
-            openai_api_key=st.session_state.openai_api_key,
-            streaming=True,
-        )
-        parser = JsonOutputParser(pydantic_object=Format)
-        prompt = PromptTemplate(
-            template="{format_instructions}\n{query}\n",
-            input_variables=["query"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
-        )
-        chain = prompt | model | parser
-
-        # Prepare the query
-        query = f"""
-        Here is the original resume content:
-        {original_data}
-
-        Here is the new content for the {section_name} section:
-        {new_data}
-
-        Generate a text that corresponds to the original resume format using the new content. Looks like
-        {{"text": ...}}
-        """
-        # Call LangChain with the prompt
-        try:
-            response = chain.invoke({"query": query})
-        except:
-            st.error(
-                f"The ChatGPT response sometimes didn't return a valid JSON. Please try update again."
+# Ranked variants side by side with their scores and diffs
+def display_variants(section_name):
+    variants = get_artifact(f"{section_name.lower()}_variants")
+    if not variants:
+        return
+    chosen = st.session_state.get(f"{section_name.lower()}_variant", 0)
+    st.subheader("Variants", divider="rainbow")
+    for i, (column, variant) in enumerate(zip(st.columns(len(variants)), variants)):
+        scores = variant["scores"]
+        with column:
+            st.caption(
+                f"#{i + 1}: score {scores['score']:.2f}, "
+                f"{scores['coverage']:.0%} of job keywords"
             )
-            return
-        response_str = json.dumps(response["text"])
-        formatted_text = response_str.replace("\\n", "\n").replace("\\\\", "\\")
-        formatted_text = formatted_text.strip('"')
+            st.markdown(variant["highlighted"], unsafe_allow_html=True)
+            if st.button(
+                "Selected" if i == chosen else "Use this version",
+                key=f"{section_name.lower()}_use_variant_{i}",
+                disabled=i == chosen,
+                use_container_width=True,
+            ):
+                choose_variant(section_name, i)
+                st.rerun()
+
+
+def latex_source():
+    if st.session_state.get("file_type") == "Latex":
+        return get_artifact("resume_source")
+    return None
+
+
+# Only renders what a finished section job stored; the format pass itself runs
+# in the job, never on a plain rerun
+def display_format(section_name):
+    formatted_data = get_artifact(f"{section_name.lower()}_formatted_data")
+    if formatted_data is not None:
         st.subheader("Formatted New " + section_name, divider="rainbow")
-        st.text_area("Formatted Text", formatted_text, height=200)
+        st.text_area(
+            "Formatted Text",
+            formatted_data,
+            height=200,
+            key=f"{section_name.lower()}_formatted_text",
+        )
         st.success(
-            f"Update {section_name.lower()} successfully! You can click the button again to regenerate different versions."
+            f"Update {section_name.lower()} successfully! You can click the button again to regenerate different versions, or set Variants per update in the sidebar to compare several at once."
         )
         st.info("You can also paste another Job Description and generate new result.")
 
@@ -332,25 +481,49 @@ def invoke_chain(query, pydantic_object):
         st.error("Please enter your OpenAI API key.")
         return
 
-    selected_model = st.session_state.get("selected_model", "gpt-4")
-    model = ChatOpenAI(
-        model_name=selected_model,
-        openai_api_base=st.session_state.openai_api_base,
-        openai_api_key=st.session_state.openai_api_key,
-        streaming=True,
-    )
-    parser = JsonOutputParser(pydantic_object=pydantic_object)
-    prompt = PromptTemplate(
-        template="{format_instructions}\n{query}\n",
-        input_variables=["query"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
-    chain = prompt | model | parser
     try:
-        response = chain.invoke({"query": query})
-    except:
+        response = stream_chain(
+            current_settings(), pydantic_object, {"instructions": "", "query": query}
+        )
+    except Exception as error:
         st.error(
-            f"The ChatGPT response sometimes didn't return a valid JSON. Please try update again."
+            error_message(
+                error,
+                f"The ChatGPT response sometimes didn't return a valid JSON. Please try update again.",
+            )
         )
         return
     return response
+
+
+# {"skills": text, ...} for every section with formatted text this session
+def formatted_sections():
+    sections = {
+        section_key: get_artifact(f"{section_name.lower()}_formatted_data")
+        for section_name, section_key, _, _, _ in SECTIONS
+        if section_key
+    }
+    return {key: text for key, text in sections.items() if text is not None}
+
+
+# Download of the uploaded document with the formatted sections patched in
+def display_export(file):
+    sections = formatted_sections()
+    file_type = st.session_state.file_type
+    if not sections or file is None or file_type not in EXTENSIONS:
+        st.info("Update at least one section to download the tailored resume.")
+        return
+    try:
+        exported = export_resume(file.getvalue(), file_type, sections)
+    except Exception as e:
+        st.error(f"Error exporting the resume: {e}")
+        return
+    stem = file.name.rsplit(".", 1)[0]
+    st.download_button(
+        "Download tailored resume",
+        exported,
+        file_name=f"{stem}_tailored{EXTENSIONS[file_type]}",
+        mime=MIME_TYPES[file_type],
+        type="primary",
+        use_container_width=True,
+    )
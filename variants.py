@@ -0,0 +1,102 @@
+import re
+
+from tokens import keywords
+
+# Ranks candidate section updates locally, so several candidates can come from
+# one request and the best one is shown first. A candidate scores by the share
+# of the job description's keywords it covers, less penalties for breaking the
+# bullet rules of the prompt it was written for: the bullet count per entry
+# ("with 5 bullet points") and bullets being at least as long as the original.
+
+# Upper bound on candidates per request offered in the UI
+MAX_VARIANTS = 5
+BULLET_COUNT_RE = re.compile(r"(\d+)\s+bullet points", re.IGNORECASE)
+MIN_LENGTH_RE = re.compile(
+    r"at least as long as the original|not shorter than original", re.IGNORECASE
+)
+# Penalty per unit of relative bullet-count error, averaged over entries
+COUNT_PENALTY = 0.2
+# Penalty for the share of bullets shorter than the original they replace
+LENGTH_PENALTY = 0.3
+
+
+# (bullets per entry or None, whether bullets must not get shorter)
+def bullet_rules(prompt_text):
+    match = BULLET_COUNT_RE.search(prompt_text or "")
+    return (
+        int(match.group(1)) if match else None,
+        bool(MIN_LENGTH_RE.search(prompt_text or "")),
+    )
+
+
+def _text(data):
+    if isinstance(data, dict):
+        return " ".join(f"{key} {_text(value)}" for key, value in data.items())
+    if isinstance(data, list):
+        return " ".join(_text(item) for item in data)
+    return str(data)
+
+
+def _entries(data):
+    if not isinstance(data, list):
+        return []
+    return [entry for entry in data if isinstance(entry, dict)]
+
+
+def coverage(data, job_words):
+    if not job_words:
+        return 0.0
+    return len(keywords(_text(data)) & job_words) / len(job_words)
+
+
+def _count_error(entries, count):
+    if not count or not entries:
+        return 0.0
+    return sum(
+        abs(len(entry.get("details") or []) - count) / count for entry in entries
+    ) / len(entries)
+
+
+# Share of bullets shorter than the original bullet in the same place, or than
+# the shortest original bullet for entries without a counterpart
+def _short_share(entries, original_entries):
+    original_details = [entry.get("details") or [] for entry in original_entries]
+    shortest = min(
+        (len(detail) for details in original_details for detail in details),
+        default=0,
+    )
+    short = total = 0
+    for i, entry in enumerate(entries):
+        originals = original_details[i] if i < len(original_details) else []
+        for j, detail in enumerate(entry.get("details") or []):
+            floor = len(originals[j]) if j < len(originals) else shortest
+            total += 1
+            short += len(detail) < floor
+    return short / total if total else 0.0
+
+
+def score_variant(data, original_data, job_words, rules):
+    count, min_length = rules
+    entries = _entries(data)
+    covered = coverage(data, job_words)
+    count_error = _count_error(entries, count)
+    short_share = _short_share(entries, _entries(original_data)) if min_length else 0.0
+    return {
+        "score": round(
+            covered - COUNT_PENALTY * count_error - LENGTH_PENALTY * short_share, 4
+        ),
+        "coverage": round(covered, 4),
+        "count_error": round(count_error, 4),
+        "short_bullets": round(short_share, 4),
+    }
+
+
+# [(scores, data)] best first; ties keep the order the model returned them in
+def rank_variants(candidates, original_data, job_description, prompt_text):
+    job_words = keywords(job_description)
+    rules = bullet_rules(prompt_text)
+    scored = [
+        (score_variant(data, original_data, job_words, rules), data)
+        for data in candidates
+    ]
+    return sorted(scored, key=lambda pair: -pair[0]["score"])